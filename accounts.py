@@ -0,0 +1,103 @@
+import json
+import os
+import re
+
+# Persona placeholders of the prompt template (see main.PERSONA).
+PERSONA_KEYS = ("whatsapp_t1", "whatsapp_t2", "whatsapp_t3", "twitter_t1", "twitter_t2", "twitter_t3")
+# Environment variables holding an account's Twitter credentials, read as <env_prefix>_<name>.
+TWITTER_CREDENTIAL_VARS = ("TWEEPY_API_KEY", "TWEEPY_API_SECRET", "TWEEPY_ACCESS_TOKEN", "TWEEPY_ACCESS_SECRET")
+
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+class Account:
+    """
+    One Twitter account the bot writes for: its communities, persona,
+    Telegram chat for approvals and alerts, and Twitter credentials.
+
+    Each account gets its own outbox file, its own posting worker and rate
+    limit budget, and its own history of posted and denied tweets, so one
+    account's failures or rate limits never hold up another.
+
+    Args:
+        name (str): Short unique name; used in file names and log lines.
+        community_ids (list): Communities whose tweets are the account's context.
+        persona (dict): Values for the persona placeholders of the prompt.
+        telegram_bot_token (str): Bot used for the account's approvals and alerts.
+        telegram_chat_id (str): Chat the approvals and alerts go to.
+        twitter_credentials (tuple): (api_key, api_secret, access_token, access_token_secret).
+        outbox_filename (str): SQLite outbox of the account's approved tweets.
+        history_key (str): Key of the account's rows in the generated_tweets table.
+    """
+
+    def __init__(self, name: str, community_ids: list, persona: dict, telegram_bot_token: str,
+                 telegram_chat_id: str, twitter_credentials: tuple, outbox_filename: str = None,
+                 history_key: str = None):
+        self.name = name
+        self.community_ids = list(community_ids)
+        self.persona = {key: persona.get(key, "") for key in PERSONA_KEYS}
+        self.telegram_bot_token = telegram_bot_token
+        self.telegram_chat_id = telegram_chat_id
+        self.twitter_credentials = tuple(twitter_credentials)
+        self.outbox_filename = outbox_filename or f"outbox-{name}.db"
+        self.history_key = name if history_key is None else history_key
+
+    def __repr__(self):
+        return f"Account(name={self.name!r}, community_ids={self.community_ids!r})"
+
+
+def load_accounts(filename: str, telegram_bot_token: str = None, telegram_chat_id: str = None) -> list:
+    """
+    Reads the accounts from a JSON config file:
+
+        {"accounts": [
+            {"name": "rust", "communities": ["1493446837214187523"], "env_prefix": "RUST",
+             "persona": {"twitter_t1": "...", "whatsapp_t1": "..."}},
+            {"name": "startups", "communities": ["..."], "env_prefix": "STARTUPS",
+             "persona_file": "personas/startups.json"}
+        ]}
+
+    Secrets stay out of the file: an account's Twitter credentials are read
+    from <env_prefix>_TWEEPY_API_KEY, <env_prefix>_TWEEPY_API_SECRET,
+    <env_prefix>_TWEEPY_ACCESS_TOKEN and <env_prefix>_TWEEPY_ACCESS_SECRET,
+    and its Telegram bot and chat from <env_prefix>_TELEGRAM_BOT_TOKEN and
+    <env_prefix>_TELEGRAM_CHAT_ID, falling back to the given defaults.
+
+    Raises:
+        ValueError: If the file is malformed, a name is repeated or a credential is missing.
+    """
+    with open(filename, encoding="utf-8") as f:
+        config = json.load(f)
+    entries = config.get("accounts") if isinstance(config, dict) else None
+    if not entries:
+        raise ValueError(f"No accounts listed in '{filename}'")
+
+    accounts, names = [], set()
+    for entry in entries:
+        name = str(entry.get("name", ""))
+        if not _NAME_PATTERN.match(name) or name in names:
+            raise ValueError(f"Account names must be unique and use only letters, digits, '-' and '_': {name!r}")
+        names.add(name)
+        community_ids = [str(community_id) for community_id in entry.get("communities", [])]
+        if not community_ids:
+            raise ValueError(f"Account '{name}' has no communities")
+
+        persona = dict(entry.get("persona", {}))
+        if entry.get("persona_file"):
+            path = os.path.join(os.path.dirname(os.path.abspath(filename)), entry["persona_file"])
+            with open(path, encoding="utf-8") as f:
+                persona.update(json.load(f))
+
+        prefix = entry.get("env_prefix", name.upper().replace("-", "_"))
+        credentials = tuple(os.environ.get(f"{prefix}_{var}", "") for var in TWITTER_CREDENTIAL_VARS)
+        missing = [f"{prefix}_{var}" for var, value in zip(TWITTER_CREDENTIAL_VARS, credentials) if not value]
+        bot_token = os.environ.get(f"{prefix}_TELEGRAM_BOT_TOKEN", telegram_bot_token)
+        chat_id = os.environ.get(f"{prefix}_TELEGRAM_CHAT_ID", telegram_chat_id)
+        if not bot_token or not chat_id:
+            missing.append(f"{prefix}_TELEGRAM_CHAT_ID")
+        if missing:
+            raise ValueError(f"Account '{name}' is missing environment variables: {', '.join(missing)}")
+
+        accounts.append(Account(name, community_ids, persona, bot_token, chat_id, credentials,
+                                outbox_filename=entry.get("outbox")))
+    return accounts
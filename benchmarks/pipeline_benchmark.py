@@ -0,0 +1,223 @@
+# Offline benchmark of the whole pipeline against the local fakes in
+# fake_services.py, so no API key or credit is needed.
+#
+#   python benchmarks/pipeline_benchmark.py [--sizes 50 200 1000 5000] [--latency 0.02]
+#                                           [--error-rate 0.0] [--rate-limit-every 0] [--skip-cycles]
+#
+# For every MAX_TWEETS size it reports:
+#   scrape  - streaming pages from twitterapi.io into the tweet store
+#   format  - ranking the stored tweets and building the prompt
+#   snapshot - appending the scraped tweets to a SnapshotArchive, then reopening
+#             it and formatting the most liked tweets straight from the archive
+#   cycle   - a full run_bot(): scrape, rank, prompt, drafts from Claude,
+#             approval over Telegram and posting, with per-stage timings
+#
+# --latency is added to every fake response, --error-rate injects 5xx errors
+# and --rate-limit-every answers every n-th twitterapi.io and tweet-creation
+# request with a 429.
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from fake_services import FakeAnthropicServer, FakeTelegramServer, FakeTwitterApiIoServer, FakeTwitterServer
+
+COMMUNITY_ID = "1000000000000000001"
+FORMAT_REPEATS = 20
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def configure_environment(servers: dict):
+    """Points the bot at the fakes. Must run before main and its helpers are imported."""
+    os.environ.update({
+        "TWITTERAPI_IO_BASE_URL": servers["twitterapi_io"].url,
+        "ANTHROPIC_BASE_URL": servers["anthropic"].url,
+        "TELEGRAM_API_BASE_URL": servers["telegram"].url,
+        "TWITTER_API_BASE_URL": servers["twitter"].url,
+        "TWITTERAPI_IO_KEY": "benchmark", "CLAUDE_API_KEY": "benchmark",
+        "TELEGRAM_BOT_TOKEN": "benchmark", "TELEGRAM_CHAT_ID": "1",
+        "TWEEPY_API_KEY": "benchmark", "TWEEPY_API_SECRET": "benchmark",
+        "TWEEPY_ACCESS_TOKEN": "benchmark", "TWEEPY_ACCESS_SECRET": "benchmark",
+    })
+
+
+def bench_scrape(size: int, workdir: str) -> tuple:
+    """Scrapes `size` tweets into a fresh store. Returns (result row, store)."""
+    import metrics
+    from scraper import stream_communities
+    from tweet_store import TweetStore
+
+    store = TweetStore(os.path.join(workdir, f"scrape-{size}.db"))
+    metrics.begin_run()
+    reports = {}
+    started = time.perf_counter()
+    stored = 0
+    for _, page in stream_communities([COMMUNITY_ID], "benchmark", size, requests_per_second=0, reports=reports):
+        stored += store.add_tweets(page)
+    seconds = time.perf_counter() - started
+    record = metrics.end_run()
+
+    page_seconds = [span["seconds"] for span in record["spans"] if span["name"] == "scrape_page"]
+    return {
+        "tweets": stored,
+        "pages": reports[COMMUNITY_ID]["pages"],
+        "seconds": seconds,
+        "tweets_per_second": stored / seconds if seconds else 0.0,
+        "page_p50_ms": percentile(page_seconds, 0.5) * 1000,
+        "page_p95_ms": percentile(page_seconds, 0.95) * 1000,
+    }, store
+
+
+def bench_format(store, size: int) -> dict:
+    """Ranks the stored tweets and builds the prompt FORMAT_REPEATS times."""
+    import main
+    from prompt_builder import build_prompt
+    from ranking import rank_stored_tweets
+
+    timings = []
+    report = {}
+    for _ in range(FORMAT_REPEATS):
+        started = time.perf_counter()
+        ranked = rank_stored_tweets(store, [COMMUNITY_ID], None, k=main.PROMPT_TWEET_COUNT,
+                                    scorer=main.RANKING_SCORER, max_per_author=main.MAX_TWEETS_PER_AUTHOR,
+                                    n_topics=main.TOPIC_COUNT)
+        _, report = build_prompt(main.PROMPT_TEXT, main.PERSONA, ranked, main.PROMPT_TOKEN_BUDGET)
+        timings.append(time.perf_counter() - started)
+    return {
+        "tweets": size,
+        "median_ms": statistics.median(timings) * 1000,
+        "p95_ms": percentile(timings, 0.95) * 1000,
+        "prompt_tokens": report.get("tokens_used", 0),
+    }
+
+
+def bench_snapshot(store, size: int, workdir: str) -> dict:
+    """Archives the stored tweets as one run, then reopens and formats them FORMAT_REPEATS times."""
+    import main
+    from snapshot_archive import SnapshotArchive
+    from tuple_maker import format_snapshot_for_prompt
+
+    directory = os.path.join(workdir, f"snapshots-{size}")
+    started = time.perf_counter()
+    run = SnapshotArchive(directory).open_run()
+    run.add(store.iter_tweets([COMMUNITY_ID]))
+    run.commit()
+    write_seconds = time.perf_counter() - started
+
+    timings = []
+    for _ in range(FORMAT_REPEATS):
+        started = time.perf_counter()
+        archive = SnapshotArchive(directory)
+        formatted = format_snapshot_for_prompt(archive, main.PROMPT_TWEET_COUNT)
+        timings.append(time.perf_counter() - started)
+    return {
+        "tweets": len(archive),
+        "write_ms": write_seconds * 1000,
+        "read_p50_ms": statistics.median(timings) * 1000,
+        "read_p95_ms": percentile(timings, 0.95) * 1000,
+        "kib_on_disk": sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)) // 1024,
+        "prompt_lines": formatted.count("\n") + 1 if formatted else 0,
+    }
+
+
+def bench_cycle(size: int, workdir: str) -> dict:
+    """Runs one full run_bot() with MAX_TWEETS = size in its own directory."""
+    import main
+
+    cycle_dir = os.path.join(workdir, f"cycle-{size}")
+    os.makedirs(cycle_dir, exist_ok=True)
+    previous_dir = os.getcwd()
+    os.chdir(cycle_dir)  # tweets.db, outbox.db, scrape_state.json and metrics.jsonl go here
+    try:
+        main.COMMUNITY_IDS = [COMMUNITY_ID]
+        main.SCRAPE_REQUESTS_PER_SECOND = 0  # Unthrottled; the fake has no quota to protect
+        main.MAX_TWEETS = size
+        started = time.perf_counter()
+        main.run_bot()
+        seconds = time.perf_counter() - started
+        with open(main.METRICS_FILE, encoding="utf-8") as f:
+            record = json.loads(f.readlines()[-1])
+    finally:
+        os.chdir(previous_dir)
+
+    import metrics
+    stages = metrics.summarize_spans(record)
+    return {"tweets": size, "seconds": seconds,
+            **{stage: stages.get(stage, 0.0) for stage in main.RUN_STAGES},
+            "posted": record["counters"].get("tweets_posted_total", 0)}
+
+
+def print_table(title: str, rows: list):
+    if not rows:
+        return
+    columns = list(rows[0])
+    print(f"\n{title}")
+    print("  ".join(f"{column:>16}" for column in columns))
+    for row in rows:
+        print("  ".join(f"{value:>16.3f}" if isinstance(value, float) else f"{value:>16}" for value in row.values()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bot against local fake services.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 1000, 5000], help="MAX_TWEETS values")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds added to every fake response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake responses that are 5xx")
+    parser.add_argument("--rate-limit-every", type=int, default=0,
+                        help="Answer every n-th scrape and tweet request with a 429 (0 disables)")
+    parser.add_argument("--skip-cycles", action="store_true", help="Only benchmark scraping and formatting")
+    args = parser.parse_args()
+
+    fault = {"latency": args.latency, "error_rate": args.error_rate}
+    servers = {
+        "twitterapi_io": FakeTwitterApiIoServer(tweets_per_community=max(args.sizes), seed=int(time.time()),
+                                                rate_limit_every=args.rate_limit_every, **fault),
+        "anthropic": FakeAnthropicServer(**fault),
+        "telegram": FakeTelegramServer(press_after=0.05, latency=args.latency),
+        "twitter": FakeTwitterServer(rate_limit_every=args.rate_limit_every, latency=args.latency),
+    }
+    for server in servers.values():
+        server.start()
+    configure_environment(servers)
+
+    scrape_rows, format_rows, snapshot_rows, cycle_rows = [], [], [], []
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            for size in args.sizes:
+                row, store = bench_scrape(size, workdir)
+                scrape_rows.append({"max_tweets": size, **row})
+                format_rows.append(bench_format(store, size))
+                snapshot_rows.append(bench_snapshot(store, size, workdir))
+                store.close()
+            if not args.skip_cycles:
+                for size in args.sizes:
+                    cycle_rows.append(bench_cycle(size, workdir))
+    finally:
+        if "telegram_handler" in sys.modules:
+            # Deliver queued notifications while the fake Telegram is still up
+            sys.modules["telegram_handler"].get_notification_dispatcher().flush()
+        for server in servers.values():
+            server.stop()
+
+    print_table("Scrape (stream pages into the tweet store)", scrape_rows)
+    print_table(f"Format (rank + build prompt, median of {FORMAT_REPEATS})", format_rows)
+    print_table(f"Snapshot (archive a run, then reopen + format top tweets, median of {FORMAT_REPEATS})",
+                snapshot_rows)
+    print_table("Full cycle (seconds per stage)", cycle_rows)
+    print("\nRequests served: " + ", ".join(f"{name} {server.request_count}" for name, server in servers.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# Cold-start benchmark for the cron/GitHub Actions path.
+#
+#   python benchmarks/startup_benchmark.py [--runs 5] [--budget-ms 600]
+#
+# Imports main.py in fresh interpreters with `-X importtime`, prints the
+# median import time and the slowest imports, and exits with status 1 if
+# the median is over budget or if a module that should be loaded lazily
+# (see LAZY_MODULES) is imported up front.
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Median time allowed for `import main`, in milliseconds.
+IMPORT_BUDGET_MS = 600
+# Only imported on the code path that uses them.
+LAZY_MODULES = ("anthropic", "tweepy", "pandas")
+
+
+def parse_importtime(stderr: str) -> list:
+    """
+    Parses `-X importtime` output.
+
+    Returns:
+        list: (module, self_us, cumulative_us, depth) tuples in import order.
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if not self_us.strip().isdigit():
+            continue  # The header line
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+
+def measure(module: str = "main") -> list:
+    """Imports `module` in a fresh interpreter and returns its parsed import times."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cold-start import time of main.py.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to list")
+    args = parser.parse_args()
+
+    # The first run warms the OS file cache and is not counted
+    measure()
+    runs = [measure() for _ in range(args.runs)]
+    totals_ms = [next(cumulative for name, _, cumulative, _ in run if name == "main") / 1000 for run in runs]
+    median_ms = statistics.median(totals_ms)
+
+    print(f"import main: median {median_ms:.0f}ms over {args.runs} runs "
+          f"(min {min(totals_ms):.0f}ms, max {max(totals_ms):.0f}ms, budget {args.budget_ms:.0f}ms)")
+
+    # Slowest direct imports of the last run
+    last = runs[-1]
+    direct = sorted((entry for entry in last if entry[3] == 1), key=lambda entry: entry[2], reverse=True)
+    for name, _, cumulative, _ in direct[:args.top]:
+        print(f"  {cumulative / 1000:8.1f}ms  {name}")
+
+    failures = []
+    imported = {name.split(".")[0] for name, _, _, _ in last}
+    eager = [module for module in LAZY_MODULES if module in imported]
+    if eager:
+        failures.append(f"imported at startup but should be lazy: {', '.join(eager)}")
+    if median_ms > args.budget_ms:
+        failures.append(f"median import time {median_ms:.0f}ms is over the {args.budget_ms:.0f}ms budget")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from llm_caller import get_claude_response
+from prompt_builder import jaccard, shingles
+
+TWEET_MAX_LENGTH = 280
+
+# Phrases that give away machine-written tweets (rule 3e of PROMPT_PREFIX).
+BOT_PHRASES = [
+    "delve", "game-changer", "game changer", "let's dive", "dive into", "in today's", "unleash",
+    "unlock the", "buckle up", "here's the thing", "here's the tweet", "as an ai", "in the world of",
+    "it's important to note", "a testament to", "navigating the", "the power of", "elevate your",
+]
+_DASHES = ("—", "–")  # em dash, en dash
+_HASHTAG = re.compile(r"#\w+")
+
+
+def clean_candidate(text: str) -> str:
+    """Strips whitespace and the wrapping quotes Claude sometimes adds despite rule 3d."""
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in "\"'“":
+        text = text[1:-1].strip()
+    if len(text) >= 2 and text[0] == "“" and text[-1] == "”":
+        text = text[1:-1].strip()
+    return text
+
+
+def score_candidate(text: str, recent_posts: list = None) -> tuple:
+    """
+    Scores a candidate tweet locally, without another API call.
+
+    Starts from 1.0 and subtracts penalties for breaking the prompt's rules:
+    going over the length limit, em/en dashes, bot phrases, hashtag spam,
+    and similarity to tweets the bot posted recently.
+
+    Args:
+        text (str): The candidate tweet.
+        recent_posts (list, optional): Texts of recently posted tweets.
+
+    Returns:
+        tuple: (score, list of human-readable reasons for the penalties)
+    """
+    score, reasons = 1.0, []
+    lowered = text.lower()
+
+    if not text:
+        return 0.0, ["empty"]
+    if len(text) > TWEET_MAX_LENGTH:
+        score -= 1.0
+        reasons.append(f"too long ({len(text)} chars)")
+    elif len(text) < 40:
+        score -= 0.2
+        reasons.append("very short")
+
+    dash_count = sum(text.count(dash) for dash in _DASHES)
+    if dash_count:
+        score -= 0.3 * dash_count
+        reasons.append(f"{dash_count} em/en dash(es)")
+
+    phrases = [phrase for phrase in BOT_PHRASES if phrase in lowered]
+    if phrases:
+        score -= 0.25 * len(phrases)
+        reasons.append(f"bot phrases: {', '.join(phrases)}")
+
+    hashtags = len(_HASHTAG.findall(text))
+    if hashtags > 1:
+        score -= 0.15 * (hashtags - 1)
+        reasons.append(f"{hashtags} hashtags")
+
+    if recent_posts:
+        text_shingles = shingles(text)
+        similarity = max(jaccard(text_shingles, shingles(post)) for post in recent_posts)
+        if similarity >= 0.3:
+            score -= similarity
+            reasons.append(f"{similarity:.0%} similar to a recent post")
+
+    return score, reasons
+
+
+def generate_candidates(prompt_text: str, count: int, api_key: str = None, temperature: float = 0.9,
+                        telegram_bot_token: str = None, telegram_chat_id: str = None, min_tier: int = 0,
+                        cache_prefix: str = None, similarity_index=None, max_regenerations: int = 2,
+                        fallback_tier: int = None) -> list:
+    """
+    Requests `count` drafts for the same prompt in parallel.
+
+    Each draft has its own response cache entry, so a re-run with an
+    unchanged prompt gets all of its drafts back without calling the API.
+    `cache_prefix`, `min_tier` and `fallback_tier` are passed on to
+    get_claude_response().
+
+    With a `similarity_index` (see similarity_index.SimilarityIndex), drafts
+    that repeat a tweet the bot already posted or had denied are dropped and
+    requested again, up to `max_regenerations` more rounds, so they never
+    reach the approval step. Those rounds bypass the response cache.
+
+    Returns:
+        list: The non-empty, de-duplicated drafts.
+    """
+    drafts = []
+    for round_number in range(max_regenerations + 1 if similarity_index is not None else 1):
+        missing = count - len(drafts)
+        if missing <= 0:
+            break
+        # Regenerated drafts skip the response cache: a cached answer to the same
+        # prompt is exactly the repeat that was just rejected, on every later run too
+        use_cache = round_number == 0
+        with ThreadPoolExecutor(max_workers=missing) as executor:
+            futures = [
+                executor.submit(get_claude_response, prompt_text, api_key, temperature,
+                                telegram_bot_token, telegram_chat_id, use_cache=use_cache,
+                                cache_variant=f"draft-{i}", min_tier=min_tier,
+                                cache_prefix=cache_prefix, fallback_tier=fallback_tier)
+                for i in range(len(drafts), len(drafts) + missing)
+            ]
+            results = [clean_candidate(future.result() or "") for future in futures]
+
+        for draft in results:
+            if not draft or draft in drafts:
+                continue
+            if similarity_index is not None:
+                similarity, match, status = similarity_index.query(draft)
+                if similarity >= similarity_index.threshold:
+                    metrics.inc("near_duplicates_total", status=status)
+                    print(f"♻️ Draft is {similarity:.0%} similar to a {status} tweet, regenerating: {draft}")
+                    continue
+            drafts.append(draft)
+        if not any(results):
+            break  # Claude is not answering at all; more rounds won't help
+    return drafts
+
+
+def pick_best_candidates(candidates: list, top_n: int, recent_posts: list = None) -> list:
+    """
+    Ranks candidates by score_candidate() and keeps the best `top_n` that
+    fit in a tweet.
+
+    Returns:
+        list: (text, score, reasons) tuples, best first.
+    """
+    scored = [(text, *score_candidate(text, recent_posts)) for text in candidates]
+    scored = [entry for entry in scored if len(entry[0]) <= TWEET_MAX_LENGTH]
+    scored.sort(key=lambda entry: entry[1], reverse=True)
+    return scored[:top_n]
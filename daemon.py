@@ -0,0 +1,360 @@
+# Runs the bot as one long-lived process instead of a fresh `python main.py`
+# per run. Clients, connection pools and the approval/notification/posting
+# threads stay warm between cycles.
+#
+#   python daemon.py --schedule "0 9,15,21 * * *" --jitter 300 --port 8765
+#
+# Cycles run on a cron-like schedule (UTC, like GitHub Actions) plus a random
+# delay of up to --jitter seconds. A cycle can also be started on demand:
+#   curl -X POST http://127.0.0.1:8765/trigger     or     kill -USR1 <pid>
+# GET /status returns the schedule and the measurements of recent cycles, and
+# GET /metrics the bot's counters and timings in the Prometheus text format.
+
+import time
+
+_STARTED = time.monotonic()
+
+import argparse
+import json
+import os
+import random
+import resource
+import signal
+import subprocess
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+DEFAULT_SCHEDULE = "0 9,15,21 * * *"
+DEFAULT_JITTER_SECONDS = 300
+# Locked for the duration of a cycle, so two daemons in one directory never overlap.
+LOCK_FILE = "bot.lock"
+# Number of cycle measurements kept for /status.
+CYCLE_HISTORY = 50
+
+
+class CronSchedule:
+    """
+    A five-field cron expression ("minute hour day-of-month month day-of-week"),
+    evaluated in UTC. Fields accept *, numbers, ranges (a-b), lists (a,b) and
+    steps (*/n, a-b/n). As in cron, when both day fields are restricted a day
+    matches if either of them does.
+    """
+
+    _RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Expected 5 cron fields, got {len(fields)}: '{expression}'")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self._parse(field, low, high) for field, (low, high) in zip(fields, self._RANGES)
+        )
+        self.weekdays = {day % 7 for day in self.weekdays}  # 7 is Sunday too
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int) -> set:
+        values = set()
+        for part in field.split(","):
+            step = 1
+            stepped = "/" in part
+            if stepped:
+                part, step = part.split("/", 1)
+                step = int(step)
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start, end = (int(value) for value in part.split("-", 1))
+            else:
+                start = int(part)
+                end = high if stepped else start  # "a/n" runs from a to the end of the range
+            if not low <= start <= end <= high or step < 1:
+                raise ValueError(f"Invalid cron field '{field}'")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays  # cron counts from Sunday
+        if self._any_day or self._any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, timestamp: float) -> float:
+        """Returns the first matching minute strictly after `timestamp`, as a Unix time."""
+        moment = datetime.fromtimestamp(timestamp, timezone.utc).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 4)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment.timestamp()
+        raise ValueError(f"Cron expression '{self.expression}' never matches")
+
+
+def rss_mb() -> float:
+    """Current resident memory of this process in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+def measure_cold_start() -> dict:
+    """
+    Times what a cron-started run pays before doing any work: a fresh
+    interpreter importing main.py and everything it pulls in.
+
+    Returns:
+        dict: "seconds" (wall time) and "peak_rss_mb" of the child process,
+              or an empty dict if the child failed.
+    """
+    started = time.monotonic()
+    result = subprocess.run([sys.executable, "-c", "import main"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True)
+    seconds = time.monotonic() - started
+    if result.returncode != 0:
+        print(f"Cold-start measurement failed: {result.stderr.decode(errors='replace')[-300:]}")
+        return {}
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {"seconds": seconds, "peak_rss_mb": peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024}
+
+
+@contextmanager
+def _file_lock(filename: str):
+    """Yields True if this process holds the lock file, False if another process does."""
+    if fcntl is None or not filename:
+        yield True
+        return
+    with open(filename, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class Daemon:
+    """
+    Runs `job` on a CronSchedule with jitter, one cycle at a time.
+
+    A cycle is skipped if another one is still running, in this process or in
+    any other process holding `lock_file`. Triggers that arrive during a cycle
+    start one more cycle right after it. Every cycle records its wall time,
+    CPU time and resident memory.
+
+    Args:
+        job: Function run once per cycle (e.g. main.run_bot).
+        schedule (CronSchedule): When cycles start.
+        jitter_seconds (float): Random delay of up to this long added to each scheduled start.
+        lock_file (str): File locked for the duration of a cycle.
+    """
+
+    def __init__(self, job, schedule: CronSchedule, jitter_seconds: float = DEFAULT_JITTER_SECONDS,
+                 lock_file: str = LOCK_FILE):
+        self.job = job
+        self.schedule = schedule
+        self.jitter_seconds = jitter_seconds
+        self.lock_file = lock_file
+        self.cycles = []
+        self.next_run = None
+        self.cold_start = {}
+        self._trigger = threading.Event()
+        self._trigger_reason = None
+        self._stopped = threading.Event()
+        self._running = threading.Lock()
+
+    def trigger(self, reason: str = "manual"):
+        """Starts a cycle as soon as possible (right after the current one, if any)."""
+        self._trigger_reason = reason
+        self._trigger.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._trigger.set()
+
+    def status(self) -> dict:
+        return {
+            "schedule": self.schedule.expression,
+            "jitter_seconds": self.jitter_seconds,
+            "next_run": self.next_run,
+            "running": self._running.locked(),
+            "cold_start": self.cold_start,
+            "cycles": self.cycles[-CYCLE_HISTORY:],
+        }
+
+    def run_cycle(self, reason: str = "schedule"):
+        """
+        Runs the job once unless a cycle is already running.
+
+        Returns:
+            dict: The cycle's measurements, or None if it was skipped.
+        """
+        if not self._running.acquire(blocking=False):
+            print(f"Cycle ({reason}) skipped: a cycle is already running.")
+            return None
+        try:
+            with _file_lock(self.lock_file) as acquired:
+                if not acquired:
+                    print(f"Cycle ({reason}) skipped: another process holds {self.lock_file}.")
+                    return None
+
+                rss_before = rss_mb()
+                started_at, started, cpu_started = time.time(), time.monotonic(), time.process_time()
+                error = None
+                print(f"⏰ Starting cycle ({reason}) at {time.strftime('%Y-%m-%d %H:%M:%S')}")
+                try:
+                    self.job()
+                except Exception as e:
+                    error = str(e)
+                    print(f"Cycle failed: {e}")
+
+                rss_after = rss_mb()
+                cycle = {
+                    "reason": reason,
+                    "started_at": started_at,
+                    "seconds": time.monotonic() - started,
+                    "cpu_seconds": time.process_time() - cpu_started,
+                    "rss_mb": rss_after,
+                    "rss_delta_mb": rss_after - rss_before,
+                    "error": error,
+                }
+                self.cycles = (self.cycles + [cycle])[-CYCLE_HISTORY:]
+                summary = f"⏱️ Cycle took {cycle['seconds']:.1f}s ({cycle['cpu_seconds']:.1f}s CPU), " \
+                          f"RSS {cycle['rss_mb']:.0f}MB ({cycle['rss_delta_mb']:+.1f}MB)"
+                if self.cold_start:
+                    summary += f"; a cold-start run would add ~{self.cold_start['seconds']:.1f}s of startup " \
+                               "plus new TLS handshakes"
+                print(summary)
+                return cycle
+        finally:
+            self._running.release()
+
+    def serve_forever(self):
+        """Runs cycles until stop() is called."""
+        while not self._stopped.is_set():
+            self.next_run = self.schedule.next_after(time.time()) + random.uniform(0, self.jitter_seconds)
+            print(f"Next cycle at {datetime.fromtimestamp(self.next_run, timezone.utc):%Y-%m-%d %H:%M:%S} UTC")
+
+            reason = "schedule"
+            while not self._stopped.is_set():
+                remaining = self.next_run - time.time()
+                if remaining <= 0:
+                    break
+                # Wake up at least once a minute so clock jumps (suspend, NTP) are noticed
+                if self._trigger.wait(min(remaining, 60)):
+                    self._trigger.clear()
+                    reason = self._trigger_reason or "manual"
+                    break
+            if self._stopped.is_set():
+                break
+            self.run_cycle(reason)
+
+
+def serve_http(daemon: Daemon, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serves POST /trigger, GET /status and GET /metrics for the daemon on a background thread.
+    Binds to localhost by default since there is no authentication.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status: int, payload: dict):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/status":
+                self._reply(200, daemon.status())
+            elif self.path == "/metrics":
+                import metrics
+
+                data = metrics.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path == "/trigger":
+                daemon.trigger("http")
+                self._reply(202, {"triggered": True, "running": daemon.status()["running"]})
+            else:
+                self._reply(404, {"error": "not found"})
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="daemon-http", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the tweet bot as a long-lived daemon.")
+    parser.add_argument("--schedule", default=DEFAULT_SCHEDULE, help="Cron expression in UTC")
+    parser.add_argument("--jitter", type=float, default=DEFAULT_JITTER_SECONDS,
+                        help="Random delay of up to this many seconds added to each scheduled cycle")
+    parser.add_argument("--port", type=int, default=0, help="Port for POST /trigger and GET /status (0 disables)")
+    parser.add_argument("--run-now", action="store_true", help="Run one cycle immediately on startup")
+    parser.add_argument("--measure-cold-start", action="store_true",
+                        help="Time a fresh `import main` once, to compare against warm cycles")
+    args = parser.parse_args()
+
+    schedule = CronSchedule(args.schedule)
+    import main as bot  # Loaded once; every cycle reuses its clients and connection pools
+    print(f"Startup: imports took {time.monotonic() - _STARTED:.2f}s, RSS {rss_mb():.0f}MB")
+
+    daemon = Daemon(bot.run_bot, schedule, args.jitter)
+    if args.measure_cold_start:
+        daemon.cold_start = measure_cold_start()
+        if daemon.cold_start:
+            print(f"Cold start: {daemon.cold_start['seconds']:.2f}s, peak RSS {daemon.cold_start['peak_rss_mb']:.0f}MB")
+
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: daemon.trigger("signal"))
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+    if args.port:
+        serve_http(daemon, args.port)
+        print(f"Listening on http://127.0.0.1:{args.port} (POST /trigger, GET /status, GET /metrics)")
+    if args.run_now:
+        daemon.trigger("startup")
+
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print("Daemon stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+"""
+Local stand-ins for the HTTP APIs the bot talks to, for exercising the code
+without live keys or credits.
+
+Every fake is a small threaded HTTP server on 127.0.0.1 with configurable
+latency and error injection:
+
+    with FakeAnthropicServer(latency=0.05) as server:
+        client = anthropic.Anthropic(api_key="test", base_url=server.url)
+
+The bot itself can be pointed at them through environment variables read at
+import time: TWITTERAPI_IO_BASE_URL, ANTHROPIC_BASE_URL, TELEGRAM_API_BASE_URL
+and TWITTER_API_BASE_URL (see benchmarks/pipeline_benchmark.py).
+"""
+import itertools
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class FakeServer:
+    """
+    Base class for the fakes. Subclasses implement handle(method, path, query, body)
+    and return (status, payload[, headers]); a dict or list payload is sent as JSON,
+    a str as-is.
+
+    Args:
+        latency (float): Seconds added to every response.
+        error_rate (float): Fraction of requests answered with `error_status`.
+        error_status (int): HTTP status used for injected errors.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, error_status: int = 500):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(0)
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _inject_error(self) -> bool:
+        with self._lock:
+            self.request_count += 1
+            return self.error_rate > 0 and self._random.random() < self.error_rate
+
+    def handle(self, method: str, path: str, query: dict, body):
+        raise NotImplementedError
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # Otherwise keep-alive responses stall on delayed ACKs
+
+            def log_message(self, format, *args):
+                pass
+
+            def _dispatch(self, method):
+                parts = urlsplit(self.path)
+                query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    body = json.loads(raw) if raw else None
+                except ValueError:
+                    body = raw.decode("utf-8", "replace")
+
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if fake._inject_error():
+                    result = (fake.error_status, {"type": "error", "error": {"type": "injected_error",
+                                                                             "message": "Injected failure"}})
+                else:
+                    result = fake.handle(method, parts.path, query, body)
+                status, payload = result[0], result[1]
+                headers = result[2] if len(result) > 2 else {}
+
+                if isinstance(payload, (dict, list)):
+                    data, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+                else:
+                    data, content_type = str(payload).encode("utf-8"), "application/x-ndjson"
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, str(value))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+        return Handler
+
+
+class FakeAnthropicServer(FakeServer):
+    """
+    Imitates the Messages API and the Message Batches API, including
+    cancelling a batch.
+
+    Args:
+        responder: Function taking the prompt text and returning the reply text.
+        batch_seconds (float): How long a batch stays "in_progress".
+        batch_error_every (int): Answer every n-th request of a batch with an
+                                 "errored" result (0 disables).
+    """
+
+    def __init__(self, responder=None, batch_seconds: float = 0.5, batch_error_every: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.responder = responder or self._default_responder
+        self.batch_seconds = batch_seconds
+        self.batch_error_every = batch_error_every
+        self.batches = {}
+        self.cached_prefixes = set()
+        self._counter = itertools.count(1)
+
+    def _default_responder(self, prompt_text: str) -> str:
+        return f"Fake tweet #{next(self._counter)}: the borrow checker was right all along"
+
+    @staticmethod
+    def _prompt_text(params: dict) -> str:
+        parts = []
+        for message in params.get("messages", []):
+            content = message.get("content")
+            if isinstance(content, str):
+                parts.append(content)
+            else:
+                parts.extend(block.get("text", "") for block in content or [])
+        return "".join(parts)
+
+    def _usage(self, params: dict, prompt_text: str, text: str) -> dict:
+        # Blocks marked with cache_control are "written" the first time and "read" afterwards
+        usage = {"input_tokens": 0, "output_tokens": max(1, len(text) // 4),
+                 "cache_read_input_tokens": 0, "cache_creation_input_tokens": 0}
+        for message in params.get("messages", []):
+            content = message.get("content")
+            blocks = [{"text": content}] if isinstance(content, str) else content or []
+            for block in blocks:
+                tokens = max(1, len(block.get("text", "")) // 4)
+                if block.get("cache_control"):
+                    with self._lock:
+                        hit = block["text"] in self.cached_prefixes
+                        self.cached_prefixes.add(block["text"])
+                    usage["cache_read_input_tokens" if hit else "cache_creation_input_tokens"] += tokens
+                else:
+                    usage["input_tokens"] += tokens
+        return usage
+
+    def _message(self, params: dict) -> dict:
+        prompt_text = self._prompt_text(params)
+        text = self.responder(prompt_text)
+        return {
+            "id": f"msg_{uuid.uuid4().hex[:24]}",
+            "type": "message",
+            "role": "assistant",
+            "model": params.get("model"),
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": self._usage(params, prompt_text, text),
+        }
+
+    def _is_errored(self, index: int) -> bool:
+        return self.batch_error_every > 0 and (index + 1) % self.batch_error_every == 0
+
+    def _batch(self, batch_id: str) -> dict:
+        batch = self.batches[batch_id]
+        canceled = batch.get("canceled")
+        ended = canceled is not None or time.time() - batch["created"] >= self.batch_seconds
+        count = len(batch["requests"])
+        errored = sum(self._is_errored(index) for index in range(count)) if ended and not canceled else 0
+        timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(batch["created"]))
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {"processing": 0 if ended else count,
+                               "succeeded": count - errored if ended and not canceled else 0,
+                               "errored": errored, "canceled": count if canceled else 0, "expired": 0},
+            "created_at": timestamp,
+            "expires_at": timestamp,
+            "ended_at": timestamp if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(canceled)) if canceled else None,
+            "results_url": f"{self.url}/v1/messages/batches/{batch_id}/results" if ended else None,
+        }
+
+    def _result(self, batch: dict, index: int, request: dict) -> dict:
+        if batch.get("canceled"):
+            return {"type": "canceled"}
+        if self._is_errored(index):
+            return {"type": "errored", "error": {"type": "error", "error": {"type": "api_error",
+                                                                           "message": "Injected batch failure"}}}
+        return {"type": "succeeded", "message": self._message(request["params"])}
+
+    def handle(self, method, path, query, body):
+        if method == "POST" and path == "/v1/messages":
+            return 200, self._message(body)
+
+        if method == "POST" and path == "/v1/messages/batches":
+            batch_id = f"msgbatch_{uuid.uuid4().hex[:24]}"
+            self.batches[batch_id] = {"requests": body.get("requests", []), "created": time.time()}
+            return 200, self._batch(batch_id)
+
+        parts = path.strip("/").split("/")
+        if method == "GET" and parts[:3] == ["v1", "messages", "batches"] and len(parts) >= 4:
+            batch_id = parts[3]
+            if batch_id not in self.batches:
+                return 404, {"type": "error", "error": {"type": "not_found_error", "message": "No such batch"}}
+            if len(parts) == 4:
+                return 200, self._batch(batch_id)
+            if parts[4:] == ["results"]:
+                batch = self.batches[batch_id]
+                lines = [json.dumps({"custom_id": request["custom_id"], "result": self._result(batch, index, request)})
+                         for index, request in enumerate(batch["requests"])]
+                return 200, "\n".join(lines) + "\n"
+
+        if method == "POST" and parts[:3] == ["v1", "messages", "batches"] and parts[4:] == ["cancel"]:
+            batch_id = parts[3]
+            if batch_id not in self.batches:
+                return 404, {"type": "error", "error": {"type": "not_found_error", "message": "No such batch"}}
+            batch = self.batches[batch_id]
+            if time.time() - batch["created"] < self.batch_seconds:
+                batch.setdefault("canceled", time.time())
+            return 200, self._batch(batch_id)
+
+        return 404, {"type": "error", "error": {"type": "not_found_error", "message": f"No route {method} {path}"}}
+
+
+_WORDS = ("rust", "borrow", "checker", "lifetime", "async", "tokio", "cargo", "crate", "trait", "generic",
+          "unsafe", "macro", "compile", "error", "memory", "safety", "zero", "cost", "abstraction", "iterator",
+          "closure", "ownership", "move", "clone", "arc", "mutex", "channel", "future", "pin", "serde",
+          "embedded", "wasm", "release", "nightly", "clippy", "refactor", "benchmark", "fast", "finally", "why")
+
+
+class FakeTwitterApiIoServer(FakeServer):
+    """
+    Imitates twitterapi.io's GET /twitter/community/tweets: newest tweets first,
+    `page_size` per page, paginated with `next_cursor` / `has_next`.
+
+    Args:
+        tweets_per_community (int): Tweets available in every community.
+        page_size (int): Tweets per page (twitterapi.io returns about 20).
+        rate_limit_every (int): Answer every n-th request with a 429 (0 disables).
+        seed (int): Seed for the generated tweets; change it to get different texts.
+    """
+
+    def __init__(self, tweets_per_community: int = 1000, page_size: int = 20, rate_limit_every: int = 0,
+                 seed: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.tweets_per_community = tweets_per_community
+        self.page_size = page_size
+        self.rate_limit_every = rate_limit_every
+        self.seed = seed
+        self.created = time.time()
+
+    def _tweet(self, community_id: str, index: int) -> dict:
+        # index 0 is the newest tweet; ids decrease with age like real snowflake ids
+        rng = random.Random(f"{self.seed}:{community_id}:{index}")
+        tweet_id = str(1_900_000_000_000_000_000 - index * 1000 - rng.randrange(1000))
+        created = datetime.fromtimestamp(self.created - index * 60, timezone.utc)
+        username = f"user{rng.randrange(max(10, self.tweets_per_community // 5))}"
+        views = rng.randrange(100, 50_000)
+        return {
+            "id": tweet_id,
+            "url": f"https://x.com/{username}/status/{tweet_id}",
+            "text": " ".join(rng.choice(_WORDS) for _ in range(rng.randrange(6, 30))),
+            "createdAt": created.strftime("%a %b %d %H:%M:%S +0000 %Y"),
+            "author": {"userName": username},
+            "likeCount": int(views * rng.random() * 0.05),
+            "retweetCount": int(views * rng.random() * 0.01),
+            "replyCount": int(views * rng.random() * 0.01),
+            "viewCount": views,
+        }
+
+    def handle(self, method, path, query, body):
+        if method != "GET" or path != "/twitter/community/tweets":
+            return 404, {"status": "error", "msg": f"No route {method} {path}"}
+        if self.rate_limit_every and self.request_count % self.rate_limit_every == 0:
+            return 429, {"status": "error", "msg": "Too many requests"}, {"Retry-After": "1"}
+
+        community_id = query.get("community_id", "")
+        start = int(query.get("cursor") or 0)
+        end = min(start + self.page_size, self.tweets_per_community)
+        return 200, {
+            "tweets": [self._tweet(community_id, index) for index in range(start, end)],
+            "has_next": end < self.tweets_per_community,
+            "next_cursor": str(end) if end < self.tweets_per_community else "",
+        }
+
+
+class FakeTelegramServer(FakeServer):
+    """
+    Imitates the Bot API methods the bot uses: sendMessage, editMessageText,
+    answerCallbackQuery and long-polling getUpdates.
+
+    Every message with an inline keyboard gets a button press `press_after`
+    seconds later, delivered as a callback_query update.
+
+    Args:
+        press_after (float): Delay before the simulated button press (None never presses).
+        choice (str): callback_data of the pressed button, e.g. "approve:0" or "deny".
+    """
+
+    def __init__(self, press_after: float = 0.1, choice: str = "approve:0", **kwargs):
+        super().__init__(**kwargs)
+        self.press_after = press_after
+        self.choice = choice
+        self.messages = {}
+        self.updates = []
+        self._message_ids = itertools.count(1)
+        self._update_ids = itertools.count(1)
+        self._updated = threading.Condition()
+
+    def _press(self, message_id: int, chat_id):
+        with self._updated:
+            self.updates.append({
+                "update_id": next(self._update_ids),
+                "callback_query": {"id": str(uuid.uuid4()), "data": self.choice,
+                                   "message": {"message_id": message_id, "chat": {"id": chat_id}}},
+            })
+            self._updated.notify_all()
+
+    def _get_updates(self, query: dict) -> list:
+        offset = int(query.get("offset") or 0)
+        deadline = time.time() + float(query.get("timeout") or 0)
+        with self._updated:
+            while True:
+                updates = [update for update in self.updates if update["update_id"] >= offset]
+                remaining = deadline - time.time()
+                if updates or remaining <= 0:
+                    return updates
+                self._updated.wait(remaining)
+
+    def handle(self, method, path, query, body):
+        api_method = path.rsplit("/", 1)[-1]
+        body = body if isinstance(body, dict) else {}
+        if api_method == "sendMessage":
+            message_id = next(self._message_ids)
+            self.messages[message_id] = body
+            if body.get("reply_markup") and self.press_after is not None:
+                timer = threading.Timer(self.press_after, self._press, (message_id, body.get("chat_id")))
+                timer.daemon = True
+                timer.start()
+            return 200, {"ok": True, "result": {"message_id": message_id, "text": body.get("text")}}
+        if api_method == "editMessageText":
+            self.messages.setdefault(body.get("message_id"), {})["edited_text"] = body.get("text")
+            return 200, {"ok": True, "result": True}
+        if api_method == "answerCallbackQuery":
+            return 200, {"ok": True, "result": True}
+        if api_method == "getUpdates":
+            return 200, {"ok": True, "result": self._get_updates(query)}
+        return 404, {"ok": False, "error_code": 404, "description": "Not Found"}
+
+
+class FakeTwitterServer(FakeServer):
+    """
+    Imitates the v2 create-tweet endpoint (POST /2/tweets) used by tweepy.Client.
+
+    Rejects repeated texts with 403 "duplicate content", like Twitter does.
+
+    Args:
+        rate_limit_every (int): Answer every n-th request with a 429 and
+                                x-rate-limit-reset one second ahead (0 disables).
+    """
+
+    def __init__(self, rate_limit_every: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.rate_limit_every = rate_limit_every
+        self.tweets = {}
+        self._ids = itertools.count(1_950_000_000_000_000_000)
+
+    def handle(self, method, path, query, body):
+        if method != "POST" or path != "/2/tweets":
+            return 404, {"title": "Not Found Error", "detail": f"No route {method} {path}", "status": 404}
+        if self.rate_limit_every and self.request_count % self.rate_limit_every == 0:
+            return 429, {"title": "Too Many Requests", "detail": "Too Many Requests", "status": 429}, \
+                {"x-rate-limit-limit": "100", "x-rate-limit-remaining": "0",
+                 "x-rate-limit-reset": str(int(time.time()) + 1)}
+
+        text = (body or {}).get("text", "")
+        if text in self.tweets.values():
+            return 403, {"detail": "You are not allowed to create a Tweet with duplicate content.",
+                         "title": "Forbidden", "status": 403}
+        tweet_id = str(next(self._ids))
+        self.tweets[tweet_id] = text
+        return 201, {"data": {"id": tweet_id, "text": text, "edit_history_tweet_ids": [tweet_id]}}
@@ -1,7 +1,18 @@
 import os
-import anthropic
+import random
+import threading
+import time
+from typing import TYPE_CHECKING
+
+import metrics
+from model_router import ModelRouter, NEXT_MODEL, STOP, COOLDOWN_SECONDS
+from rate_control import parse_rate_limit_headers
+from response_cache import ResponseCache, make_cache_key
 from telegram_handler import send_error_notification
 
+if TYPE_CHECKING:
+    import anthropic
+
 # List of Claude models to try in order (newest to oldest)
 CLAUDE_MODELS = [
     "claude-3-5-sonnet-20241022",
@@ -10,7 +21,158 @@ CLAUDE_MODELS = [
     "claude-3-haiku-20240307"
 ]
 
-def get_claude_response(prompt_text: str, api_key: str = None, temperature: float = 0.7, telegram_bot_token: str = None, telegram_chat_id: str = None) -> str:
+# Quality tier per model (higher is better). get_claude_response routes to the
+# highest tier available at or above the requested min_tier, and only drops to
+# a lower fallback_tier after the better models are rate limited or overloaded.
+CLAUDE_MODEL_TIERS = {
+    "claude-3-5-sonnet-20241022": 3,
+    "claude-3-5-sonnet-20240620": 3,
+    "claude-3-sonnet-20240229": 2,
+    "claude-3-haiku-20240307": 1,
+}
+
+# --- Model routing ---
+# Per-model availability, latency and error rates, kept between runs.
+MODEL_HEALTH_FILE = os.environ.get("CLAUDE_MODEL_HEALTH_FILE", "model_health.json")
+# Start the next model in parallel when a request takes longer than this.
+HEDGE_AFTER_SECONDS = 20.0
+
+# --- Message Batches ---
+# Batches cost half as much as regular calls but may take up to 24 hours.
+BATCH_POLL_SECONDS = 30
+BATCH_TIMEOUT_SECONDS = 24 * 3600
+
+MAX_TOKENS = 1024
+
+# --- Response cache ---
+# Identical (whitespace-normalized) prompts sent with the same model and
+# temperature within the TTL are answered from disk instead of the API.
+RESPONSE_CACHE_FILE = os.environ.get("CLAUDE_CACHE_FILE", "claude_cache.db")
+RESPONSE_CACHE_TTL_SECONDS = 24 * 3600
+RESPONSE_CACHE_MAX_ENTRIES = 500
+
+_clients = {}
+_response_cache = None
+_model_router = None
+_lock = threading.Lock()
+
+# Token usage reported by the API since the last reset_usage_stats()
+_USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens")
+_usage = dict.fromkeys(_USAGE_FIELDS + ("requests",), 0)
+
+
+def get_client(api_key: str = None) -> "anthropic.Anthropic":
+    """
+    Returns a process-wide Anthropic client for the given API key, creating it
+    on first use so its connection pool is reused across calls.
+
+    The anthropic SDK is imported here rather than at module level: it is by
+    far the slowest import of the bot, and runs that exit early never need it.
+    """
+    import anthropic
+
+    with _lock:
+        client = _clients.get(api_key)
+        if client is None:
+            # Without an api_key the client looks for ANTHROPIC_API_KEY
+            client = anthropic.Anthropic(api_key=api_key) if api_key else anthropic.Anthropic()
+            _clients[api_key] = client
+        return client
+
+
+def get_response_cache() -> ResponseCache:
+    """Returns the process-wide response cache, opening it on first use."""
+    global _response_cache
+    with _lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache(RESPONSE_CACHE_FILE, RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_MAX_ENTRIES)
+        return _response_cache
+
+
+def get_model_router() -> ModelRouter:
+    """Returns the process-wide model router, loading the health table on first use."""
+    global _model_router
+    with _lock:
+        if _model_router is None:
+            _model_router = ModelRouter(CLAUDE_MODELS, CLAUDE_MODEL_TIERS, MODEL_HEALTH_FILE, HEDGE_AFTER_SECONDS)
+        return _model_router
+
+
+def _retry_after(error) -> float:
+    """
+    Seconds until a rate-limited model may be called again, from the
+    Retry-After or anthropic-ratelimit-requests-reset header of the error.
+    Falls back to a jittered COOLDOWN_SECONDS.
+    """
+    response = getattr(error, "response", None)
+    info = parse_rate_limit_headers(response.headers if response is not None else None)
+    resume_at = info.get("retry_at") or info.get("reset_at")
+    if resume_at is None:
+        return COOLDOWN_SECONDS * random.uniform(0.5, 1.5)
+    return max(1.0, resume_at - time.time())
+
+
+def _cached_response(cache: ResponseCache, temperature: float, prompt_text: str, cache_params: dict):
+    """Returns a cached response from any of the CLAUDE_MODELS, or None."""
+    index, cached = cache.get_first([make_cache_key(model, temperature, prompt_text, **cache_params)
+                                     for model in CLAUDE_MODELS])
+    if cached is None:
+        metrics.inc("response_cache_total", result="miss")
+        return None
+    print(f"Using cached response from model: {CLAUDE_MODELS[index]}")
+    metrics.inc("response_cache_total", result="hit")
+    return cached
+
+
+def _record_usage(usage):
+    with _lock:
+        for field in _USAGE_FIELDS:
+            _usage[field] += getattr(usage, field, None) or 0
+        _usage["requests"] += 1
+    for field in _USAGE_FIELDS:
+        metrics.inc("claude_tokens_total", getattr(usage, field, None) or 0, type=field.replace("_tokens", ""))
+
+
+def usage_stats() -> dict:
+    """
+    Returns the tokens used since the last reset: input_tokens, output_tokens,
+    cache_read_input_tokens, cache_creation_input_tokens and requests.
+    """
+    with _lock:
+        return dict(_usage)
+
+
+def reset_usage_stats():
+    """Starts a new usage tally, e.g. at the beginning of a run."""
+    with _lock:
+        _usage.update(dict.fromkeys(_usage, 0))
+
+
+def build_message_content(prompt_text: str, cache_prefix: str = None):
+    """
+    Builds the user message content. When `cache_prefix` is given (and the
+    prompt starts with it), the prefix becomes its own text block marked with
+    cache_control, so Anthropic can reuse it across calls and only the
+    remainder is billed as fresh input.
+
+    Note that prompts shorter than the model's minimum cacheable length
+    (about 1024 tokens for Sonnet, 2048 for Haiku) are simply not cached.
+    """
+    if not cache_prefix or not prompt_text.startswith(cache_prefix):
+        return prompt_text
+    content = [{"type": "text", "text": cache_prefix, "cache_control": {"type": "ephemeral"}}]
+    remainder = prompt_text[len(cache_prefix):]
+    if remainder.strip():
+        content.append({"type": "text", "text": remainder})
+    return content
+
+
+def cache_stats() -> dict:
+    """Returns the response cache's hit/miss statistics for this process."""
+    return get_response_cache().stats()
+
+
+def get_claude_response(prompt_text: str, api_key: str = None, temperature: float = 0.7, telegram_bot_token: str = None, telegram_chat_id: str = None, use_cache: bool = True, cache_variant: str = None, min_tier: int = 0, cache_prefix: str = None, fallback_tier: int = None) -> str:
     """
     Sends a prompt to the Claude API and returns the response.
 
@@ -20,89 +182,234 @@ def get_claude_response(prompt_text: str, api_key: str = None, temperature: floa
                                  it will try to use the ANTHROPIC_API_KEY
                                  environment variable. Defaults to None.
         temperature (float): The temperature for the generation (0.0 to 1.0).
+        use_cache (bool): Answer from, and store into, the on-disk response cache.
+        cache_variant (str, optional): Extra cache key component, so several drafts
+                                       of the same prompt get separate cache entries.
+        min_tier (int): Lowest acceptable model quality tier (see CLAUDE_MODEL_TIERS).
+        cache_prefix (str, optional): Leading part of `prompt_text` that is identical
+                                      across calls; it is sent with a prompt-caching marker.
+        fallback_tier (int, optional): Lowest tier to fall back to when every model at
+                                       or above `min_tier` is rate limited, overloaded or failed.
 
     Returns:
         str: Claude's response text, or an empty string if an error occurs.
     """
+    cache = None
+    cache_params = {"max_tokens": MAX_TOKENS}
+    if cache_variant is not None:
+        cache_params["variant"] = cache_variant
+    if use_cache:
+        try:
+            cache = get_response_cache()
+            cached = _cached_response(cache, temperature, prompt_text, cache_params)
+            if cached is not None:
+                return cached
+        except Exception as e:
+            print(f"Response cache unavailable, calling the API directly: {e}")
+            cache = None
+
     try:
         # Use the provided API key if it exists, otherwise try the environment variable
-        if api_key:
-            client = anthropic.Anthropic(api_key=api_key)
-        else:
-            client = anthropic.Anthropic() # Looks for ANTHROPIC_API_KEY
+        client = get_client(api_key)
     except Exception as e:
         print(f"Error initializing Anthropic client: {e}")
         print("Please provide an api_key or set the ANTHROPIC_API_KEY environment variable.")
         return ""
 
-    # Try each model in order until one works
-    last_error = None
-    
-    for model in CLAUDE_MODELS:
-        try:
-            print(f"Trying Claude model: {model}...")
-            
-            # Make the API call
+    def notify(message, error_type):
+        if telegram_bot_token and telegram_chat_id:
+            send_error_notification(telegram_bot_token, telegram_chat_id, message, error_type)
+
+    router = get_model_router()
+    content = build_message_content(prompt_text, cache_prefix)
+
+    def call(model):
+        # Make the API call
+        with metrics.span("claude_call", model=model):
             message = client.messages.create(
                 model=model,
-                max_tokens=1024,
-                temperature=temperature,
+                max_tokens=MAX_TOKENS,
+                # Sent as a raw body field: newer SDK releases dropped the temperature keyword
+                extra_body={"temperature": temperature},
                 messages=[
                     {
                         "role": "user",
-                        "content": prompt_text
+                        "content": content
                     }
                 ]
             )
+        metrics.inc("claude_requests_total", model=model)
+        _record_usage(message.usage)
+        # Extract and return the response text
+        return message.content[0].text
 
-            # Extract and return the response text
-            response_text = message.content[0].text
-            print(f"Successfully used model: {model}")
-            return response_text
+    def on_error(model, e):
+        import anthropic
 
-        except anthropic.APIError as e:
-            last_error = e
+        metrics.inc("claude_errors_total", model=model, error=type(e).__name__)
+        if isinstance(e, anthropic.APIError):
             error_str = str(e)
-            
-            # If model not found (404), try next model
-            if "not_found_error" in error_str or "404" in error_str:
+            status = getattr(e, "status_code", None)
+
+            # If model not found (404), remember it is gone and try the next model
+            if isinstance(e, anthropic.NotFoundError) or "not_found_error" in error_str or "404" in error_str:
                 print(f"Model {model} not found, trying next model...")
-                continue
-            
-            # For other API errors, send notification and break
-            elif "rate_limit" in error_str.lower():
+                router.record_error(model, e, dead=True)
+                return NEXT_MODEL
+
+            # Rate limits and overload are per model, so fall back to another one
+            if isinstance(e, anthropic.RateLimitError) or "rate_limit" in error_str.lower() or status == 529:
+                router.record_error(model, e, cooldown=_retry_after(e))
                 error_msg = f"Claude API Rate Limit Exceeded\nModel: {model}\nError: {e}"
-                if telegram_bot_token and telegram_chat_id:
-                    send_error_notification(telegram_bot_token, telegram_chat_id, error_msg, "Rate Limit")
-                print(f"Rate limit error: {e}")
-                break
-            elif "insufficient_quota" in error_str.lower() or "quota" in error_str.lower():
+                notify(error_msg, "Rate Limit")
+                print(f"Rate limit error on {model}, trying next model: {e}")
+                return NEXT_MODEL
+
+            router.record_error(model, e)
+            # For other API errors, send notification and stop
+            if "insufficient_quota" in error_str.lower() or "quota" in error_str.lower():
                 error_msg = f"Claude API Quota Exceeded\nModel: {model}\nError: {e}"
-                if telegram_bot_token and telegram_chat_id:
-                    send_error_notification(telegram_bot_token, telegram_chat_id, error_msg, "Quota Exceeded")
+                notify(error_msg, "Quota Exceeded")
                 print(f"Quota exceeded: {e}")
-                break
-            else:
-                error_msg = f"Claude API Error\nModel: {model}\nError: {e}"
-                if telegram_bot_token and telegram_chat_id:
-                    send_error_notification(telegram_bot_token, telegram_chat_id, error_msg, "API Error")
-                print(f"API error: {e}")
-                break
-                
+                return STOP
+            if status is not None and status >= 500:
+                error_msg = f"Claude API Server Error\nModel: {model}\nError: {e}"
+                notify(error_msg, "API Error")
+                print(f"Server error with model {model}, trying next model: {e}")
+                return NEXT_MODEL
+            error_msg = f"Claude API Error\nModel: {model}\nError: {e}"
+            notify(error_msg, "API Error")
+            print(f"API error: {e}")
+            return STOP
+
+        router.record_error(model, e)
+        error_msg = f"Unexpected Claude Error\nModel: {model}\nError: {e}"
+        notify(error_msg, "Unexpected Error")
+        print(f"Unexpected error with model {model}: {e}")
+        return NEXT_MODEL
+
+    try:
+        model, response_text = router.run(call, on_error, min_tier, fallback_tier)
+    except Exception as last_error:
+        # If all models failed, send final error notification
+        notify(f"All Claude models failed. Last error: {last_error}", "Critical Error")
+        print(f"All Claude models failed. Last error: {last_error}")
+        return ""
+
+    print(f"Successfully used model: {model}")
+    if cache is not None:
+        try:
+            cache.put(make_cache_key(model, temperature, prompt_text, **cache_params), model, response_text)
+        except Exception as e:
+            print(f"Failed to cache Claude response: {e}")
+    return response_text
+
+
+def generate_batch(prompts: dict, api_key: str = None, temperature: float = 0.7, telegram_bot_token: str = None,
+                   telegram_chat_id: str = None, use_cache: bool = True, min_tier: int = 0,
+                   poll_seconds: float = BATCH_POLL_SECONDS, timeout_seconds: float = BATCH_TIMEOUT_SECONDS) -> dict:
+    """
+    Generates responses for many prompts with a single Message Batches job.
+
+    Prompts already in the response cache are answered from it; the rest are
+    submitted together, polled until the batch ends, and mapped back to their
+    keys. This is the cheap, high-throughput path for large scheduled runs
+    where nobody is waiting on an individual answer. Nothing in the bot calls
+    it yet: a run needs its drafts within minutes for Telegram approval.
+
+    Args:
+        prompts (dict): Maps any hashable key (e.g. (persona, community_id)) to its prompt text.
+        api_key (str, optional): Your Anthropic API key.
+        temperature (float): The temperature for the generation (0.0 to 1.0).
+        use_cache (bool): Answer from, and store into, the on-disk response cache.
+        min_tier (int): Lowest acceptable model quality tier; the best healthy model is used.
+        poll_seconds (float): Delay between batch status checks.
+        timeout_seconds (float): Give up (and cancel the batch) after this long.
+
+    Returns:
+        dict: Maps every key of `prompts` to its response text ("" if it failed).
+    """
+    def notify(message, error_type):
+        if telegram_bot_token and telegram_chat_id:
+            send_error_notification(telegram_bot_token, telegram_chat_id, message, error_type)
+
+    results = {key: "" for key in prompts}
+    cache_params = {"max_tokens": MAX_TOKENS}
+    cache = None
+    if use_cache:
+        try:
+            cache = get_response_cache()
         except Exception as e:
-            last_error = e
-            error_msg = f"Unexpected Claude Error\nModel: {model}\nError: {e}"
-            if telegram_bot_token and telegram_chat_id:
-                send_error_notification(telegram_bot_token, telegram_chat_id, error_msg, "Unexpected Error")
-            print(f"Unexpected error with model {model}: {e}")
+            print(f"Response cache unavailable, calling the API directly: {e}")
+
+    router = get_model_router()
+    models = router.candidates(min_tier) or [m for m in CLAUDE_MODELS if CLAUDE_MODEL_TIERS.get(m, 0) >= min_tier]
+    if not models:
+        print(f"No Claude model meets quality tier {min_tier}")
+        return results
+    model = models[0]
+
+    # custom_id must be short and alphanumeric, so keys are mapped to request numbers
+    pending = {}
+    batch_requests = []
+    for i, (key, prompt_text) in enumerate(prompts.items()):
+        cached = _cached_response(cache, temperature, prompt_text, cache_params) if cache is not None else None
+        if cached is not None:
+            results[key] = cached
             continue
-    
-    # If all models failed, send final error notification
-    if telegram_bot_token and telegram_chat_id:
-        send_error_notification(telegram_bot_token, telegram_chat_id, 
-                              f"All Claude models failed. Last error: {last_error}", 
-                              "Critical Error")
-    
-    print(f"All Claude models failed. Last error: {last_error}")
-    return ""
+        custom_id = f"request-{i}"
+        pending[custom_id] = (key, prompt_text)
+        batch_requests.append({
+            "custom_id": custom_id,
+            "params": {
+                "model": model,
+                "max_tokens": MAX_TOKENS,
+                "temperature": temperature,
+                "messages": [{"role": "user", "content": prompt_text}],
+            },
+        })
+
+    if not batch_requests:
+        return results
+
+    try:
+        client = get_client(api_key)
+        batch = client.messages.batches.create(requests=batch_requests)
+        print(f"Submitted batch {batch.id} with {len(batch_requests)} requests to {model}")
+
+        metrics.inc("claude_batch_requests_total", len(batch_requests), model=model)
+        started = time.monotonic()
+        while batch.processing_status != "ended":
+            if time.monotonic() - started > timeout_seconds:
+                client.messages.batches.cancel(batch.id)
+                notify(f"Claude batch {batch.id} timed out after {timeout_seconds:.0f}s and was cancelled", "Batch Timeout")
+                return results
+            time.sleep(poll_seconds)
+            batch = client.messages.batches.retrieve(batch.id)
+        metrics.observe("claude_batch_seconds", time.monotonic() - started)
+
+        failed = 0
+        for entry in client.messages.batches.results(batch.id):
+            if entry.custom_id not in pending:
+                continue
+            key, prompt_text = pending[entry.custom_id]
+            if entry.result.type != "succeeded":
+                failed += 1
+                continue
+            _record_usage(entry.result.message.usage)
+            response_text = entry.result.message.content[0].text
+            results[key] = response_text
+            if cache is not None:
+                try:
+                    cache.put(make_cache_key(model, temperature, prompt_text, **cache_params), model, response_text)
+                except Exception as e:
+                    print(f"Failed to cache Claude response: {e}")
+
+        print(f"Batch {batch.id} finished: {len(batch_requests) - failed} succeeded, {failed} failed")
+        if failed:
+            notify(f"Claude batch {batch.id}: {failed}/{len(batch_requests)} requests failed", "Batch Errors")
+    except Exception as e:
+        notify(f"Claude batch generation failed\nModel: {model}\nError: {e}", "API Error")
+        print(f"Batch generation failed: {e}")
 
+    return results
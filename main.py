@@ -10,25 +10,92 @@
 # 2. Go to the community tab on twitter and click on the community you want to scrape.
 # 3. Copy the community id from the URL.
 
-import requests
-import pandas as pd
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Import all our helper functions
-from tuple_maker import format_tweets_for_prompt
-from llm_caller import get_claude_response
-from telegram_handler import request_telegram_approval, send_error_notification
-from tweepy_post_function import post_tweet
+from scraper import stream_communities, summarize_savings
+from scrape_state import ScrapeState
+import metrics
+from tweet_store import TweetStore
+from ranking import rank_stored_tweets
+from prompt_builder import build_prompt
+from llm_caller import cache_stats, usage_stats, reset_usage_stats
+from candidates import generate_candidates, pick_best_candidates
+from similarity_index import SimilarityIndex
+from telegram_handler import request_telegram_choice, send_error_notification, APPROVED, DENIED, FAILED
+from tweepy_post_function import get_twitter_client
+from outbox import Outbox, PostingWorker, best_release_time, RATE_LIMIT_FALLBACK_SECONDS
+from rate_control import get_controller
+from accounts import Account, load_accounts
+from snapshot_archive import SnapshotArchive
 
 # --- Configuration ---
-MAX_TWEETS = 50
-OUTPUT_FILENAME = ""
+MAX_TWEETS = 50  # Per community
+# Local SQLite corpus of every scraped tweet, kept across runs.
+TWEET_DB_FILENAME = "tweets.db"
+# Only tweets created within this many hours are used as prompt context.
+CONTEXT_WINDOW_HOURS = 48
+# How context tweets are ranked: "likes", "weighted", "per_view" or "velocity" (see ranking.py)
+RANKING_SCORER = "weighted"
+# At most this many context tweets from the same author (None for no cap).
+MAX_TWEETS_PER_AUTHOR = 3
+# Context tweets are grouped into this many topics and each topic gets a share of the
+# prompt proportional to its engagement (see topic_clusters.py). 0 ranks by score alone.
+TOPIC_COUNT = 12
+# Number of ranked tweets considered for the prompt.
+PROMPT_TWEET_COUNT = 50
+# Estimated input tokens the whole prompt may use. The best tweets are packed
+# in until this is reached; near-duplicate tweets are left out.
+PROMPT_TOKEN_BUDGET = 3000
+# Drafts requested from Claude in parallel per run, and how many of the best
+# (scored locally against rule 3e and recent posts) are sent to Telegram.
+DRAFT_COUNT = 4
+DRAFTS_FOR_REVIEW = 2
+# Drafts too similar to one of the last DUPLICATE_HISTORY posted or denied tweets are
+# regenerated (up to MAX_REGENERATIONS more rounds) instead of being sent for approval.
+DUPLICATE_HISTORY = 5000
+MAX_REGENERATIONS = 2
+# Claude model quality tier drafts are written with (see CLAUDE_MODEL_TIERS in llm_caller.py).
+MIN_MODEL_TIER = 3
+# Lowest tier to fall back to while every MIN_MODEL_TIER model is rate limited or overloaded.
+FALLBACK_MODEL_TIER = 1
 COMMUNITY_ID = ""
+# Every community listed here is scraped in parallel during a single run.
+COMMUNITY_IDS = [COMMUNITY_ID]
+# Combined twitterapi.io request rate shared by all communities. It starts here and
+# creeps up to SCRAPE_MAX_REQUESTS_PER_SECOND while requests succeed; 429s halve it.
+SCRAPE_REQUESTS_PER_SECOND = 1.0
+SCRAPE_MAX_REQUESTS_PER_SECOND = 3.0
+# Newest tweet id seen per community, so later runs only fetch the delta.
+SCRAPE_STATE_FILE = "scrape_state.json"
+# Every run's scraped tweets are also appended to this columnar archive for offline
+# analysis (see snapshot_archive.py). None turns it off.
+SNAPSHOT_DIR = "snapshots"
+# Approved tweets wait here until they are posted, so none is lost to a crash or rate limit.
+OUTBOX_FILENAME = "outbox.db"
+# To write for several Twitter accounts from one process, list them in this JSON
+# file (see accounts.load_accounts()). Without it the bot runs the single account
+# configured in this file. Each community is scraped once per run however many
+# accounts use it, and each account has its own persona, credentials and outbox.
+ACCOUNTS_FILE = "accounts.json"
+# Hold approved tweets until the hour (within POST_HORIZON_HOURS) at which the
+# community's tweets historically get the most engagement. Queued tweets are
+# posted by whichever run is active at that time.
+POST_AT_BEST_TIME = False
+POST_HORIZON_HOURS = 12
+# How long a run waits at the end for due tweets to be posted.
+POST_DRAIN_SECONDS = 120
+# Every run appends its stage timings and counters (pages, credits, tokens,
+# retries, cache hits) to this file as one JSON line.
+METRICS_FILE = "metrics.jsonl"
+# Top-level spans printed in the end-of-run timing summary.
+RUN_STAGES = ("scrape", "rank", "build_prompt", "generate", "telegram_approval", "post_drain")
 
 # --- Load All Required API Keys from Environment Variables ---
-# This section checks for all necessary keys at the start of the script.
-# If any are missing, the script will exit immediately.
+# The keys are read here but only checked when a run starts (check_environment()),
+# so importing this module stays cheap for the daemon and the startup benchmark.
 
 # Your API key from twitterapi.io
 # It's best practice to load this from an environment variable for security.
@@ -41,9 +108,18 @@ TWEEPY_API_SECRET = os.environ.get("TWEEPY_API_SECRET","")
 TWEEPY_ACCESS_TOKEN = os.environ.get("TWEEPY_ACCESS_TOKEN","")
 TWEEPY_ACCESS_SECRET = os.environ.get("TWEEPY_ACCESS_SECRET","")
 
-# Check if all keys are present
-if not all([TWITTER_SCRAPE_API_KEY, CLAUDE_API_KEY, TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, TWEEPY_API_KEY, TWEEPY_API_SECRET, TWEEPY_ACCESS_TOKEN, TWEEPY_ACCESS_SECRET]):
-    raise ValueError("One or more required environment variables are not set. Please check your GitHub Secrets.")
+
+def check_environment():
+    """
+    Raises ValueError if any required API key is missing. With an
+    ACCOUNTS_FILE the Twitter credentials are per account and checked by
+    load_accounts() instead.
+    """
+    required = [TWITTER_SCRAPE_API_KEY, CLAUDE_API_KEY, TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID]
+    if not (ACCOUNTS_FILE and os.path.exists(ACCOUNTS_FILE)):
+        required += [TWEEPY_API_KEY, TWEEPY_API_SECRET, TWEEPY_ACCESS_TOKEN, TWEEPY_ACCESS_SECRET]
+    if not all(required):
+        raise ValueError("One or more required environment variables are not set. Please check your GitHub Secrets.")
 
 # Whatsapp Texts
 whatsapp_t1 = """T"""
@@ -59,8 +135,16 @@ twitter_t2 = """"""
 
 twitter_t3 = """"""
 
+PERSONA = dict(
+    whatsapp_t1=whatsapp_t1, whatsapp_t2=whatsapp_t2, whatsapp_t3=whatsapp_t3,
+    twitter_t1=twitter_t1, twitter_t2=twitter_t2, twitter_t3=twitter_t3,
+)
+
 # Prompt Text
-PROMPT_TEXT = """
+# The prompt is split so everything that is identical on every run (persona,
+# mission, rules) comes first and can be served from Anthropic's prompt cache.
+# Only the suffix with the community tweets changes between runs.
+PROMPT_PREFIX = """
     You are an expert social media strategist and ghostwriter specializing in engaging technical communities on Twitter/X. Your goal is to write a viral tweet for me.
     1. My Writing Style (Persona to Adopt): First, understand my voice. I am knowledgeable but also witty and a bit sarcastic. Here are two paragraphs that show exactly how I talk:
 
@@ -76,13 +160,9 @@ PROMPT_TEXT = """
     {twitter_t2}
     {twitter_t3}
 
-    2. Current Community Conversation (Context): Next, analyze these recent, popular tweets from the Rust programming community to understand the current topics and mood. This is what people are talking about right now:
-
-    {formatted_tweets_string}
-
-    3. Your Mission (The Task): Based on the context of the community conversation and my personal writing style, generate a single, original tweet that is likely to get high interaction (likes, replies, retweets).
+    2. Your Mission (The Task): Based on the community conversation in section 4 and my personal writing style, generate a single, original tweet that is likely to get high interaction (likes, replies, retweets).
 
-    4. Rules:
+    3. Rules:
     a. Match My Voice: The tweet's tone must perfectly match my writing style.
     b. Be Relevant: The topic must relate to the ongoing community conversation.
     c. Be Engaging: The tweet should be interesting, ask a question, or state a sharp, insightful opinion.
@@ -90,160 +170,271 @@ PROMPT_TEXT = """
     e. The tweet should not look like its been written by a bot without em dashes, and other twitter specific things. And should be a bit more engaging.
 """
 
+PROMPT_SUFFIX = """
+    4. Current Community Conversation (Context): Now analyze these recent, popular tweets from the Rust programming community to understand the current topics and mood. This is what people are talking about right now:
+
+    {formatted_tweets_string}
 
-# API endpoint and parameters
-url = "https://api.twitterapi.io/twitter/community/tweets"
-headers = {"X-API-Key": TWITTER_SCRAPE_API_KEY}
-querystring = {"community_id":f"{COMMUNITY_ID}"}
+    Write the tweet now, following the rules in section 3.
+"""
+
+PROMPT_TEXT = PROMPT_PREFIX + PROMPT_SUFFIX
+
+
+def on_tweet_posted(tweet_store: TweetStore, account: Account, text: str):
+    tweet_store.record_generated(text, "posted", account.history_key)
+    send_error_notification(account.telegram_bot_token, account.telegram_chat_id,
+                            f"✅ Tweet posted successfully!\n\nTweet: {text}", "Success")
+
+
+def on_tweet_failed(account: Account, text: str, error):
+    send_error_notification(account.telegram_bot_token, account.telegram_chat_id,
+                            f"❌ Failed to post tweet\n\nTweet content: {text}\nError: {error}", "Posting Failed")
+
+
+def open_snapshot_run():
+    """Starts this run's snapshot archive run, or returns None if archiving is off or unavailable."""
+    if not SNAPSHOT_DIR:
+        return None
+    try:
+        return SnapshotArchive(SNAPSHOT_DIR).open_run()
+    except Exception as e:
+        print(f"⚠️ Snapshot archive unavailable, continuing without it: {e}")
+        return None
+
+
+def write_snapshot(write, *args) -> bool:
+    """
+    Calls a snapshot run's add() or commit(). The archive is optional, so a
+    failure only logs a warning; False tells the caller to stop archiving
+    for the rest of the run (the uncommitted tail is dropped on the next open).
+    """
+    try:
+        write(*args)
+        return True
+    except Exception as e:
+        print(f"⚠️ Snapshot archive write failed, archiving is off for this run: {e}")
+        return False
+
+
+def default_account() -> Account:
+    """The single account configured by the globals and environment variables above."""
+    return Account("default", COMMUNITY_IDS, PERSONA, TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID,
+                   (TWEEPY_API_KEY, TWEEPY_API_SECRET, TWEEPY_ACCESS_TOKEN, TWEEPY_ACCESS_SECRET),
+                   outbox_filename=OUTBOX_FILENAME, history_key="")
+
+
+def get_accounts() -> list:
+    """The accounts in ACCOUNTS_FILE if it exists, otherwise just default_account()."""
+    if ACCOUNTS_FILE and os.path.exists(ACCOUNTS_FILE):
+        return load_accounts(ACCOUNTS_FILE, TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID)
+    return [default_account()]
+
+
+def run_account(account: Account, context_tweets: list, tweet_store: TweetStore, outbox: Outbox,
+                posting_worker: PostingWorker):
+    """
+    Steps 2 to 5 for one account: builds its prompt from the shared context
+    tweets, generates drafts, asks for approval and queues the chosen tweet.
+    Errors are reported to the account's own Telegram chat.
+    """
+    bot_token, chat_id = account.telegram_bot_token, account.telegram_chat_id
+    prefix = f"[{account.name}] " if account.history_key else ""
+
+    # === Step 2: Create Prompt ===
+    try:
+        with metrics.span("build_prompt", account=account.name):
+            final_prompt, prompt_report = build_prompt(PROMPT_TEXT, account.persona, context_tweets, PROMPT_TOKEN_BUDGET)
+        metrics.inc("prompt_tokens_total", prompt_report["tokens_used"])
+        metrics.inc("prompt_tokens_saved_total", prompt_report["tokens_saved"])
+        prompt_prefix = PROMPT_PREFIX.format(**account.persona)
+        if not prompt_report["tweets_included"]:
+            error_msg = "Failed to format tweets for prompt - empty result"
+            send_error_notification(bot_token, chat_id, error_msg, "Data Processing Error")
+            return
+        print(f"{prefix}🧮 Prompt uses ~{prompt_report['tokens_used']}/{PROMPT_TOKEN_BUDGET} tokens with "
+              f"{prompt_report['tweets_included']} tweets (~{prompt_report['tokens_saved']} tokens saved, "
+              f"{prompt_report['duplicates_dropped']} near-duplicates and "
+              f"{prompt_report['over_budget_dropped']} over-budget tweets dropped)")
+    except Exception as e:
+        error_msg = f"Failed to format tweets or create prompt\nError: {e}"
+        send_error_notification(bot_token, chat_id, error_msg, "Prompt Error")
+        return
+
+    # === Step 3: Generate Tweet Drafts with Claude ===
+    with metrics.span("generate", account=account.name):
+        history = SimilarityIndex.from_store(tweet_store, limit=DUPLICATE_HISTORY, account=account.history_key)
+        drafts = generate_candidates(final_prompt, DRAFT_COUNT, CLAUDE_API_KEY, 0.7, bot_token,
+                                     chat_id, min_tier=MIN_MODEL_TIER, cache_prefix=prompt_prefix,
+                                     similarity_index=history, max_regenerations=MAX_REGENERATIONS,
+                                     fallback_tier=FALLBACK_MODEL_TIER)
+
+    recent_posts = tweet_store.recent_generated(("posted",), account=account.history_key)
+    best_drafts = pick_best_candidates(drafts, DRAFTS_FOR_REVIEW, recent_posts)
+    if not best_drafts:
+        error_msg = ("Claude failed to generate tweet after trying all models"
+                     " (or every draft repeated an earlier tweet)")
+        send_error_notification(bot_token, chat_id, error_msg, "AI Generation Failed")
+        print(f"{prefix}Failed to generate tweet from Claude. Exiting.")
+        return
+    for text, score, reasons in best_drafts:
+        print(f"{prefix}📝 Draft scored {score:.2f}{' (' + '; '.join(reasons) + ')' if reasons else ''}: {text}")
+
+    # === Step 4: Get Telegram Approval ===
+    candidates = [text for text, _, _ in best_drafts]
+    try:
+        outcome, generated_tweet = request_telegram_choice(bot_token, chat_id, candidates)
+    except Exception as e:
+        error_msg = f"Failed to get Telegram approval\nError: {e}"
+        send_error_notification(bot_token, chat_id, error_msg, "Telegram Error")
+        print(f"{prefix}Telegram approval failed: {e}")
+        outcome, generated_tweet = FAILED, None
+
+    # === Step 5: Queue Tweet for Posting if Approved ===
+    if outcome == APPROVED:
+        try:
+            release_at = None
+            if POST_AT_BEST_TIME:
+                release_at = best_release_time(tweet_store.load_columns(account.community_ids),
+                                               horizon_hours=POST_HORIZON_HOURS)
+            outbox.enqueue(generated_tweet, release_at)
+            posting_worker.notify()
+            if release_at and release_at > time.time():
+                print(f"{prefix}📬 Tweet scheduled for {time.strftime('%Y-%m-%d %H:%M', time.localtime(release_at))}")
+        except Exception as e:
+            error_msg = f"Error queueing tweet for posting\nTweet: {generated_tweet}\nError: {e}"
+            send_error_notification(bot_token, chat_id, error_msg, "Posting Error")
+    elif outcome == DENIED:
+        # Only drafts someone actually rejected count as history for the duplicate check
+        for text in candidates:
+            tweet_store.record_generated(text, "denied", account.history_key)
+        print(f"{prefix}Tweet not approved.")
+    else:
+        print(f"{prefix}No approval received ({outcome}); the drafts were not recorded.")
 
 
 def run_bot():
-    """Main function to run the entire tweet generation and posting process."""
-    
+    """
+    Main function to run the entire tweet generation and posting process.
+
+    Every community used by any account is scraped once and each distinct
+    set of communities is ranked once; the accounts then build their
+    prompts from that shared context and generate, get approval and post
+    in parallel, each with its own credentials, outbox and error reporting.
+    """
+    check_environment()
+    accounts = get_accounts()
+    tweet_store = None
+    outboxes, posting_workers = [], []
+    reset_usage_stats()
+    metrics.begin_run()
+
     try:
         # === Step 1: Scrape Tweets ===
-        all_tweets_data = []
-        next_cursor = None
-        url = "https://api.twitterapi.io/twitter/community/tweets"
-        headers = {"X-API-Key": TWITTER_SCRAPE_API_KEY}
-        
-        print(f"🚀 Starting to fetch up to {MAX_TWEETS} tweets...")
-        
-        scraping_attempts = 0
-        max_scraping_attempts = 3
-        
-        while len(all_tweets_data) < MAX_TWEETS and scraping_attempts < max_scraping_attempts:
-            params = {"community_id": COMMUNITY_ID}
-            if next_cursor:
-                params["cursor"] = next_cursor
-            
-            try:
-                response = requests.get(url, headers=headers, params=params)
-                response.raise_for_status()
-                data = response.json()
-                tweets_on_page = data.get('tweets', [])
-                
-                if not tweets_on_page: 
-                    print("No more tweets found")
-                    break
-                
-                for tweet in tweets_on_page:
-                    all_tweets_data.append({
-                        "username": tweet.get("author", {}).get("userName"),
-                        "created_at": tweet.get("createdAt"),
-                        "text": tweet.get("text"),
-                        "like_count": tweet.get("likeCount", 0),
-                        "retweet_count": tweet.get("retweetCount", 0),
-                        "reply_count": tweet.get("replyCount", 0),
-                        "view_count": tweet.get("viewCount", 0),
-                        "tweet_url": tweet.get("url")
-                    })
-                
-                next_cursor = data.get("next_cursor")
-                if not data.get("has_next"): break
-                time.sleep(1)
-                
-            except requests.exceptions.HTTPError as e:
-                scraping_attempts += 1
-                if e.response.status_code == 429:  # Rate limit
-                    error_msg = f"Twitter API Rate Limit Hit\nAttempt {scraping_attempts}/{max_scraping_attempts}\nWaiting 60 seconds..."
-                    send_error_notification(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, error_msg, "Rate Limit")
-                    time.sleep(60)
-                    continue
-                elif e.response.status_code == 401:  # Unauthorized
-                    error_msg = f"Twitter API Unauthorized - Invalid API Key\nCheck TWITTERAPI_IO_KEY\nError: {e}"
-                    send_error_notification(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, error_msg, "Auth Error")
-                    return
-                else:
-                    error_msg = f"Twitter API HTTP Error\nStatus: {e.response.status_code}\nError: {e}"
-                    send_error_notification(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, error_msg, "HTTP Error")
-                    break
-            except Exception as e:
-                scraping_attempts += 1
-                error_msg = f"Twitter Scraping Error\nAttempt {scraping_attempts}/{max_scraping_attempts}\nError: {e}"
-                send_error_notification(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, error_msg, "Scraping Error")
-                if scraping_attempts >= max_scraping_attempts:
-                    break
-                time.sleep(10)  # Wait before retry
-        
-        if not all_tweets_data:
+        community_ids = list(dict.fromkeys(cid for account in accounts for cid in account.community_ids))
+        print(f"🚀 Starting to fetch up to {MAX_TWEETS} tweets from {len(community_ids)} communities "
+              f"for {len(accounts)} account(s)...")
+
+        # Pages are written to the tweet store as they arrive instead of being
+        # collected into one big list first.
+        scrape_state = ScrapeState(SCRAPE_STATE_FILE)
+        scrape_reports = {}
+        new_tweet_count = 0
+        try:
+            tweet_store = TweetStore(TWEET_DB_FILENAME)
+            # Started first so tweets left in the outboxes by earlier runs go out while we scrape
+            for account in accounts:
+                outbox = Outbox(account.outbox_filename)
+                outboxes.append(outbox)
+                posting_workers.append(PostingWorker(
+                    outbox,
+                    on_posted=lambda text, tweet_id, account=account: on_tweet_posted(tweet_store, account, text),
+                    on_failed=lambda text, error, account=account: on_tweet_failed(account, text, error),
+                    client_factory=lambda account=account: get_twitter_client(*account.twitter_credentials),
+                    # Twitter rate limits are per user, so every account has its own budget
+                    rate_controller=get_controller(f"twitter:create_tweet:{account.name}", 0,
+                                                   rate_limit_pause=RATE_LIMIT_FALLBACK_SECONDS)
+                ).start())
+            snapshot_run = open_snapshot_run()
+            with metrics.span("scrape"):
+                for community_id, page in stream_communities(
+                    community_ids, TWITTER_SCRAPE_API_KEY, MAX_TWEETS, SCRAPE_REQUESTS_PER_SECOND,
+                    telegram_bot_token=TELEGRAM_BOT_TOKEN, telegram_chat_id=TELEGRAM_CHAT_ID,
+                    state=scrape_state, reports=scrape_reports,
+                    max_requests_per_second=SCRAPE_MAX_REQUESTS_PER_SECOND
+                ):
+                    with metrics.span("store_page"):
+                        new_tweet_count += tweet_store.add_tweets(page)
+                        if snapshot_run and not write_snapshot(snapshot_run.add, page):
+                            snapshot_run = None
+            if snapshot_run:
+                write_snapshot(snapshot_run.commit)
+        except Exception as e:
+            error_msg = f"Failed to save scraped tweets to the tweet store\nFile: {TWEET_DB_FILENAME}\nError: {e}"
+            send_error_notification(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, error_msg, "File Error")
+            return
+
+        savings = summarize_savings(scrape_reports, MAX_TWEETS)
+        print(f"📉 Fetched {savings['pages_fetched']} pages ({savings['credits_spent']} credits). "
+              f"Incremental scraping skipped ~{savings['pages_saved']} pages, "
+              f"saving ~{savings['credits_saved']} credits and ~{savings['seconds_saved']:.1f}s.")
+
+        if not new_tweet_count and any(report["reached_known"] for report in scrape_reports.values()):
+            print("No new tweets since the last run. Exiting.")
+            return
+
+        if not new_tweet_count:
             error_msg = "No tweets scraped after all attempts. Check community ID and API key."
             send_error_notification(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, error_msg, "Scraping Failed")
             print("No tweets scraped. Exiting.")
             return
 
-        # === Step 1.5: Save Scraped Data ===
-        try:
-            df = pd.DataFrame(all_tweets_data)
-            df.to_csv(OUTPUT_FILENAME, index=False, encoding='utf-8')
-            print(f"✅ Scraped {len(df)} tweets and saved to {OUTPUT_FILENAME}")
-        except Exception as e:
-            error_msg = f"Failed to save scraped tweets to CSV\nFile: {OUTPUT_FILENAME}\nError: {e}"
-            send_error_notification(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, error_msg, "File Error")
-            return
+        print(f"✅ Scraped {new_tweet_count} tweets into {TWEET_DB_FILENAME} ({tweet_store.count()} stored)")
 
-        # === Step 2: Format Data and Create Prompt ===
+        # === Rank the context once per distinct set of communities ===
         try:
-            formatted_tweets = format_tweets_for_prompt(OUTPUT_FILENAME)
-            if not formatted_tweets:
-                error_msg = "Failed to format tweets for prompt - empty result"
-                send_error_notification(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, error_msg, "Data Processing Error")
-                return
-                
-            final_prompt = PROMPT_TEXT.format(
-                whatsapp_t1=whatsapp_t1, whatsapp_t2=whatsapp_t2, whatsapp_t3=whatsapp_t3,
-                twitter_t1=twitter_t1, twitter_t2=twitter_t2, twitter_t3=twitter_t3,
-                formatted_tweets_string=formatted_tweets
-            )
+            since = time.time() - CONTEXT_WINDOW_HOURS * 3600
+            contexts = {}
+            with metrics.span("rank"):
+                for account in accounts:
+                    key = tuple(sorted(account.community_ids))
+                    if key not in contexts:
+                        contexts[key] = rank_stored_tweets(tweet_store, list(key), since, k=PROMPT_TWEET_COUNT,
+                                                           scorer=RANKING_SCORER,
+                                                           max_per_author=MAX_TWEETS_PER_AUTHOR,
+                                                           n_topics=TOPIC_COUNT)
+            # Only advance the high-water marks once the new tweets made it into a context
+            scrape_state.save()
         except Exception as e:
-            error_msg = f"Failed to format tweets or create prompt\nError: {e}"
+            error_msg = f"Failed to rank the scraped tweets\nError: {e}"
             send_error_notification(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, error_msg, "Prompt Error")
             return
 
-        # === Step 3: Generate Tweet with Claude ===
-        generated_tweet = get_claude_response(final_prompt, CLAUDE_API_KEY, 0.7, TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID)
-
-        if not generated_tweet:
-            error_msg = "Claude failed to generate tweet after trying all models"
-            send_error_notification(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, error_msg, "AI Generation Failed")
-            print("Failed to generate tweet from Claude. Exiting.")
-            try:
-                os.remove(OUTPUT_FILENAME)
-            except:
-                pass
-            return
+        # === Steps 2-5 per account, in parallel ===
+        with ThreadPoolExecutor(max_workers=len(accounts), thread_name_prefix="account") as executor:
+            futures = {
+                executor.submit(run_account, account, contexts[tuple(sorted(account.community_ids))],
+                                tweet_store, outbox, posting_worker): account
+                for account, outbox, posting_worker in zip(accounts, outboxes, posting_workers)
+            }
+            for future, account in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    # One account failing doesn't stop the others
+                    error_msg = f"Critical error for account '{account.name}'\nError: {e}"
+                    send_error_notification(account.telegram_bot_token, account.telegram_chat_id,
+                                            error_msg, "Critical Error")
+                    print(f"Critical error in account '{account.name}': {e}")
+
+        stats = cache_stats()
+        print(f"🗄️ Response cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+        usage = usage_stats()
+        print(f"🔢 Claude usage: {usage['input_tokens']} input tokens, {usage['output_tokens']} output tokens, "
+              f"{usage['cache_read_input_tokens']} read from and {usage['cache_creation_input_tokens']} "
+              f"written to the prompt cache")
+        print("Bot run complete.")
 
-        # === Step 4: Get Telegram Approval ===
-        try:
-            is_approved = request_telegram_approval(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, generated_tweet)
-        except Exception as e:
-            error_msg = f"Failed to get Telegram approval\nError: {e}"
-            send_error_notification(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, error_msg, "Telegram Error")
-            print(f"Telegram approval failed: {e}")
-            is_approved = False
-
-        # === Step 5: Post Tweet if Approved ===
-        if is_approved:
-            try:
-                success = post_tweet(generated_tweet, TWEEPY_API_KEY, TWEEPY_API_SECRET, TWEEPY_ACCESS_TOKEN, TWEEPY_ACCESS_SECRET)
-                if success:
-                    send_error_notification(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, f"✅ Tweet posted successfully!\n\nTweet: {generated_tweet}", "Success")
-                else:
-                    send_error_notification(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, f"❌ Failed to post tweet\n\nTweet content: {generated_tweet}", "Posting Failed")
-            except Exception as e:
-                error_msg = f"Error during tweet posting\nTweet: {generated_tweet}\nError: {e}"
-                send_error_notification(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, error_msg, "Posting Error")
-        else:
-            print("Tweet not approved. Process finished.")
-
-        # === Step 6: Cleanup ===
-        try:
-            if os.path.exists(OUTPUT_FILENAME):
-                os.remove(OUTPUT_FILENAME)
-                print("Temporary CSV file deleted. Bot run complete.")
-        except Exception as e:
-            print(f"Failed to delete CSV file: {e}")
-            
     except Exception as e:
         # Critical error handler
         error_msg = f"Critical error in run_bot()\nError: {e}"
@@ -252,13 +443,26 @@ def run_bot():
         except:
             print(f"Failed to send critical error notification: {error_msg}")
         print(f"Critical error: {e}")
-        
-        # Cleanup on critical error
-        try:
-            if 'OUTPUT_FILENAME' in locals() and os.path.exists(OUTPUT_FILENAME):
-                os.remove(OUTPUT_FILENAME)
-        except:
-            pass
+
+    finally:
+        if posting_workers:
+            with metrics.span("post_drain"):
+                deadline = time.time() + POST_DRAIN_SECONDS
+                for posting_worker in posting_workers:
+                    if not posting_worker.drain(max(0, deadline - time.time())):
+                        print("Posting is still in progress; the outbox will be retried on the next run.")
+            for posting_worker in posting_workers:
+                posting_worker.stop()
+        for outbox in outboxes:
+            outbox.close()
+        if tweet_store is not None:
+            tweet_store.close()
+
+        run_metrics = metrics.end_run(METRICS_FILE)
+        # Accounts run in parallel, so each stage reports its slowest account
+        stage_seconds = metrics.summarize_spans(run_metrics, per_thread=True)
+        stages = ", ".join(f"{name} {stage_seconds[name]:.1f}s" for name in RUN_STAGES if name in stage_seconds)
+        print(f"⏱️ Run took {run_metrics['seconds']:.1f}s: {stages}")
 
 
 if __name__ == "__main__":
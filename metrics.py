@@ -0,0 +1,183 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the duration histogram buckets exported to Prometheus.
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900)
+# Spans kept for the current run; older ones are dropped (and counted) beyond this.
+MAX_SPANS_PER_RUN = 5000
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., count, sum]
+_spans = []
+_dropped_spans = 0
+_run_started = None
+_run_baseline = {}
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels):
+    """Adds `value` to a counter, e.g. inc("claude_tokens_total", 120, type="input")."""
+    if not value:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, seconds: float, **labels):
+    """Records one duration in the histogram `name`."""
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(DURATION_BUCKETS) + 2)
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                histogram[i] += 1
+        histogram[-2] += 1
+        histogram[-1] += seconds
+
+
+@contextmanager
+def span(name: str, **labels):
+    """
+    Times a block of code:
+
+        with metrics.span("scrape"):
+            ...
+
+    The duration goes into the "span_seconds" histogram (labelled with the
+    span name) and the span itself is kept for the JSONL export of the run,
+    with "error" set if the block raised.
+    """
+    started_at, started = time.time(), time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        observe("span_seconds", seconds, span=name, **labels)
+        record = {"name": name, "start": started_at, "seconds": round(seconds, 6),
+                  "thread": threading.current_thread().name}
+        if labels:
+            record["labels"] = {str(k): str(v) for k, v in labels.items()}
+        if error:
+            record["error"] = error
+        global _dropped_spans
+        with _lock:
+            if len(_spans) < MAX_SPANS_PER_RUN:
+                _spans.append(record)
+            else:
+                _dropped_spans += 1
+
+
+def counters() -> dict:
+    """Returns the current counter values as {"name{label=value,...}": value}."""
+    with _lock:
+        return {_format_key(name, labels): value for (name, labels), value in _counters.items()}
+
+
+def _format_key(name: str, labels: tuple) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+def begin_run():
+    """Starts collecting spans and counter deltas for a new run."""
+    global _run_started, _run_baseline, _dropped_spans
+    with _lock:
+        _spans.clear()
+        _dropped_spans = 0
+        _run_started = time.time()
+        _run_baseline = dict(_counters)
+
+
+def end_run(filename: str = None, **fields) -> dict:
+    """
+    Finishes the current run and returns its record: start time, spans,
+    counter increments during the run and any extra `fields`. When
+    `filename` is given the record is appended to it as one JSON line.
+    """
+    with _lock:
+        record = {
+            "started_at": _run_started,
+            "seconds": round(time.time() - _run_started, 6) if _run_started else None,
+            **fields,
+            "counters": {_format_key(name, labels): value - _run_baseline.get((name, labels), 0)
+                         for (name, labels), value in _counters.items()
+                         if value != _run_baseline.get((name, labels), 0)},
+            "spans": list(_spans),
+        }
+        if _dropped_spans:
+            record["dropped_spans"] = _dropped_spans
+
+    if filename:
+        try:
+            with open(filename, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except Exception as e:
+            print(f"Failed to write metrics to '{filename}': {e}")
+    return record
+
+
+def summarize_spans(record: dict, per_thread: bool = False) -> dict:
+    """
+    Total seconds per span name in a run record, slowest first.
+
+    With `per_thread` the spans are totalled per thread and the slowest
+    thread is reported, so a stage that ran in several threads at once
+    (e.g. one per account) shows the time it actually took rather than the
+    sum over all threads.
+    """
+    totals = {}
+    for item in record.get("spans", []):
+        key = (item["name"], item.get("thread") if per_thread else None)
+        totals[key] = totals.get(key, 0.0) + item["seconds"]
+    slowest = {}
+    for (name, _), seconds in totals.items():
+        slowest[name] = max(slowest.get(name, 0.0), seconds)
+    return dict(sorted(slowest.items(), key=lambda entry: entry[1], reverse=True))
+
+
+def _prometheus_labels(labels, extra: tuple = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def render_prometheus() -> str:
+    """Renders every counter and histogram in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        counter_items = sorted(_counters.items())
+        histogram_items = sorted((key, list(value)) for key, value in _histograms.items())
+
+    seen = set()
+    for (name, labels), value in counter_items:
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# TYPE tweetbot_{name} counter")
+        lines.append(f"tweetbot_{name}{_prometheus_labels(labels)} {value}")
+
+    for (name, labels), histogram in histogram_items:
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# TYPE tweetbot_{name} histogram")
+        for bound, count in zip(DURATION_BUCKETS, histogram):
+            lines.append(f"tweetbot_{name}_bucket{_prometheus_labels(labels, (('le', bound),))} {count}")
+        lines.append(f"tweetbot_{name}_bucket{_prometheus_labels(labels, (('le', '+Inf'),))} {histogram[-2]}")
+        lines.append(f"tweetbot_{name}_count{_prometheus_labels(labels)} {histogram[-2]}")
+        lines.append(f"tweetbot_{name}_sum{_prometheus_labels(labels)} {histogram[-1]}")
+    return "\n".join(lines) + "\n"
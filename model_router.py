@@ -0,0 +1,225 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import metrics
+
+# A retired model is skipped for this long before it is tried again.
+DEAD_MODEL_TTL_SECONDS = 7 * 24 * 3600
+# A rate-limited or overloaded model is skipped for this long (unless the API says otherwise).
+COOLDOWN_SECONDS = 60
+# Weight of the newest observation in the latency and error-rate moving averages.
+EWMA_ALPHA = 0.3
+# Models without a latency measurement yet are assumed to take this long.
+DEFAULT_LATENCY_SECONDS = 10.0
+
+# Sentinels returned by the on_error callback of ModelRouter.run()
+NEXT_MODEL = "next"
+STOP = "stop"
+
+
+class ModelRouter:
+    """
+    Routes Claude requests to the best healthy model that meets a quality tier.
+
+    Keeps a small health table per model, persisted as JSON so it survives
+    between runs:
+        {"<model>": {"dead_until": ..., "cooldown_until": ..., "latency": ...,
+                     "error_rate": ..., "calls": ..., "last_error": ...}}
+
+    Models known to be retired or cooling down are skipped without a network
+    call. Healthy models are tried highest tier first and fastest first within
+    a tier, and when the current request has been running for longer than
+    `hedge_after_seconds` the next model of the same tier range is started in
+    parallel; whichever answers first wins. Models below `min_tier` (down to
+    `fallback_tier`) are only tried once every better model has failed or is
+    cooling down after a rate limit or overload, never as a hedge.
+
+    Every run() gets its own threads, one per model it may try, so calls made
+    from many threads at once (parallel drafts of several accounts) never wait
+    in a shared queue, and that waiting can't be mistaken for a slow model.
+    """
+
+    def __init__(self, models: list, tiers: dict = None, filename: str = "model_health.json",
+                 hedge_after_seconds: float = 15.0):
+        self.models = list(models)
+        self.tiers = tiers or {}
+        self.filename = filename
+        self.hedge_after_seconds = hedge_after_seconds
+        self._lock = threading.Lock()
+        self.health = self._load()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.filename, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Could not read model health '{self.filename}', starting fresh: {e}")
+            return {}
+
+    def _save(self):
+        if not self.filename:
+            return
+        tmp_filename = f"{self.filename}.tmp"
+        try:
+            with open(tmp_filename, "w", encoding="utf-8") as f:
+                json.dump(self.health, f, indent=2)
+            os.replace(tmp_filename, self.filename)
+        except Exception as e:
+            print(f"Failed to save model health: {e}")
+
+    def _entry(self, model: str) -> dict:
+        return self.health.setdefault(model, {"dead_until": 0, "cooldown_until": 0, "latency": None,
+                                              "error_rate": 0.0, "calls": 0, "last_error": None})
+
+    def is_available(self, model: str, now: float = None) -> bool:
+        """False while a model is marked dead or is cooling down."""
+        now = time.time() if now is None else now
+        entry = self.health.get(model)
+        if not entry:
+            return True
+        return entry.get("dead_until", 0) <= now and entry.get("cooldown_until", 0) <= now
+
+    def candidates(self, min_tier: int = 0) -> list:
+        """
+        Returns the available models at or above `min_tier`, highest tier first
+        and fastest and most reliable first within a tier. Ties keep the
+        configured CLAUDE_MODELS order.
+        """
+        now = time.time()
+        with self._lock:
+            available = [m for m in self.models if self.tiers.get(m, 0) >= min_tier and self.is_available(m, now)]
+
+            def cost(model):
+                entry = self.health.get(model, {})
+                latency = entry.get("latency") or DEFAULT_LATENCY_SECONDS
+                # An unreliable model is as good as a slow one
+                return latency * (1.0 + 4.0 * entry.get("error_rate", 0.0))
+
+            return sorted(available, key=lambda m: (-self.tiers.get(m, 0), cost(m), self.models.index(m)))
+
+    def record_success(self, model: str, latency: float):
+        with self._lock:
+            entry = self._entry(model)
+            entry["latency"] = latency if entry["latency"] is None else \
+                (1 - EWMA_ALPHA) * entry["latency"] + EWMA_ALPHA * latency
+            entry["error_rate"] = (1 - EWMA_ALPHA) * entry["error_rate"]
+            entry["calls"] += 1
+            entry["dead_until"] = 0
+            self._save()
+
+    def record_error(self, model: str, error, dead: bool = False, cooldown: float = None):
+        """
+        Records a failed call. `dead` marks the model as retired for
+        DEAD_MODEL_TTL_SECONDS; `cooldown` skips it for that many seconds.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entry(model)
+            entry["error_rate"] = (1 - EWMA_ALPHA) * entry["error_rate"] + EWMA_ALPHA
+            entry["calls"] += 1
+            entry["last_error"] = str(error)[:200]
+            if dead:
+                entry["dead_until"] = now + DEAD_MODEL_TTL_SECONDS
+            if cooldown:
+                entry["cooldown_until"] = now + cooldown
+            self._save()
+
+    def run(self, call, on_error, min_tier: int = 0, fallback_tier: int = None):
+        """
+        Calls `call(model)` on the best available model, hedging with the next
+        model whenever the current attempt is slower than `hedge_after_seconds`.
+
+        Args:
+            call: Function taking a model name and returning its result (or raising).
+            on_error: Function taking (model, exception) and returning NEXT_MODEL to
+                      fall through to the next model or STOP to give up.
+            min_tier (int): Lowest quality tier used for normal routing and hedging.
+            fallback_tier (int, optional): Lowest tier to fall back to once every model
+                                           at or above `min_tier` failed or is cooling down.
+
+        Returns:
+            tuple: (model, result) of the first successful call.
+
+        Raises:
+            The last error seen if every model failed, or RuntimeError if no
+            model was available at all.
+        """
+        lowest_tier = min_tier if fallback_tier is None else min(min_tier, fallback_tier)
+        queue = self.candidates(lowest_tier)
+        if not queue:
+            # Everything is marked unhealthy; better to try again than to fail without a call
+            queue = [m for m in self.models if self.tiers.get(m, 0) >= lowest_tier]
+            queue.sort(key=lambda m: -self.tiers.get(m, 0))
+        if not queue:
+            raise RuntimeError(f"No Claude model meets quality tier {lowest_tier}")
+
+        pending = {}  # future -> attempt
+        attempts = []
+        last_error = None
+        stopped = False
+        executor = ThreadPoolExecutor(max_workers=len(queue), thread_name_prefix="claude-hedge")
+
+        def launch():
+            attempt = {"model": queue.pop(0), "started": None}
+
+            def timed_call():
+                # The hedge clock starts when the request does, not when it was handed to the pool
+                attempt["started"] = time.monotonic()
+                return call(attempt["model"])
+
+            print(f"Trying Claude model: {attempt['model']}...")
+            attempts.append(attempt)
+            pending[executor.submit(timed_call)] = attempt
+
+        def hedge_timeout():
+            """Seconds until the newest attempt has run for hedge_after_seconds (None: never hedge)."""
+            if not queue or stopped:
+                return None
+            if self.tiers.get(queue[0], 0) < min_tier:
+                return None  # Fallback models are only used after a failure, not because of a slow answer
+            started = attempts[-1]["started"]
+            if started is None:
+                return min(self.hedge_after_seconds, 0.1)  # Not running yet; check again shortly
+            return self.hedge_after_seconds - (time.monotonic() - started)
+
+        try:
+            launch()
+            while pending:
+                timeout = hedge_timeout()
+                done = set()
+                if timeout is None or timeout > 0:
+                    done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    timeout = hedge_timeout()
+                    if timeout is not None and timeout <= 0:
+                        print(f"No answer after {self.hedge_after_seconds:.1f}s, hedging with another model...")
+                        metrics.inc("claude_hedges_total")
+                        launch()
+                    continue
+
+                for future in done:
+                    attempt = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        last_error = e
+                        if on_error(attempt["model"], e) == STOP:
+                            stopped = True
+                        continue
+                    self.record_success(attempt["model"], time.monotonic() - attempt["started"])
+                    return attempt["model"], result
+
+                if not pending and queue and not stopped:
+                    launch()
+        finally:
+            # A losing hedge finishes in the background; its result is dropped
+            executor.shutdown(wait=False)
+
+        if last_error is not None:
+            raise last_error
+        raise RuntimeError("No Claude model answered")
@@ -0,0 +1,345 @@
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING
+
+import metrics
+from rate_control import backoff_delay, get_controller
+
+if TYPE_CHECKING:
+    import tweepy
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    text        TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    not_before  INTEGER NOT NULL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    last_error  TEXT,
+    tweet_id    TEXT,
+    created_at  INTEGER NOT NULL,
+    posted_at   INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_status_time ON outbox (status, not_before);
+"""
+
+# Statuses of an outbox entry
+QUEUED = "queued"
+POSTING = "posting"
+POSTED = "posted"
+FAILED = "failed"
+
+# A post that keeps failing with server errors is given up after this many attempts.
+MAX_ATTEMPTS = 8
+# Backoff after a server error: up to RETRY_BASE_SECONDS * 2 ** (attempts - 1), capped, with jitter.
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+# Used when a 429 response carries no x-rate-limit-reset header.
+RATE_LIMIT_FALLBACK_SECONDS = 15 * 60
+
+
+class Outbox:
+    """
+    A durable queue of approved tweets waiting to be posted, kept in SQLite.
+
+    An entry is "queued" until its not_before time, "posting" while a worker
+    has it, and ends up "posted" or "failed". Entries left "posting" by a
+    crash are put back in the queue when the outbox is opened; if the tweet
+    did go out before the crash, Twitter rejects the repeat as duplicate
+    content and the worker marks it posted.
+    """
+
+    def __init__(self, filename: str = "outbox.db"):
+        self.filename = filename
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE outbox SET status = ? WHERE status = ?", (QUEUED, POSTING))
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def enqueue(self, text: str, not_before: float = None) -> int:
+        """
+        Adds an approved tweet to the outbox.
+
+        Args:
+            text (str): The tweet text.
+            not_before (float, optional): Unix time before which it must not be posted. Defaults to now.
+
+        Returns:
+            int: The id of the outbox entry.
+        """
+        now = int(time.time())
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO outbox (text, status, not_before, created_at) VALUES (?, ?, ?, ?)",
+                (text, QUEUED, int(not_before if not_before is not None else now), now)
+            )
+            return cursor.lastrowid
+
+    def claim_due(self, now: float = None):
+        """
+        Marks the oldest due entry as "posting" and returns it.
+
+        The claim only succeeds if the entry is still queued when it is
+        updated, so two processes sharing the outbox file (e.g. a daemon cycle
+        and a manual run) can never both post the same entry.
+
+        Returns:
+            sqlite3.Row: The claimed entry (with its attempts before this one),
+                         or None if nothing is due.
+        """
+        now = int(time.time() if now is None else now)
+        with self._lock:
+            while True:
+                with self.conn:
+                    row = self.conn.execute(
+                        "SELECT * FROM outbox WHERE status = ? AND not_before <= ? ORDER BY not_before, id LIMIT 1",
+                        (QUEUED, now)
+                    ).fetchone()
+                    if row is None:
+                        return None
+                    claimed = self.conn.execute(
+                        "UPDATE outbox SET status = ?, attempts = attempts + 1 WHERE id = ? AND status = ?",
+                        (POSTING, row["id"], QUEUED)
+                    ).rowcount
+                if claimed:
+                    return row
+                # Another process claimed it between our SELECT and UPDATE; try the next entry
+
+    def next_due_time(self):
+        """Returns the not_before time of the next queued entry, or None if the queue is empty."""
+        with self._lock:
+            return self.conn.execute("SELECT MIN(not_before) FROM outbox WHERE status = ?", (QUEUED,)).fetchone()[0]
+
+    def mark_posted(self, entry_id: int, tweet_id: str = None):
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE outbox SET status = ?, tweet_id = ?, posted_at = ?, last_error = NULL WHERE id = ?",
+                              (POSTED, tweet_id, int(time.time()), entry_id))
+
+    def reschedule(self, entry_id: int, not_before: float, error: str):
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE outbox SET status = ?, not_before = ?, last_error = ? WHERE id = ?",
+                              (QUEUED, int(not_before), str(error)[:500], entry_id))
+
+    def mark_failed(self, entry_id: int, error: str):
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE outbox SET status = ?, last_error = ? WHERE id = ?",
+                              (FAILED, str(error)[:500], entry_id))
+
+    def count(self, status: str = QUEUED) -> int:
+        """Returns the number of entries with the given status."""
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM outbox WHERE status = ?", (status,)).fetchone()[0]
+
+
+def _is_duplicate(error) -> bool:
+    messages = " ".join(str(message) for message in getattr(error, "api_messages", []) or [str(error)])
+    return "duplicate" in messages.lower()
+
+
+class PostingWorker:
+    """
+    Drains an Outbox from a background thread with one reused tweepy.Client.
+
+    - 429 Too Many Requests: posting pauses until the x-rate-limit-reset time.
+    - 5xx and network errors: retried with jittered exponential backoff, up to MAX_ATTEMPTS.
+    - 403 duplicate content: the tweet already went out (e.g. before a crash), so it counts as posted.
+    - Any other 4xx: the entry is marked failed; retrying would not help.
+
+    Args:
+        outbox (Outbox): The queue to drain.
+        client (tweepy.Client): Client used for create_tweet, or None to build
+                                one with `client_factory` when the first post is due.
+        on_posted: Optional function called with (text, tweet_id) after a post.
+        on_failed: Optional function called with (text, error) when an entry is given up.
+        client_factory: Optional function returning a tweepy.Client.
+        rate_controller (RateController, optional): Budget for create_tweet. Defaults
+                                                    to the process-wide "twitter:create_tweet" one.
+    """
+
+    def __init__(self, outbox: Outbox, client: "tweepy.Client" = None, on_posted=None, on_failed=None,
+                 client_factory=None, rate_controller=None):
+        self.outbox = outbox
+        self.rate_controller = rate_controller or get_controller(
+            "twitter:create_tweet", 0, rate_limit_pause=RATE_LIMIT_FALLBACK_SECONDS)
+        self.client = client
+        self.client_factory = client_factory
+        self.on_posted = on_posted
+        self.on_failed = on_failed
+        self._wakeup = threading.Event()
+        self._idle = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="tweet-outbox", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 30):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def notify(self):
+        """Wakes the worker after something was enqueued."""
+        self._idle.clear()
+        self._wakeup.set()
+
+    def drain(self, timeout: float = 60) -> bool:
+        """
+        Waits until no entry is due right now. Entries scheduled for later stay queued.
+
+        Returns:
+            bool: False if the timeout ran out first.
+        """
+        deadline = time.time() + timeout
+        while True:
+            self.notify()
+            if not self._idle.wait(max(0, deadline - time.time())):
+                return False
+            # The idle flag may predate the latest enqueue, so check the queue itself
+            next_due = self.outbox.next_due_time()
+            if (next_due is None or self._next_post_time(next_due) > time.time()) and not self.outbox.count(POSTING):
+                return True
+
+    def _next_post_time(self, next_due: float) -> float:
+        """When the next entry can go out: its due time, or later while Twitter has us rate limited."""
+        return max(next_due, self.rate_controller.blocked_until)
+
+    def post_one(self) -> bool:
+        """Posts the oldest due entry, if any. Returns False when nothing was due."""
+        if self.rate_controller.blocked_until > time.time():
+            return False
+        entry = self.outbox.claim_due()
+        if entry is None:
+            return False
+        import tweepy
+
+        entry_id, text = entry["id"], entry["text"]
+        try:
+            if self.client is None:
+                self.client = self.client_factory()
+            self.rate_controller.acquire()
+            print("Posting tweet to Twitter...")
+            with metrics.span("tweet_post"):
+                response = self.client.create_tweet(text=text)
+            tweet_id = response.data["id"] if response.data else None
+            if not tweet_id:
+                raise tweepy.errors.TweepyException(f"Response did not contain a tweet id: {response}")
+        except tweepy.errors.TooManyRequests as e:
+            # Pauses every post, not just this one, until the window resets
+            response = getattr(e, "response", None)
+            reset = self.rate_controller.on_rate_limited(response.headers if response is not None else None)
+            metrics.inc("post_retries_total", reason="rate_limit")
+            print(f"Twitter rate limit hit, retrying at {time.strftime('%H:%M:%S', time.localtime(reset))}")
+            self.outbox.reschedule(entry_id, reset, e)
+            return True
+        except tweepy.errors.Forbidden as e:
+            if _is_duplicate(e):
+                print("Tweet was already posted (duplicate content), marking it posted.")
+                self.outbox.mark_posted(entry_id)
+                if self.on_posted:
+                    self.on_posted(text, None)
+            else:
+                self._give_up(entry_id, text, e)
+            return True
+        except tweepy.errors.HTTPException as e:
+            if isinstance(e, tweepy.errors.TwitterServerError):
+                self._retry_later(entry_id, text, entry["attempts"] + 1, e)
+            else:
+                self._give_up(entry_id, text, e)
+            return True
+        except Exception as e:
+            # Network errors and the like
+            self._retry_later(entry_id, text, entry["attempts"] + 1, e)
+            return True
+
+        self.rate_controller.on_success()
+        print(f"Tweet posted successfully! Tweet ID: {tweet_id}")
+        metrics.inc("tweets_posted_total")
+        self.outbox.mark_posted(entry_id, str(tweet_id))
+        if self.on_posted:
+            self.on_posted(text, str(tweet_id))
+        return True
+
+    def _retry_later(self, entry_id: int, text: str, attempts: int, error):
+        if attempts >= MAX_ATTEMPTS:
+            self._give_up(entry_id, text, error)
+            return
+        delay = max(1.0, backoff_delay(attempts, RETRY_BASE_SECONDS, RETRY_MAX_SECONDS))
+        metrics.inc("post_retries_total", reason=type(error).__name__)
+        print(f"Posting failed ({error}), retrying in {delay:.0f}s")
+        self.outbox.reschedule(entry_id, time.time() + delay, error)
+
+    def _give_up(self, entry_id: int, text: str, error):
+        print(f"Giving up on tweet: {error}")
+        metrics.inc("tweets_failed_total")
+        self.outbox.mark_failed(entry_id, error)
+        if self.on_failed:
+            self.on_failed(text, error)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                if self.post_one():
+                    continue
+            except Exception as e:
+                print(f"Outbox worker error: {e}")
+            self._idle.set()
+            next_due = self.outbox.next_due_time()
+            wait = 60 if next_due is None else min(60, max(0.5, self._next_post_time(next_due) - time.time()))
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+
+
+def best_release_time(columns: dict, now: float = None, horizon_hours: int = 24, min_tweets: int = 20) -> float:
+    """
+    Picks the start of the hour (UTC) within the next `horizon_hours` at which
+    the stored community tweets have historically drawn the most engagement.
+
+    Args:
+        columns (dict): Columns from TweetStore.load_columns().
+        now (float, optional): Current Unix time.
+        horizon_hours (int): How far ahead a post may be scheduled.
+        min_tweets (int): Below this many timestamped tweets there is too
+                          little data, and `now` is returned.
+
+    Returns:
+        float: Unix time to release the post at (`now` if the current hour is best).
+    """
+    import numpy as np
+
+    now = time.time() if now is None else now
+    created = columns["created_ts"]
+    known = ~np.isnan(created)
+    if known.sum() < min_tweets:
+        return now
+
+    hours = (created[known] // 3600 % 24).astype(np.intp)
+    engagement = columns["like_count"][known] + 2 * columns["retweet_count"][known] + columns["reply_count"][known]
+    totals = np.bincount(hours, weights=engagement, minlength=24)
+    counts = np.bincount(hours, minlength=24)
+    # Mean engagement per hour of day; hours with no tweets never win
+    means = np.where(counts > 0, totals / np.maximum(counts, 1), -1.0)
+
+    current_hour = int(now // 3600)
+    offsets = np.arange(min(horizon_hours, 24))
+    best = int(offsets[np.argmax(means[(current_hour + offsets) % 24])])
+    return now if best == 0 else float((current_hour + best) * 3600)
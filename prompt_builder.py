@@ -0,0 +1,104 @@
+import math
+import re
+
+from tuple_maker import format_tweet
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_URL_PATTERN = re.compile(r"https?://\S+")
+_MENTION_PATTERN = re.compile(r"[@#]\w+")
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Jaccard similarity (over word 3-shingles) at which two tweets count as the same take.
+NEAR_DUPLICATE_THRESHOLD = 0.7
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates how many tokens a text costs without calling the API.
+
+    Words are charged one token per four characters (at least one) and every
+    punctuation mark, emoji or other symbol one token. This slightly
+    overestimates Claude's tokenizer for English, which is the safe side
+    for a budget.
+    """
+    return sum(math.ceil(len(piece) / 4) if piece[0].isalnum() or piece[0] == "_" else 1
+               for piece in _TOKEN_PATTERN.findall(text))
+
+
+def shingles(text: str) -> set:
+    """Word 3-shingles of a tweet, ignoring case, URLs, mentions and hashtags."""
+    text = _MENTION_PATTERN.sub(" ", _URL_PATTERN.sub(" ", str(text).lower()))
+    words = _WORD_PATTERN.findall(text)
+    if len(words) < 3:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+def jaccard(a: set, b: set) -> float:
+    """Jaccard similarity of two shingle sets."""
+    union = len(a | b)
+    return len(a & b) / union if union else 0.0
+
+
+def is_near_duplicate(text_shingles: set, seen: list, threshold: float = NEAR_DUPLICATE_THRESHOLD) -> bool:
+    """True if `text_shingles` overlaps any of the `seen` shingle sets at or above `threshold`."""
+    return any(jaccard(text_shingles, other) >= threshold for other in seen)
+
+
+def build_prompt(template: str, persona: dict, tweets, token_budget: int,
+                 duplicate_threshold: float = NEAR_DUPLICATE_THRESHOLD) -> tuple:
+    """
+    Fills the prompt template with as many of the best tweets as fit in the
+    token budget.
+
+    Tweets are taken in rank order. Near-duplicates of a tweet that is already
+    in the prompt are dropped, and a tweet that would overflow the budget is
+    skipped so shorter, lower-ranked tweets can still fill the remaining space.
+
+    Args:
+        template (str): Prompt with a {formatted_tweets_string} placeholder and
+                        one placeholder per persona key.
+        persona (dict): Values for the persona placeholders (whatsapp_t1, ...).
+        tweets: Tweet records, best first (e.g. ranking.rank_stored_tweets()).
+        token_budget (int): Maximum estimated size of the final prompt.
+        duplicate_threshold (float): Similarity at which a tweet counts as a near-duplicate.
+
+    Returns:
+        tuple: (prompt, report) where report holds tokens_used, tokens_saved,
+               token_budget, tweets_included, duplicates_dropped and over_budget_dropped.
+    """
+    fixed_tokens = estimate_tokens(template.format(formatted_tweets_string="", **persona))
+    remaining = token_budget - fixed_tokens
+
+    lines, seen = [], []
+    all_lines_tokens = 0
+    duplicates_dropped = over_budget_dropped = 0
+
+    for tweet in tweets:
+        line = format_tweet(tweet)
+        cost = estimate_tokens(line) + 1  # +1 for the ",\n" separator
+        all_lines_tokens += cost
+
+        tweet_shingles = shingles(tweet.text)
+        if is_near_duplicate(tweet_shingles, seen, duplicate_threshold):
+            duplicates_dropped += 1
+            continue
+        if cost > remaining:
+            over_budget_dropped += 1
+            continue
+
+        lines.append(line)
+        seen.append(tweet_shingles)
+        remaining -= cost
+
+    prompt = template.format(formatted_tweets_string=",\n".join(lines), **persona)
+    tokens_used = estimate_tokens(prompt)
+    report = {
+        "tokens_used": tokens_used,
+        "tokens_saved": max(0, fixed_tokens + all_lines_tokens - tokens_used),
+        "token_budget": token_budget,
+        "tweets_included": len(lines),
+        "duplicates_dropped": duplicates_dropped,
+        "over_budget_dropped": over_budget_dropped,
+    }
+    return prompt, report
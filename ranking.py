@@ -0,0 +1,197 @@
+import time
+
+import numpy as np
+
+from topic_clusters import cluster_texts, topic_priorities
+
+# Default weights for the "weighted" scorer. A reply or retweet takes more
+# effort than a like, so it says more about how much a tweet resonated.
+ENGAGEMENT_WEIGHTS = {"like_count": 1.0, "retweet_count": 2.0, "reply_count": 3.0}
+# Views added to every tweet by the "per_view" scorer, so a tweet with 3 views
+# and 2 likes doesn't outrank one with 10k views and 2k likes.
+VIEW_PRIOR = 100.0
+# Age penalty of the "velocity" scorer: score / (age_hours + 2) ** GRAVITY
+GRAVITY = 1.5
+
+
+def weighted_engagement(columns: dict, weights: dict = None, **_) -> np.ndarray:
+    """Weighted sum of likes, retweets and replies."""
+    weights = weights or ENGAGEMENT_WEIGHTS
+    score = np.zeros(len(columns["like_count"]), dtype=np.float64)
+    for name, weight in weights.items():
+        score += weight * columns[name]
+    return score
+
+
+def likes(columns: dict, **_) -> np.ndarray:
+    """Like count only, the bot's original ranking."""
+    return columns["like_count"].astype(np.float64)
+
+
+def engagement_per_view(columns: dict, weights: dict = None, view_prior: float = VIEW_PRIOR, **_) -> np.ndarray:
+    """Weighted engagement divided by (smoothed) views."""
+    return weighted_engagement(columns, weights) / (columns["view_count"] + view_prior)
+
+
+def velocity(columns: dict, weights: dict = None, now: float = None, gravity: float = GRAVITY, **_) -> np.ndarray:
+    """
+    Weighted engagement decayed by age, so a tweet that is picking up replies
+    right now outranks an older one with slightly more in total. Tweets with
+    an unknown creation time are treated as a day old.
+
+    The age is taken at "scraped_at", when the counts were observed, so a
+    tweet whose counts were last refreshed hours ago is judged by how fast
+    it gathered them rather than penalised for the time since. Without that
+    column (or for rows where it is missing) the age is taken at `now`.
+    """
+    now = time.time() if now is None else now
+    created_ts = columns["created_ts"]
+    observed_at = columns.get("scraped_at")
+    observed_at = now if observed_at is None else np.where(np.isnan(observed_at), now, observed_at)
+    age_hours = np.where(np.isnan(created_ts), 24.0, (observed_at - created_ts) / 3600.0)
+    return weighted_engagement(columns, weights) / np.power(np.maximum(age_hours, 0.0) + 2.0, gravity)
+
+
+SCORERS = {
+    "likes": likes,
+    "weighted": weighted_engagement,
+    "per_view": engagement_per_view,
+    "velocity": velocity,
+}
+
+
+def register_scorer(name: str, scorer):
+    """
+    Adds a custom scorer. A scorer takes the column dict (see
+    TweetStore.load_columns()) plus keyword options and returns one float
+    score per row as a NumPy array.
+    """
+    SCORERS[name] = scorer
+
+
+def score_tweets(columns: dict, scorer: str = "weighted", **options) -> np.ndarray:
+    """Scores every row of `columns` with the named scorer."""
+    try:
+        scorer_func = SCORERS[scorer]
+    except KeyError:
+        raise ValueError(f"Unknown scorer '{scorer}'. Available: {', '.join(SCORERS)}")
+    return scorer_func(columns, **options)
+
+
+def top_k_indices(scores: np.ndarray, k: int, authors: np.ndarray = None, max_per_author: int = None) -> np.ndarray:
+    """
+    Returns the indices of the `k` highest scores, best first.
+
+    Uses np.argpartition to find the top candidates in linear time and only
+    sorts those. When `max_per_author` is set, each author contributes at most
+    that many tweets; the candidate pool is widened until `k` tweets pass the
+    cap or every row has been considered.
+
+    Args:
+        scores (np.ndarray): One score per row.
+        k (int): Number of rows to return.
+        authors (np.ndarray, optional): Integer author code per row.
+        max_per_author (int, optional): Per-author cap.
+
+    Returns:
+        np.ndarray: Row indices ordered by descending score.
+    """
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    capped = authors is not None and max_per_author
+    pool_size = k if not capped else min(n, k * 2)
+    while True:
+        if pool_size < n:
+            pool = np.argpartition(-scores, pool_size - 1)[:pool_size]
+        else:
+            pool = np.arange(n)
+        pool = pool[np.argsort(-scores[pool], kind="stable")]
+        if not capped:
+            return pool[:k]
+
+        # Rank of each pooled tweet among its author's pooled tweets (0 = best)
+        pool_authors = authors[pool]
+        by_author = np.lexsort((np.arange(len(pool)), pool_authors))
+        sorted_authors = pool_authors[by_author]
+        group_start = np.r_[0, np.flatnonzero(sorted_authors[1:] != sorted_authors[:-1]) + 1]
+        group_sizes = np.diff(np.r_[group_start, len(pool)])
+        rank_in_group = np.arange(len(pool)) - np.repeat(group_start, group_sizes)
+        author_rank = np.empty(len(pool), dtype=np.intp)
+        author_rank[by_author] = rank_in_group
+
+        selected = pool[author_rank < max_per_author]
+        if len(selected) >= k or pool_size >= n:
+            return selected[:k]
+        pool_size = min(n, pool_size * 2)
+
+
+def rank_tweets(columns: dict, k: int = 50, scorer: str = "weighted", max_per_author: int = None,
+                **options) -> tuple:
+    """
+    Scores and selects the top `k` rows of a column batch.
+
+    Args:
+        columns (dict): Column arrays as returned by TweetStore.load_columns().
+        k (int): Number of tweets to select.
+        scorer (str): Name of a scorer in SCORERS.
+        max_per_author (int, optional): Per-author diversity cap.
+        **options: Passed to the scorer (weights, now, view_prior, gravity).
+
+    Returns:
+        tuple: (row indices best first, their scores)
+    """
+    scores = score_tweets(columns, scorer, **options)
+    authors = columns["author_code"] if max_per_author else None
+    indices = top_k_indices(scores, k, authors, max_per_author)
+    return indices, scores[indices]
+
+
+def rank_topics(columns: dict, k: int = 50, n_topics: int = 12, scorer: str = "weighted",
+                max_per_author: int = None, **options) -> tuple:
+    """
+    Like rank_tweets(), but spreads the `k` picks over topics.
+
+    The rows are clustered by their text (see topic_clusters.py) and each
+    topic gets a share of the `k` slots proportional to its total score,
+    filled with its best tweets, so one viral thread can't take over the prompt.
+
+    Args:
+        columns (dict): Column arrays from TweetStore.load_columns(with_text=True).
+        n_topics (int): Number of topic clusters.
+
+    Returns:
+        tuple: (row indices in selection order, their scores)
+    """
+    scores = score_tweets(columns, scorer, **options)
+    labels = cluster_texts(columns["text"], n_topics)
+    authors = columns["author_code"] if max_per_author else None
+    indices = top_k_indices(topic_priorities(scores, labels), k, authors, max_per_author)
+    return indices, scores[indices]
+
+
+def rank_stored_tweets(store, community_ids=None, since=None, k: int = 50, scorer: str = "weighted",
+                       max_per_author: int = None, n_topics: int = 0, **options) -> list:
+    """
+    Ranks the tweet corpus and returns the selected tweets as Tweet records.
+
+    Only the numeric columns are loaded for scoring; the full rows (with text)
+    are fetched for the `k` survivors alone. With `n_topics` the text is
+    loaded as well and the picks are spread over that many topics (rank_topics()).
+
+    Returns:
+        list: Tweet records, best first, each with its `score` set.
+    """
+    columns = store.load_columns(community_ids, since, with_text=bool(n_topics))
+    if not len(columns["tweet_key"]):
+        return []
+    if n_topics:
+        indices, scores = rank_topics(columns, k, n_topics, scorer, max_per_author, **options)
+    else:
+        indices, scores = rank_tweets(columns, k, scorer, max_per_author, **options)
+    tweets = store.get_tweets(columns["tweet_key"][indices].tolist())
+    for tweet, score in zip(tweets, scores.tolist()):
+        tweet.score = score
+    return tweets
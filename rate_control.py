@@ -0,0 +1,247 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import metrics
+
+# Rate increase (requests per second) after every successful request.
+ADDITIVE_INCREASE = 0.05
+# Factor the rate is multiplied by after a 429.
+MULTIPLICATIVE_DECREASE = 0.5
+# Exponential backoff: BACKOFF_BASE_SECONDS * 2 ** (failures - 1), capped, with full jitter.
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 120.0
+# Pause after a 429 whose response says nothing about when to retry.
+DEFAULT_RATE_LIMIT_PAUSE_SECONDS = 30.0
+
+
+def backoff_delay(failures: int, base: float = BACKOFF_BASE_SECONDS, cap: float = BACKOFF_MAX_SECONDS) -> float:
+    """
+    Exponential backoff with full jitter: a random delay between 0 and
+    base * 2 ** (failures - 1), capped at `cap`. The jitter keeps parallel
+    workers that failed together from retrying in lockstep.
+    """
+    if failures <= 0:
+        return 0.0
+    return random.uniform(0, min(cap, base * 2 ** (failures - 1)))
+
+
+def _parse_time(value: str, now: float):
+    """Parses a reset/retry value: delta seconds, epoch seconds, RFC 3339 or an HTTP date."""
+    value = str(value).strip()
+    try:
+        number = float(value)
+        # Small numbers are relative seconds, large ones epoch timestamps
+        return number if number > 1e9 else now + number
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return moment.timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_rate_limit_headers(headers, now: float = None) -> dict:
+    """
+    Reads the rate-limit headers of any of the APIs the bot talks to.
+
+    Understands Retry-After, Twitter's x-rate-limit-*, the common
+    x-ratelimit-* / ratelimit-* forms and Anthropic's
+    anthropic-ratelimit-requests-*.
+
+    Returns:
+        dict: Any of "limit", "remaining" (ints), "reset_at" and "retry_at"
+              (Unix times) that the headers provided.
+    """
+    now = time.time() if now is None else now
+    if not headers:
+        return {}
+    lowered = {str(name).lower(): value for name, value in headers.items()}
+    info = {}
+
+    retry_after = lowered.get("retry-after")
+    if retry_after is not None:
+        retry_at = _parse_time(retry_after, now)
+        if retry_at is not None:
+            info["retry_at"] = retry_at
+
+    for prefix in ("x-rate-limit-", "x-ratelimit-", "ratelimit-", "anthropic-ratelimit-requests-"):
+        for field in ("limit", "remaining"):
+            value = lowered.get(prefix + field)
+            if value is not None and field not in info:
+                try:
+                    info[field] = int(float(value))
+                except ValueError:
+                    pass
+        reset = lowered.get(prefix + "reset")
+        if reset is not None and "reset_at" not in info:
+            reset_at = _parse_time(reset, now)
+            if reset_at is not None:
+                info["reset_at"] = reset_at
+    return info
+
+
+class RateController:
+    """
+    Paces requests to one endpoint with a token bucket whose rate adapts (AIMD).
+    An unlimited controller (rate 0) only honours the pauses and quotas the
+    API itself announces.
+
+    Every caller takes a token with acquire() before its request and reports
+    the outcome afterwards. Each success raises the rate by ADDITIVE_INCREASE
+    up to `max_rate`; a 429 halves it (down to `min_rate`) and pauses the
+    endpoint until the time the response asked for. When the response headers
+    show the remaining quota, the rate is also capped at what spreads that
+    quota evenly until the reset, so the limit is approached without being hit.
+
+    Args:
+        name (str): Endpoint name, used in metrics and log lines.
+        rate (float): Starting rate in requests per second (0 or less means unlimited).
+        max_rate (float, optional): Ceiling for the rate. Defaults to `rate`.
+        min_rate (float): Floor for the rate after repeated 429s.
+        burst (int): Tokens that can be saved up while idle.
+        rate_limit_pause (float): Pause after a 429 whose response says nothing about when to retry.
+    """
+
+    def __init__(self, name: str, rate: float, max_rate: float = None, min_rate: float = 0.02, burst: int = 1,
+                 rate_limit_pause: float = DEFAULT_RATE_LIMIT_PAUSE_SECONDS):
+        self.name = name
+        self.unlimited = rate <= 0
+        self.max_rate = max_rate if max_rate is not None else rate
+        self.min_rate = min(min_rate, self.max_rate) if self.max_rate > 0 else min_rate
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.rate_limit_pause = rate_limit_pause
+        self.failures = 0
+        self.blocked_until = 0.0
+        self._quota_rate = None
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_max_rate(self, max_rate: float):
+        """Changes the ceiling (0 or less means unlimited), keeping what has been learned below it."""
+        with self._lock:
+            self.unlimited = max_rate <= 0
+            self.max_rate = max_rate
+            if not self.unlimited:
+                self.rate = min(self.rate, max_rate) if self.rate > 0 else max_rate
+                self.min_rate = min(self.min_rate, max_rate)
+
+    def _effective_rate(self) -> float:
+        if self.unlimited:
+            return self._quota_rate or 0.0
+        return min(self.rate, self._quota_rate) if self._quota_rate else self.rate
+
+    def reserve(self) -> float:
+        """Takes a token and returns how many seconds the caller has to wait before using it."""
+        with self._lock:
+            wait = max(0.0, self.blocked_until - time.time())
+            rate = self._effective_rate()
+            if rate <= 0:
+                return wait
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens < 0:
+                wait = max(wait, -self._tokens / rate)
+            return wait
+
+    def acquire(self) -> float:
+        """Blocks until the caller may send its request. Returns the seconds waited."""
+        wait = self.reserve()
+        if wait > 0:
+            metrics.observe("rate_wait_seconds", wait, endpoint=self.name)
+            time.sleep(wait)
+        return wait
+
+    def on_success(self, headers=None):
+        """Reports a successful request, with its response headers if available."""
+        info = parse_rate_limit_headers(headers)
+        with self._lock:
+            self.failures = 0
+            if not self.unlimited:
+                self.rate = min(self.max_rate, self.rate + ADDITIVE_INCREASE)
+            self._apply_quota(info)
+
+    def on_rate_limited(self, headers=None, retry_after: float = None) -> float:
+        """
+        Reports a 429. Pauses the endpoint until the time given by `retry_after`
+        (seconds) or the headers, or for an exponential backoff if neither says.
+
+        Returns:
+            float: Unix time at which the endpoint may be called again.
+        """
+        info = parse_rate_limit_headers(headers)
+        now = time.time()
+        with self._lock:
+            self.failures += 1
+            if not self.unlimited:
+                self.rate = max(self.min_rate, self.rate * MULTIPLICATIVE_DECREASE)
+            if retry_after is not None:
+                resume = now + retry_after
+            elif "retry_at" in info or "reset_at" in info:
+                resume = info.get("retry_at") or info["reset_at"]
+            else:
+                resume = now + max(self.rate_limit_pause * random.uniform(0.5, 1.0),
+                                   backoff_delay(self.failures))
+            # A little jitter so parallel workers don't all come back in the same instant
+            self.blocked_until = max(self.blocked_until, resume + random.uniform(0, 0.5))
+            resume_at = self.blocked_until
+        metrics.inc("rate_limited_total", endpoint=self.name)
+        return resume_at
+
+    def on_error(self) -> float:
+        """
+        Reports a failure that is not a rate limit (5xx, network error).
+
+        Returns:
+            float: Seconds to back off before retrying.
+        """
+        with self._lock:
+            self.failures += 1
+            failures = self.failures
+        metrics.inc("rate_backoffs_total", endpoint=self.name)
+        return backoff_delay(failures)
+
+    def _apply_quota(self, info: dict):
+        remaining, reset_at = info.get("remaining"), info.get("reset_at")
+        if remaining is None or reset_at is None:
+            return
+        window = reset_at - time.time()
+        if remaining <= 0 and window > 0:
+            self.blocked_until = max(self.blocked_until, reset_at)
+            self._quota_rate = None
+        elif window > 0:
+            # Spread what is left of the quota over the rest of the window
+            self._quota_rate = max(self.min_rate, remaining / window)
+        else:
+            self._quota_rate = None
+
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+
+def get_controller(name: str, rate: float, max_rate: float = None, **options) -> RateController:
+    """
+    Returns the process-wide RateController for an endpoint, creating it with
+    the given settings on first use, so every caller of the same endpoint
+    shares one budget.
+    """
+    with _controllers_lock:
+        controller = _controllers.get(name)
+        if controller is None:
+            controller = RateController(name, rate, max_rate, **options)
+            _controllers[name] = controller
+        return controller
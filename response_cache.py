@@ -0,0 +1,126 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    cache_key   TEXT PRIMARY KEY,
+    model       TEXT NOT NULL,
+    response    TEXT NOT NULL,
+    created_at  REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access);
+"""
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt_text: str) -> str:
+    """Collapses whitespace so re-indented or re-wrapped prompts share a cache entry."""
+    return _WHITESPACE.sub(" ", prompt_text).strip()
+
+
+def make_cache_key(model: str, temperature: float, prompt_text: str, **params) -> str:
+    """Hashes the model, temperature, extra parameters and normalized prompt into a cache key."""
+    payload = json.dumps({
+        "model": model,
+        "temperature": round(float(temperature), 4),
+        "params": params,
+        "prompt": hashlib.sha256(normalize_prompt(prompt_text).encode("utf-8")).hexdigest(),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    A persistent SQLite cache of Claude responses.
+
+    Entries expire after `ttl_seconds` and the cache keeps at most
+    `max_entries` responses, evicting the least recently used ones first.
+    Hit/miss counters for the current process are available from stats().
+    """
+
+    def __init__(self, filename: str = "claude_cache.db", ttl_seconds: float = 24 * 3600, max_entries: int = 500):
+        self.filename = filename
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "writes": 0}
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def get(self, cache_key: str):
+        """Returns the cached response text, or None on a miss or an expired entry."""
+        return self.get_first([cache_key])[1]
+
+    def get_first(self, cache_keys: list) -> tuple:
+        """
+        Looks the keys up in order and returns the first live entry, counting
+        one hit or one miss for the whole lookup however many keys were tried.
+
+        Returns:
+            tuple: (index of the key that hit, response text), or (None, None).
+        """
+        now = time.time()
+        with self._lock:
+            for index, cache_key in enumerate(cache_keys):
+                response = self._lookup(cache_key, now)
+                if response is not None:
+                    self._stats["hits"] += 1
+                    return index, response
+            self._stats["misses"] += 1
+            return None, None
+
+    def _lookup(self, cache_key: str, now: float):
+        """One key, without touching the hit/miss counters. Expired entries are deleted. Call with the lock held."""
+        row = self.conn.execute(
+            "SELECT response, created_at FROM responses WHERE cache_key = ?", (cache_key,)
+        ).fetchone()
+        if row is None:
+            return None
+        response, created_at = row
+        with self.conn:
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self.conn.execute("DELETE FROM responses WHERE cache_key = ?", (cache_key,))
+                self._stats["expired"] += 1
+                return None
+            self.conn.execute("UPDATE responses SET last_access = ? WHERE cache_key = ?", (now, cache_key))
+        return response
+
+    def put(self, cache_key: str, model: str, response: str):
+        """Stores a response and evicts the least recently used entries over the size limit."""
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (cache_key, model, response, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (cache_key, model, response, now, now)
+            )
+            self._stats["writes"] += 1
+            evicted = self.conn.execute("""
+                DELETE FROM responses WHERE cache_key IN (
+                    SELECT cache_key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,)).rowcount
+            self._stats["evictions"] += max(0, evicted)
+
+    def clear(self):
+        """Removes every cached response."""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM responses")
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters for this process plus the current entry count."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,64 @@
+import json
+import os
+import time
+
+
+class ScrapeState:
+    """
+    Persists, per community, the newest tweet id and the last cursor seen by
+    the scraper so the next run only has to fetch tweets newer than that id.
+
+    The state is a small JSON file:
+        {"<community_id>": {"newest_tweet_id": "...", "cursor": "...", "updated_at": 1700000000}}
+    """
+
+    def __init__(self, filename: str = "scrape_state.json"):
+        self.filename = filename
+        self.communities = {}
+        self.load()
+
+    def load(self):
+        """Loads the state file. A missing or corrupt file means a full scrape."""
+        try:
+            with open(self.filename, "r", encoding="utf-8") as f:
+                self.communities = json.load(f)
+        except FileNotFoundError:
+            self.communities = {}
+        except Exception as e:
+            print(f"Could not read scrape state '{self.filename}', starting fresh: {e}")
+            self.communities = {}
+
+    def save(self):
+        """Writes the state atomically so a crash never leaves a half-written file."""
+        tmp_filename = f"{self.filename}.tmp"
+        with open(tmp_filename, "w", encoding="utf-8") as f:
+            json.dump(self.communities, f, indent=2)
+        os.replace(tmp_filename, self.filename)
+
+    def newest_tweet_id(self, community_id: str):
+        """Returns the newest tweet id seen for a community, or None."""
+        return self.communities.get(community_id, {}).get("newest_tweet_id")
+
+    def update(self, community_id: str, newest_tweet_id=None, cursor=None):
+        """Records the high-water mark of a finished scrape for one community."""
+        entry = self.communities.setdefault(community_id, {})
+        if newest_tweet_id is not None and is_newer(newest_tweet_id, entry.get("newest_tweet_id")):
+            entry["newest_tweet_id"] = str(newest_tweet_id)
+        if cursor is not None:
+            entry["cursor"] = cursor
+        entry["updated_at"] = int(time.time())
+
+
+def is_newer(tweet_id, other_id) -> bool:
+    """
+    Compares two tweet ids. Tweet ids are snowflakes, so a larger id is a
+    newer tweet. Anything is newer than a missing id.
+    """
+    if tweet_id is None:
+        return False
+    if other_id is None:
+        return True
+    try:
+        return int(tweet_id) > int(other_id)
+    except (TypeError, ValueError):
+        return str(tweet_id) != str(other_id)
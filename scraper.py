@@ -0,0 +1,332 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from rate_control import get_controller
+from scrape_state import is_newer
+from telegram_handler import send_error_notification
+from tweet_record import Tweet
+
+# TWITTERAPI_IO_BASE_URL points the scraper at another host, e.g. the local fake in fake_services.py.
+TWITTERAPI_IO_BASE_URL = os.environ.get("TWITTERAPI_IO_BASE_URL", "https://api.twitterapi.io")
+COMMUNITY_TWEETS_URL = f"{TWITTERAPI_IO_BASE_URL}/twitter/community/tweets"
+# twitterapi.io bills every community-tweets call at this many credits.
+CREDITS_PER_CALL = 300
+# A community gives up after this long waiting on 429s in one run.
+MAX_RATE_LIMIT_WAIT_SECONDS = 600
+
+
+def create_session(api_key: str, pool_size: int = 10) -> requests.Session:
+    """
+    Creates a requests.Session that keeps connections to twitterapi.io alive
+    between pages and between communities.
+
+    Args:
+        api_key (str): Your twitterapi.io API key.
+        pool_size (int): Maximum number of pooled keep-alive connections.
+
+    Returns:
+        requests.Session: A session with the API key header already set.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"X-API-Key": api_key})
+    return session
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(api_key: str, pool_size: int = 10) -> requests.Session:
+    """
+    Returns a process-wide session from create_session(), so a long-running
+    process keeps its connections to twitterapi.io warm between runs.
+    """
+    with _sessions_lock:
+        session = _sessions.get((api_key, pool_size))
+        if session is None:
+            session = create_session(api_key, pool_size)
+            _sessions[(api_key, pool_size)] = session
+        return session
+
+
+def iter_community_pages(session: requests.Session, community_id: str, max_tweets: int, rate_controller,
+                         report: dict, telegram_bot_token: str = None, telegram_chat_id: str = None,
+                         max_attempts: int = 5, known_tweet_id: str = None):
+    """
+    Follows the `next_cursor` chain of a single community until `max_tweets`
+    tweets are collected, the API runs out of pages, or a tweet we already
+    saw in a previous run (`known_tweet_id` or older) comes up.
+
+    Pages are yielded as soon as they arrive, so the caller never has to hold
+    the whole community in memory.
+
+    Args:
+        session (requests.Session): Shared session from create_session().
+        community_id (str): The community to scrape.
+        max_tweets (int): Stop once this many tweets are collected.
+        rate_controller (RateController): twitterapi.io budget shared with the other communities.
+        report (dict): Filled in with the scrape statistics, see new_report().
+        telegram_bot_token (str, optional): Used for error notifications.
+        telegram_chat_id (str, optional): Used for error notifications.
+        max_attempts (int): Consecutive failed requests (other than 429s) tolerated before giving up.
+        known_tweet_id (str, optional): Newest tweet id seen by the previous run.
+
+    Yields:
+        list: The new Tweet records of one page, tagged with their community_id.
+    """
+    def notify(message, error_type):
+        if telegram_bot_token and telegram_chat_id:
+            send_error_notification(telegram_bot_token, telegram_chat_id, message, error_type)
+
+    next_cursor = None
+    attempts = 0
+    rate_limited_seconds = 0.0
+    started = time.monotonic()
+
+    try:
+        while report["tweet_count"] < max_tweets and attempts < max_attempts and not report["reached_known"]:
+            params = {"community_id": community_id}
+            if next_cursor:
+                params["cursor"] = next_cursor
+
+            try:
+                with metrics.span("scrape_rate_wait"):
+                    rate_controller.acquire()
+                with metrics.span("scrape_page"):
+                    response = session.get(COMMUNITY_TWEETS_URL, params=params)
+                    metrics.inc("scrape_requests_total", status=response.status_code)
+                    response.raise_for_status()
+                    data = response.json()
+                rate_controller.on_success(response.headers)
+                attempts = 0
+                tweets_on_page = data.get('tweets', [])
+                report["pages"] += 1
+                metrics.inc("scrape_pages_total")
+                metrics.inc("scrape_credits_total", CREDITS_PER_CALL)
+
+                if not tweets_on_page:
+                    print(f"[{community_id}] No more tweets found")
+                    break
+
+                page = []
+                for raw_tweet in tweets_on_page:
+                    if report["tweet_count"] + len(page) >= max_tweets:
+                        break
+                    tweet = Tweet.from_api(raw_tweet, community_id)
+                    if known_tweet_id and not is_newer(tweet.tweet_id, known_tweet_id):
+                        print(f"[{community_id}] Reached tweets seen in the previous run")
+                        report["reached_known"] = True
+                        break
+                    if is_newer(tweet.tweet_id, report["newest_tweet_id"]):
+                        report["newest_tweet_id"] = tweet.tweet_id
+                    page.append(tweet)
+
+                next_cursor = data.get("next_cursor")
+                report["cursor"] = next_cursor
+                report["tweet_count"] += len(page)
+                metrics.inc("scrape_tweets_total", len(page))
+                if page:
+                    yield page
+                if not data.get("has_next"):
+                    break
+
+            except requests.exceptions.HTTPError as e:
+                metrics.inc("scrape_retries_total" if e.response.status_code in (429, 500, 502, 503, 504)
+                            else "scrape_errors_total", reason=e.response.status_code)
+                if e.response.status_code == 429:  # Rate limit
+                    # The next acquire() waits until the time the response asked for
+                    resume_at = rate_controller.on_rate_limited(e.response.headers)
+                    wait = max(0.0, resume_at - time.time())
+                    rate_limited_seconds += wait
+                    if rate_limited_seconds > MAX_RATE_LIMIT_WAIT_SECONDS:
+                        notify(f"Twitter API Rate Limit Hit\nCommunity: {community_id}\n"
+                               f"Still throttled after {rate_limited_seconds:.0f}s, giving up for this run", "Rate Limit")
+                        break
+                    print(f"[{community_id}] Rate limited, retrying in {wait:.1f}s")
+                    continue
+                attempts += 1
+                if e.response.status_code >= 500 and attempts < max_attempts:
+                    delay = rate_controller.on_error()
+                    print(f"[{community_id}] Server error {e.response.status_code}, retrying in {delay:.1f}s")
+                    time.sleep(delay)
+                    continue
+                elif e.response.status_code == 401:  # Unauthorized
+                    error_msg = f"Twitter API Unauthorized - Invalid API Key\nCheck TWITTERAPI_IO_KEY\nError: {e}"
+                    notify(error_msg, "Auth Error")
+                    break
+                else:
+                    error_msg = f"Twitter API HTTP Error\nCommunity: {community_id}\nStatus: {e.response.status_code}\nError: {e}"
+                    notify(error_msg, "HTTP Error")
+                    break
+            except Exception as e:
+                attempts += 1
+                metrics.inc("scrape_retries_total", reason=type(e).__name__)
+                error_msg = f"Twitter Scraping Error\nCommunity: {community_id}\nAttempt {attempts}/{max_attempts}\nError: {e}"
+                notify(error_msg, "Scraping Error")
+                if attempts >= max_attempts:
+                    break
+                time.sleep(rate_controller.on_error())  # Exponential backoff with jitter
+    finally:
+        report["elapsed"] = time.monotonic() - started
+
+
+def new_report() -> dict:
+    """
+    Returns an empty per-community scrape report:
+        "tweet_count": number of new tweets collected,
+        "pages": number of API calls that returned data,
+        "reached_known": True if paging stopped at an already seen tweet,
+        "newest_tweet_id": newest tweet id seen in this run (or None),
+        "cursor": the last cursor returned by the API,
+        "elapsed": seconds spent scraping the community.
+    """
+    return {"tweet_count": 0, "pages": 0, "reached_known": False,
+            "newest_tweet_id": None, "cursor": None, "elapsed": 0.0}
+
+
+_DONE = object()  # Queue sentinel: one community finished
+
+
+def stream_communities(community_ids: list, api_key: str, max_tweets: int = 50, requests_per_second: float = 1.0,
+                       max_workers: int = None, telegram_bot_token: str = None, telegram_chat_id: str = None,
+                       state=None, reports: dict = None, max_pending_pages: int = 8,
+                       max_requests_per_second: float = None):
+    """
+    Scrapes several communities in parallel over one pooled HTTP session and
+    streams their pages back as they arrive.
+
+    Each community follows its own cursor chain on a worker thread, so the
+    total scrape time grows with the slowest community rather than with the
+    total number of pages. All workers share one RateController for
+    twitterapi.io, which starts at `requests_per_second`, speeds up towards
+    `max_requests_per_second` while requests succeed and backs off on 429s
+    as the response headers direct. Pages travel
+    through a bounded queue, so workers pause when the consumer falls behind
+    and memory stays at `max_pending_pages` pages.
+
+    When a ScrapeState is given, each community stops paging as soon as it
+    reaches the newest tweet recorded by the previous run, and the state is
+    advanced to the newest tweet seen now. Saving the state is left to the
+    caller so a failed run can be retried from the same point.
+
+    Args:
+        community_ids (list): Community ids to scrape.
+        api_key (str): Your twitterapi.io API key.
+        max_tweets (int): Maximum number of tweets to collect per community.
+        requests_per_second (float): Starting combined request rate across all communities (0 for unlimited).
+        max_requests_per_second (float, optional): Ceiling for the adaptive rate. Defaults to `requests_per_second`;
+                                                   ignored when `requests_per_second` is 0.
+        max_workers (int, optional): Thread count. Defaults to one per community.
+        state (ScrapeState, optional): Per-community high-water marks for incremental scraping.
+        reports (dict, optional): Filled with one new_report() per community id.
+        max_pending_pages (int): Size of the page queue between workers and consumer.
+
+    Yields:
+        tuple: (community_id, list of Tweet records) for every page scraped.
+    """
+    community_ids = [cid for cid in dict.fromkeys(community_ids) if cid]
+    if not community_ids:
+        return
+    if reports is None:
+        reports = {}
+
+    workers = max_workers or len(community_ids)
+    rate_controller = get_controller("twitterapi.io", requests_per_second)
+    if requests_per_second <= 0 or max_requests_per_second is None:
+        max_requests_per_second = requests_per_second
+    rate_controller.set_max_rate(max_requests_per_second)
+    pages = queue.Queue(maxsize=max_pending_pages)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker(cid):
+        try:
+            known_tweet_id = state.newest_tweet_id(cid) if state else None
+            for page in iter_community_pages(session, cid, max_tweets, rate_controller, reports[cid],
+                                             telegram_bot_token, telegram_chat_id, known_tweet_id=known_tweet_id):
+                if not put((cid, page)):
+                    return
+        except Exception as e:
+            print(f"[{cid}] Scraping failed: {e}")
+        finally:
+            put((cid, _DONE))
+
+    for cid in community_ids:
+        reports[cid] = new_report()
+
+    session = get_session(api_key, pool_size=workers)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for cid in community_ids:
+            executor.submit(worker, cid)
+
+        remaining = len(community_ids)
+        while remaining:
+            cid, page = pages.get()
+            if page is _DONE:
+                remaining -= 1
+                report = reports[cid]
+                if state is not None:
+                    state.update(cid, report["newest_tweet_id"], report["cursor"])
+                print(f"[{cid}] Collected {report['tweet_count']} new tweets in {report['pages']} pages")
+                continue
+            yield cid, page
+    finally:
+        stop.set()
+        executor.shutdown(wait=True)
+
+
+def summarize_savings(results: dict, max_tweets: int) -> dict:
+    """
+    Estimates what incremental scraping saved compared to re-paging every
+    community from the top.
+
+    A community that stopped at a known tweet would otherwise have kept
+    paging until `max_tweets`, so the pages it skipped are estimated from the
+    average page size and page latency observed in this run.
+
+    Args:
+        results (dict): The reports filled in by stream_communities().
+        max_tweets (int): The per-community limit used for the run.
+
+    Returns:
+        dict: pages_fetched, pages_saved, credits_spent, credits_saved and seconds_saved.
+    """
+    pages_fetched = sum(r["pages"] for r in results.values())
+    tweets_fetched = sum(r["tweet_count"] for r in results.values())
+    elapsed = sum(r["elapsed"] for r in results.values())
+
+    page_size = tweets_fetched / pages_fetched if tweets_fetched and pages_fetched else 20
+    seconds_per_page = elapsed / pages_fetched if pages_fetched else 0.0
+
+    pages_saved = 0
+    for r in results.values():
+        if r["reached_known"]:
+            full_pages = -(-max_tweets // max(1, int(round(page_size))))
+            pages_saved += max(0, full_pages - r["pages"])
+
+    return {
+        "pages_fetched": pages_fetched,
+        "pages_saved": pages_saved,
+        "credits_spent": pages_fetched * CREDITS_PER_CALL,
+        "credits_saved": pages_saved * CREDITS_PER_CALL,
+        "seconds_saved": pages_saved * seconds_per_page,
+    }
@@ -0,0 +1,114 @@
+import numpy as np
+
+from prompt_builder import jaccard, shingles
+
+# Jaccard similarity (over word 3-shingles) at which a draft repeats something the bot already wrote.
+DUPLICATE_THRESHOLD = 0.4
+# MinHash signature length and LSH banding: 32 bands of 2 rows put a pair with
+# Jaccard 0.4 in a shared bucket >99% of the time and one with 0.05 only ~8% of the time.
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 32
+
+_PRIME = (1 << 31) - 1  # Mersenne prime for the universal hash family
+_SEED = 20240611
+
+
+class SimilarityIndex:
+    """
+    MinHash + LSH index over tweets the bot has already generated.
+
+    Each text is reduced to its word 3-shingles (prompt_builder.shingles),
+    hashed into a MinHash signature and filed under one bucket per LSH band.
+    A query only compares against the texts sharing a bucket with it, and
+    confirms them with the exact Jaccard similarity, so checking a draft
+    takes well under a millisecond however large the history grows.
+
+    Args:
+        threshold (float): Jaccard similarity at or above which a text counts as a near-duplicate.
+        num_permutations (int): MinHash signature length.
+        bands (int): Number of LSH bands; must divide `num_permutations`.
+    """
+
+    def __init__(self, threshold: float = DUPLICATE_THRESHOLD, num_permutations: int = NUM_PERMUTATIONS,
+                 bands: int = LSH_BANDS):
+        if num_permutations % bands:
+            raise ValueError("num_permutations must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        rng = np.random.default_rng(_SEED)
+        self._a = rng.integers(1, _PRIME, num_permutations, dtype=np.int64)
+        self._b = rng.integers(0, _PRIME, num_permutations, dtype=np.int64)
+        self._buckets = [{} for _ in range(bands)]  # band -> {band signature: [entry index, ...]}
+        self._texts = []
+        self._labels = []
+        self._shingles = []
+
+    def __len__(self):
+        return len(self._texts)
+
+    def _band_keys(self, shingle_sets: list) -> list:
+        """LSH bucket keys (one int per band) of every shingle set, computed in one vectorized pass."""
+        lengths = np.fromiter((len(text_shingles) for text_shingles in shingle_sets), dtype=np.intp,
+                              count=len(shingle_sets))
+        # hash() is salted per process, which is fine: the index is rebuilt in every process
+        hashes = np.fromiter((hash(shingle) & 0x7FFFFFFF
+                              for text_shingles in shingle_sets for shingle in text_shingles),
+                             dtype=np.int64, count=int(lengths.sum()))
+        # MinHash: per permutation, the smallest hash over each text's shingles
+        permuted = (hashes[:, None] * self._a + self._b) % _PRIME
+        signatures = np.minimum.reduceat(permuted, np.concatenate(([0], np.cumsum(lengths)[:-1])), axis=0)
+        # Fold the rows of each band into one int (wrapping int64 arithmetic is fine for a bucket key)
+        banded = signatures.reshape(len(shingle_sets), self.bands, -1)
+        keys = np.zeros(banded.shape[:2], dtype=np.int64)
+        for row in range(banded.shape[2]):
+            keys = keys * _PRIME + banded[:, :, row]
+        return keys.tolist()
+
+    def add(self, text: str, label: str = None):
+        """Adds a text (e.g. a posted or denied tweet) to the index, with an optional label such as its status."""
+        self.add_many([text], [label])
+
+    def add_many(self, texts: list, labels: list = None):
+        """Adds several texts at once, which is much faster than calling add() for each."""
+        if not texts:
+            return
+        labels = labels if labels is not None else [None] * len(texts)
+        shingle_sets = [shingles(text) for text in texts]
+        for text, label, text_shingles, keys in zip(texts, labels, shingle_sets, self._band_keys(shingle_sets)):
+            entry = len(self._texts)
+            self._texts.append(text)
+            self._labels.append(label)
+            self._shingles.append(text_shingles)
+            for buckets, key in zip(self._buckets, keys):
+                buckets.setdefault(key, []).append(entry)
+
+    def query(self, text: str) -> tuple:
+        """
+        Finds the most similar indexed text that shares an LSH bucket with `text`.
+
+        Returns:
+            tuple: (similarity, matched text, its label), or (0.0, None, None) if nothing is close.
+        """
+        text_shingles = shingles(text)
+        entries = set()
+        for buckets, key in zip(self._buckets, self._band_keys([text_shingles])[0]):
+            entries.update(buckets.get(key, ()))
+        best = (0.0, None, None)
+        for entry in entries:
+            similarity = jaccard(text_shingles, self._shingles[entry])
+            if similarity > best[0]:
+                best = (similarity, self._texts[entry], self._labels[entry])
+        return best
+
+    def is_duplicate(self, text: str) -> bool:
+        """True if `text` is at least `threshold` similar to an indexed text."""
+        return self.query(text)[0] >= self.threshold
+
+    @classmethod
+    def from_store(cls, store, statuses=("posted", "denied"), limit: int = 5000, account: str = "",
+                   **options) -> "SimilarityIndex":
+        """Builds an index over the last `limit` tweets generated for `account` in a TweetStore with the given statuses."""
+        index = cls(**options)
+        history = store.generated_history(statuses, limit, account)[::-1]
+        index.add_many([text for text, _ in history], [status for _, status in history])
+        return index
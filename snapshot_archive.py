@@ -0,0 +1,219 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from tweet_record import Tweet
+from tweet_store import parse_created_at
+
+# Fixed-width columns: name -> little-endian dtype. Unknown creation times are NaN.
+NUMERIC_COLUMNS = {
+    "like_count": "<i8",
+    "retweet_count": "<i8",
+    "reply_count": "<i8",
+    "view_count": "<i8",
+    "created_ts": "<f8",
+    "scraped_at": "<i8",
+}
+# Variable-length UTF-8 columns, each stored as <name>.bytes plus <name>.offsets (end offset per row).
+STRING_COLUMNS = ("tweet_id", "tweet_url", "community_id", "username", "created_at", "text")
+MANIFEST_FILENAME = "manifest.jsonl"
+_OFFSET_DTYPE = np.dtype("<i8")
+
+
+class SnapshotArchive:
+    """
+    An append-only, columnar archive of every run's scraped tweets.
+
+    Each column lives in its own flat binary file in `directory`: numbers as
+    raw little-endian arrays, strings as one UTF-8 blob plus an array of end
+    offsets. Readers memory-map the files, so opening a month of history
+    costs a few system calls rather than a parse, numeric columns are used
+    in place as NumPy arrays, and text is only decoded for the rows that are
+    actually read.
+
+    Runs are appended with open_run(). manifest.jsonl gets one line per run
+    once its rows are fully written; rows past the last committed run (from
+    a crash mid-run) are ignored by readers and cut off by the next writer.
+    Only one process should write at a time. A reader sees the runs that
+    were committed when it first looked; call refresh() to pick up newer ones.
+    """
+
+    def __init__(self, directory: str = "snapshots"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._runs = None
+        self._maps = {}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def refresh(self):
+        """Forgets the cached manifest and memory maps, so runs committed since are seen."""
+        self._runs = None
+        self._maps = {}
+
+    def runs(self) -> list:
+        """The committed runs, oldest first: dicts with "run", "start", "rows" and "created_at"."""
+        if self._runs is None:
+            try:
+                with open(self._path(MANIFEST_FILENAME), encoding="utf-8") as f:
+                    self._runs = [json.loads(line) for line in f if line.strip()]
+            except FileNotFoundError:
+                self._runs = []
+        return self._runs
+
+    def __len__(self):
+        runs = self.runs()
+        return runs[-1]["start"] + runs[-1]["rows"] if runs else 0
+
+    def _map(self, filename: str, dtype, count: int) -> np.ndarray:
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._path(filename), dtype=dtype, mode="r", shape=(count,))
+
+    def column(self, name: str) -> np.ndarray:
+        """A numeric column as a read-only, memory-mapped array over every committed row."""
+        rows = len(self)
+        if name not in self._maps:
+            self._maps[name] = self._map(f"{name}.bin", NUMERIC_COLUMNS[name], rows)
+        return self._maps[name]
+
+    def columns(self) -> dict:
+        """Every numeric column (see NUMERIC_COLUMNS) plus "run", the run number of each row."""
+        columns = {name: self.column(name) for name in NUMERIC_COLUMNS}
+        runs = self.runs()
+        columns["run"] = np.repeat(np.array([run["run"] for run in runs], dtype=np.int64),
+                                   [run["rows"] for run in runs])
+        return columns
+
+    def run_rows(self, run_numbers=None, since: float = None) -> np.ndarray:
+        """Row numbers of the given runs and/or of the runs committed at or after `since`."""
+        ranges = [np.arange(run["start"], run["start"] + run["rows"]) for run in self.runs()
+                  if (run_numbers is None or run["run"] in run_numbers)
+                  and (since is None or run["created_at"] >= since)]
+        return np.concatenate(ranges) if ranges else np.empty(0, dtype=np.int64)
+
+    def _strings(self, name: str):
+        rows = len(self)
+        key = name + ".strings"
+        if key not in self._maps:
+            offsets = self._map(f"{name}.offsets", _OFFSET_DTYPE, rows)
+            size = int(offsets[-1]) if rows else 0
+            self._maps[key] = (offsets, self._map(f"{name}.bytes", np.uint8, size))
+        return self._maps[key]
+
+    def string(self, name: str, row: int) -> str:
+        """Decodes one string cell."""
+        offsets, blob = self._strings(name)
+        start = int(offsets[row - 1]) if row else 0
+        return blob[start:int(offsets[row])].tobytes().decode("utf-8")
+
+    def strings(self, name: str, rows=None) -> list:
+        """Decodes a string column, for all rows or just `rows`."""
+        rows = range(len(self)) if rows is None else rows
+        return [self.string(name, int(row)) for row in rows]
+
+    def tweet(self, row: int) -> Tweet:
+        """Materialises one row as a Tweet record."""
+        fields = {name: self.string(name, row) for name in STRING_COLUMNS if name in Tweet.FIELDS}
+        for name in ("like_count", "retweet_count", "reply_count", "view_count"):
+            fields[name] = int(self.column(name)[row])
+        return Tweet(**fields)
+
+    def top_rows(self, column: str = "like_count", k: int = 50, rows=None) -> np.ndarray:
+        """Row numbers of the `k` largest values of a numeric column (optionally among `rows`), largest first."""
+        values = self.column(column)
+        rows = np.arange(len(values)) if rows is None else np.asarray(rows)
+        k = min(k, len(rows))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        candidates = rows[np.argpartition(-values[rows], k - 1)[:k]] if k < len(rows) else rows
+        return candidates[np.argsort(-values[candidates], kind="stable")]
+
+    def open_run(self) -> "SnapshotRun":
+        """Starts appending a new run. Call add() per batch of tweets and commit() at the end."""
+        return SnapshotRun(self)
+
+
+class SnapshotRun:
+    """Appends one run's tweets to a SnapshotArchive; see SnapshotArchive.open_run()."""
+
+    def __init__(self, archive: SnapshotArchive):
+        self.archive = archive
+        archive.refresh()
+        runs = archive.runs()
+        self.run = runs[-1]["run"] + 1 if runs else 0
+        self.start = len(archive)
+        self.rows = 0
+        self.scraped_at = int(time.time())
+        self._string_sizes = {}
+        self._truncate_uncommitted()
+
+    def _truncate_uncommitted(self):
+        """Cuts every column file back to the committed rows, dropping what a crashed run left behind."""
+        path = self.archive._path
+        for name, dtype in NUMERIC_COLUMNS.items():
+            self._truncate(path(f"{name}.bin"), self.start * np.dtype(dtype).itemsize)
+        for name in STRING_COLUMNS:
+            self._truncate(path(f"{name}.offsets"), self.start * _OFFSET_DTYPE.itemsize)
+            size = 0
+            if self.start:
+                with open(path(f"{name}.offsets"), "rb") as f:
+                    f.seek((self.start - 1) * _OFFSET_DTYPE.itemsize)
+                    size = int(np.frombuffer(f.read(_OFFSET_DTYPE.itemsize), dtype=_OFFSET_DTYPE)[0])
+            self._truncate(path(f"{name}.bytes"), size)
+            self._string_sizes[name] = size
+
+    @staticmethod
+    def _truncate(filename: str, size: int):
+        with open(filename, "ab") as f:
+            f.truncate(size)
+
+    def add(self, tweets) -> int:
+        """Appends a batch of Tweet records. Returns the number of rows written."""
+        tweets = list(tweets)
+        if not tweets:
+            return 0
+        path = self.archive._path
+        numeric = {
+            "like_count": [tweet.like_count for tweet in tweets],
+            "retweet_count": [tweet.retweet_count for tweet in tweets],
+            "reply_count": [tweet.reply_count for tweet in tweets],
+            "view_count": [tweet.view_count for tweet in tweets],
+            "created_ts": [parse_created_at(tweet.created_at) for tweet in tweets],
+            "scraped_at": [self.scraped_at] * len(tweets),
+        }
+        for name, values in numeric.items():
+            array = np.array([np.nan if value is None else value for value in values], dtype=NUMERIC_COLUMNS[name])
+            with open(path(f"{name}.bin"), "ab") as f:
+                f.write(array.tobytes())
+        for name in STRING_COLUMNS:
+            encoded = [("" if getattr(tweet, name) is None else str(getattr(tweet, name))).encode("utf-8")
+                       for tweet in tweets]
+            ends = self._string_sizes[name] + np.cumsum([len(value) for value in encoded], dtype=np.int64)
+            with open(path(f"{name}.bytes"), "ab") as f:
+                f.write(b"".join(encoded))
+            with open(path(f"{name}.offsets"), "ab") as f:
+                f.write(ends.astype(_OFFSET_DTYPE).tobytes())
+            self._string_sizes[name] = int(ends[-1])
+        self.rows += len(tweets)
+        return len(tweets)
+
+    def commit(self):
+        """Makes the run's rows visible to readers. A run without rows is not recorded."""
+        if not self.rows:
+            return
+        path = self.archive._path
+        filenames = [f"{name}.bin" for name in NUMERIC_COLUMNS]
+        filenames += [f"{name}.{part}" for name in STRING_COLUMNS for part in ("bytes", "offsets")]
+        for filename in filenames:
+            with open(path(filename), "ab") as f:
+                os.fsync(f.fileno())
+        entry = {"run": self.run, "start": self.start, "rows": self.rows, "created_at": self.scraped_at}
+        with open(path(MANIFEST_FILENAME), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.archive.refresh()
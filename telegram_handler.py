@@ -1,102 +1,482 @@
+import atexit
+import os
+import queue
 import requests
+import threading
 import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 
-def send_error_notification(bot_token: str, chat_id: str, error_message: str, error_type: str = "Error") -> bool:
+import metrics
+from rate_control import backoff_delay, get_controller
+
+# TELEGRAM_API_BASE_URL points the bot at another Bot API host, e.g. the local fake in fake_services.py.
+TELEGRAM_API_BASE_URL = os.environ.get("TELEGRAM_API_BASE_URL", "https://api.telegram.org")
+# Alerts queued but not yet sent; further alerts are dropped while the queue is full.
+NOTIFICATION_QUEUE_SIZE = 200
+# An identical alert raised again within this window is counted instead of sent.
+COALESCE_SECONDS = 300
+# Telegram allows about one message per second per chat.
+MIN_SECONDS_PER_CHAT = 1.0
+# Seconds the exit handler waits for queued alerts to go out.
+FLUSH_TIMEOUT_SECONDS = 10
+TELEGRAM_MESSAGE_LIMIT = 4096
+# Timeout of every Bot API call other than the getUpdates long-poll.
+REQUEST_TIMEOUT_SECONDS = 15
+# Outcomes of an approval request (see request_telegram_choice()).
+APPROVED = "approved"
+DENIED = "denied"
+TIMED_OUT = "timeout"
+FAILED = "failed"
+# Extra seconds request_telegram_choice() waits beyond the approval timeout before giving up on the poller.
+APPROVAL_RESULT_MARGIN_SECONDS = 60
+
+
+def _format_notification(error_type: str, error_message: str, raised_at: float, repeats: int = 0) -> str:
+    text = f"🚨 {error_type} Alert\n\n{error_message}\n\nTime: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(raised_at))}"
+    if repeats:
+        text += f"\n(Repeated {repeats} more time(s), coalesced)"
+    return text
+
+
+class NotificationDispatcher:
     """
-    Sends an error notification to Telegram immediately.
+    Sends Telegram alerts from a background thread so raising one never waits
+    on the network.
+
+    - notify() only puts the alert on a bounded queue; when the queue is full
+      the alert is dropped (and counted) rather than blocking the caller.
+    - An alert identical to one raised less than `coalesce_seconds` ago is
+      only counted. The count is reported with the next copy after the window
+      or, at the latest, when the dispatcher is flushed.
+    - Alerts waiting for the same chat are merged into one message, and each
+      chat gets at most one message per `min_seconds_per_chat`.
+    - flush() waits for the queue to drain; it is registered with atexit so a
+      short-lived run still delivers its last alerts.
     """
-    base_url = f"https://api.telegram.org/bot{bot_token}"
-    
-    try:
-        message_text = f"🚨 {error_type} Alert\n\n{error_message}\n\nTime: {time.strftime('%Y-%m-%d %H:%M:%S')}"
-        
-        response = requests.post(f"{base_url}/sendMessage", json={
-            "chat_id": chat_id,
-            "text": message_text
-        })
-        
-        return response.ok
-    except Exception as e:
-        print(f"Failed to send error notification: {e}")
-        return False
 
-def request_telegram_approval(bot_token: str, chat_id: str, tweet_text: str) -> bool:
+    def __init__(self, max_queue: int = NOTIFICATION_QUEUE_SIZE, coalesce_seconds: float = COALESCE_SECONDS,
+                 min_seconds_per_chat: float = MIN_SECONDS_PER_CHAT):
+        self.coalesce_seconds = coalesce_seconds
+        self.min_seconds_per_chat = min_seconds_per_chat
+        self.session = requests.Session()
+        self.sent = self.coalesced = self.dropped = self.failed = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._recent = {}  # (bot_token, chat_id, error_type, error_message) -> [last_queued, repeats]
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def notify(self, bot_token: str, chat_id: str, error_message: str, error_type: str = "Error") -> bool:
+        """
+        Queues an alert. Returns False only if it had to be dropped.
+        """
+        now = time.time()
+        key = (bot_token, chat_id, error_type, error_message)
+        with self._lock:
+            recent = self._recent.get(key)
+            if recent and now - recent[0] < self.coalesce_seconds:
+                recent[1] += 1
+                self.coalesced += 1
+                metrics.inc("notifications_total", result="coalesced")
+                return True
+            repeats = recent[1] if recent else 0
+            self._recent[key] = [now, 0]
+            if len(self._recent) > 1000:
+                self._recent = {k: v for k, v in self._recent.items()
+                                if now - v[0] < self.coalesce_seconds or v[1]}
+        return self._put((bot_token, chat_id, error_type, error_message, now, repeats))
+
+    def _put(self, item) -> bool:
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            metrics.inc("notifications_total", result="dropped")
+            print(f"Notification queue full, dropped alert: {item[2]}")
+            return False
+        metrics.inc("notifications_total", result="queued")
+        self._start()
+        return True
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="telegram-notifications", daemon=True)
+                self._thread.start()
+
+    def flush(self, timeout: float = FLUSH_TIMEOUT_SECONDS) -> bool:
+        """
+        Sends the counts of coalesced alerts and waits until everything queued
+        has been sent. Returns False if the timeout ran out first.
+        """
+        with self._lock:
+            leftovers = [(key, entry) for key, entry in self._recent.items() if entry[1]]
+            repeats = [entry[1] for _, entry in leftovers]
+            for _, entry in leftovers:
+                entry[1] = 0
+        for ((bot_token, chat_id, error_type, error_message), entry), count in zip(leftovers, repeats):
+            self._put((bot_token, chat_id, error_type, error_message, entry[0], count))
+
+        deadline = time.time() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            chats = {}
+            for item in batch:
+                chats.setdefault(item[:2], []).append(item)
+            for (bot_token, chat_id), items in chats.items():
+                try:
+                    self._send_chat(bot_token, chat_id, items)
+                except Exception as e:
+                    with self._lock:
+                        self.failed += len(items)
+                    metrics.inc("telegram_messages_total", result="failed")
+                    print(f"Failed to send error notification: {e}")
+            for _ in batch:
+                self._queue.task_done()
+
+    def _send_chat(self, bot_token: str, chat_id: str, items: list):
+        texts = [_format_notification(error_type, error_message, raised_at, repeats)
+                 for _, _, error_type, error_message, raised_at, repeats in items]
+        # Merge into as few messages as Telegram's size limit allows
+        messages = [texts[0][:TELEGRAM_MESSAGE_LIMIT]]
+        for text in texts[1:]:
+            if len(messages[-1]) + len(text) + 2 <= TELEGRAM_MESSAGE_LIMIT:
+                messages[-1] += "\n\n" + text
+            else:
+                messages.append(text[:TELEGRAM_MESSAGE_LIMIT])
+
+        rate_per_chat = 1 / self.min_seconds_per_chat if self.min_seconds_per_chat > 0 else 0
+        controller = get_controller(f"telegram:{chat_id}", rate_per_chat)
+        for message_text in messages:
+            for attempt in range(3):
+                controller.acquire()
+                response = self.session.post(f"{TELEGRAM_API_BASE_URL}/bot{bot_token}/sendMessage", json={
+                    "chat_id": chat_id,
+                    "text": message_text
+                }, timeout=REQUEST_TIMEOUT_SECONDS)
+                if response.status_code == 429:
+                    # Telegram says how long to back off in parameters.retry_after
+                    retry_after = response.json().get("parameters", {}).get("retry_after", 5)
+                    controller.on_rate_limited(response.headers, retry_after=retry_after)
+                    continue
+                controller.on_success(response.headers)
+                break
+            with self._lock:
+                if response.ok:
+                    self.sent += 1
+                else:
+                    self.failed += 1
+                    print(f"Failed to send error notification: {response.text}")
+            metrics.inc("telegram_messages_total", result="sent" if response.ok else "failed")
+
+
+_dispatcher = NotificationDispatcher()
+atexit.register(_dispatcher.flush)
+
+
+def get_notification_dispatcher() -> NotificationDispatcher:
+    """Returns the process-wide notification dispatcher."""
+    return _dispatcher
+
+
+def send_error_notification(bot_token: str, chat_id: str, error_message: str, error_type: str = "Error",
+                            wait: bool = False) -> bool:
     """
-    Sends a message to Telegram with approval buttons and waits for a response.
+    Queues an error notification for Telegram and returns immediately.
+
+    Identical alerts are coalesced and alerts for the same chat are batched
+    (see NotificationDispatcher). Pass wait=True to block until the queue has
+    been sent.
+
+    Returns:
+        bool: False if the alert was dropped (queue full) or, with wait=True,
+              not sent in time.
     """
-    base_url = f"https://api.telegram.org/bot{bot_token}"
-    
-    # Create inline keyboard
+    queued = _dispatcher.notify(bot_token, chat_id, error_message, error_type)
+    if wait:
+        return _dispatcher.flush() and queued
+    return queued
+
+def _edit_message(session, base_url: str, chat_id: str, message_id: int, text: str):
+    session.post(f"{base_url}/editMessageText", json={
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "text": text
+    }, timeout=REQUEST_TIMEOUT_SECONDS)
+
+
+def _build_choice_message(candidates: list) -> tuple:
+    """Returns the (text, inline keyboard) of an approval message for the candidates."""
+    if len(candidates) == 1:
+        # Create inline keyboard
+        keyboard = {
+            "inline_keyboard": [[
+                {"text": "✅ Approve", "callback_data": "approve:0"},
+                {"text": "❌ Deny", "callback_data": "deny"}
+            ]]
+        }
+        return f"🤖 New tweet generated. Please approve:\n\n---\n{candidates[0]}\n---", keyboard
+
     keyboard = {
-        "inline_keyboard": [[
-            {"text": "✅ Approve", "callback_data": "approve"},
-            {"text": "❌ Deny", "callback_data": "deny"}
-        ]]
+        "inline_keyboard": [
+            [{"text": f"✅ Post #{i + 1}", "callback_data": f"approve:{i}"} for i in range(len(candidates))],
+            [{"text": "❌ Deny all", "callback_data": "deny"}]
+        ]
     }
-    
-    try:
-        # Send message with inline keyboard
-        response = requests.post(f"{base_url}/sendMessage", json={
-            "chat_id": chat_id,
-            "text": f"🤖 New tweet generated. Please approve:\n\n---\n{tweet_text}\n---",
-            "reply_markup": keyboard
-        })
-        
-        if not response.ok:
-            print(f"Failed to send message: {response.text}")
-            return False
-            
-        message_data = response.json()
-        message_id = message_data["result"]["message_id"]
-        print("Approval message sent. Waiting up to 5 minutes for a response...")
-        
-        update_id = None
-        start_time = time.time()
-        while time.time() - start_time < 300:  # 5 minute timeout
-            # Get updates
-            params = {"timeout": 10}
-            if update_id:
-                params["offset"] = update_id
-                
-            updates_response = requests.get(f"{base_url}/getUpdates", params=params)
-            
-            if not updates_response.ok:
-                time.sleep(2)
+    drafts = "\n\n".join(f"#{i + 1}\n---\n{candidate}\n---" for i, candidate in enumerate(candidates))
+    return f"🤖 {len(candidates)} tweets generated. Pick one to post:\n\n{drafts}", keyboard
+
+
+class ApprovalService:
+    """
+    Waits for Telegram approvals in the background.
+
+    One thread keeps a single getUpdates long-poll open and hands every
+    callback_query to the pending approval whose message it belongs to, so any
+    number of approval requests can be outstanding at once and an answer is
+    seen one round trip after the button is pressed. submit() returns
+    immediately with a Future, letting the caller carry on with other work.
+
+    A long-poll is used rather than a webhook because the bot usually runs
+    somewhere without a public HTTPS endpoint (cron, GitHub Actions). Telegram
+    allows only one getUpdates consumer per bot, so there is one service per
+    bot token; submit() can target any chat of that bot.
+    """
+
+    def __init__(self, bot_token: str, chat_id: str, poll_timeout: int = 50):
+        self.base_url = f"{TELEGRAM_API_BASE_URL}/bot{bot_token}"
+        self.chat_id = chat_id
+        self.poll_timeout = poll_timeout
+        self.session = requests.Session()
+        self._pending = {}  # (chat_id, message_id) -> (future, candidates, deadline)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._offset = None
+        self._thread = None
+
+    def start(self):
+        """Starts the long-poll thread (done automatically by submit())."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._poll_loop, name="telegram-approvals", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops polling. Outstanding approvals resolve to (TIMED_OUT, None)."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_timeout + 15)
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future, _, _ in pending.values():
+            if not future.done():
+                future.set_result((TIMED_OUT, None))
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def submit(self, candidates: list, timeout: float = 300, chat_id: str = None) -> Future:
+        """
+        Sends the candidates to Telegram with a button per candidate.
+
+        Args:
+            candidates (list): Candidate tweet texts, best first.
+            timeout (float): Seconds to wait for a button press.
+            chat_id (str, optional): Chat to ask in. Defaults to the service's chat.
+
+        Returns:
+            Future: Resolves to (outcome, text): (APPROVED, the approved candidate),
+                    or (DENIED, None), (TIMED_OUT, None) or (FAILED, None) if
+                    the message could not be sent.
+        """
+        future = Future()
+        chat_id = str(chat_id or self.chat_id)
+        text, keyboard = _build_choice_message(candidates)
+        try:
+            # Send message with inline keyboard
+            response = self.session.post(f"{self.base_url}/sendMessage", json={
+                "chat_id": chat_id,
+                "text": text,
+                "reply_markup": keyboard
+            }, timeout=REQUEST_TIMEOUT_SECONDS)
+            if not response.ok:
+                print(f"Failed to send message: {response.text}")
+                future.set_result((FAILED, None))
+                return future
+            message_id = response.json()["result"]["message_id"]
+        except Exception as e:
+            print(f"An error occurred with Telegram: {e}")
+            future.set_result((FAILED, None))
+            return future
+
+        with self._lock:
+            self._pending[(chat_id, message_id)] = (future, list(candidates), time.time() + timeout)
+        print(f"Approval message sent. Waiting up to {timeout / 60:.0f} minutes for a response...")
+        self.start()
+        self._wakeup.set()
+        return future
+
+    def _resolve(self, key: tuple, choice):
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                return
+            future, candidates, _ = entry
+            result = None
+            if choice is not None and choice.startswith("approve:"):
+                index = choice.split(":", 1)[1]
+                if not index.isdigit() or int(index) >= len(candidates):
+                    # A stale or forged button; keep waiting for a valid answer
+                    print(f"Ignoring unknown approval choice: {choice!r}")
+                    return
+                result = candidates[int(index)]
+            del self._pending[key]
+        chat_id, message_id = key
+        metrics.inc("telegram_approvals_total", result="timeout" if choice is None else choice.split(":")[0])
+        try:
+            if choice is None:
+                # Timeout
+                _edit_message(self.session, self.base_url, chat_id, message_id, "⌛ Timed out. No action taken.")
+            elif result is not None:
+                _edit_message(self.session, self.base_url, chat_id, message_id, f"✅ Approved. Tweeting...\n\n{result}")
+            else:
+                _edit_message(self.session, self.base_url, chat_id, message_id, "❌ Denied. Tweet discarded.")
+        except Exception as e:
+            print(f"Failed to update approval message: {e}")
+        if not future.done():
+            outcome = TIMED_OUT if choice is None else APPROVED if result is not None else DENIED
+            future.set_result((outcome, result))
+
+    def _expire(self):
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (_, _, deadline) in self._pending.items() if deadline <= now]
+        for key in expired:
+            self._resolve(key, None)
+
+    def _poll_loop(self):
+        failures = 0
+        while not self._stopped.is_set():
+            self._expire()
+            with self._lock:
+                deadlines = [deadline for _, _, deadline in self._pending.values()]
+            if not deadlines:
+                # Nothing to wait for; sleep until the next submit()
+                self._wakeup.wait(timeout=5)
+                self._wakeup.clear()
+                continue
+
+            poll_timeout = int(max(0, min(self.poll_timeout, min(deadlines) - time.time())))
+            params = {"timeout": poll_timeout, "allowed_updates": '["callback_query"]'}
+            if self._offset:
+                params["offset"] = self._offset
+            try:
+                updates_response = self.session.get(f"{self.base_url}/getUpdates", params=params,
+                                                    timeout=poll_timeout + 10)
+                if updates_response.status_code == 429:
+                    retry_after = updates_response.json().get("parameters", {}).get("retry_after", 5)
+                    self._stopped.wait(retry_after)
+                    continue
+                if not updates_response.ok:
+                    failures += 1
+                    self._stopped.wait(backoff_delay(failures, cap=30))
+                    continue
+                updates = updates_response.json().get("result", [])
+                failures = 0
+            except Exception as e:
+                print(f"Telegram polling error: {e}")
+                failures += 1
+                self._stopped.wait(backoff_delay(failures, cap=30))
                 continue
-                
-            updates_data = updates_response.json()
-            
-            for update in updates_data.get("result", []):
-                update_id = update["update_id"] + 1
-                
-                if "callback_query" in update:
-                    callback = update["callback_query"]
-                    if callback["message"]["message_id"] == message_id:
-                        choice = callback["data"]
-                        
-                        if choice == "approve":
-                            requests.post(f"{base_url}/editMessageText", json={
-                                "chat_id": chat_id,
-                                "message_id": message_id,
-                                "text": "✅ Approved. Tweeting..."
-                            })
-                            return True
-                        else:
-                            requests.post(f"{base_url}/editMessageText", json={
-                                "chat_id": chat_id,
-                                "message_id": message_id,
-                                "text": "❌ Denied. Tweet discarded."
-                            })
-                            return False
-            time.sleep(2)
-            
-        # Timeout
-        requests.post(f"{base_url}/editMessageText", json={
-            "chat_id": chat_id,
-            "message_id": message_id,
-            "text": "⌛ Timed out. No action taken."
-        })
-        return False
-    except Exception as e:
-        print(f"An error occurred with Telegram: {e}")
-        return False
\ No newline at end of file
+
+            for update in updates:
+                if "update_id" in update:
+                    self._offset = update["update_id"] + 1
+                try:
+                    self._handle_update(update)
+                except Exception as e:
+                    # One malformed update must not end the loop every pending approval depends on
+                    print(f"Failed to handle Telegram update {update.get('update_id')}: {e}")
+
+    def _handle_update(self, update: dict):
+        callback = update.get("callback_query")
+        if not callback:
+            return
+        try:
+            self.session.post(f"{self.base_url}/answerCallbackQuery", json={"callback_query_id": callback["id"]},
+                              timeout=REQUEST_TIMEOUT_SECONDS)
+        except Exception:
+            pass
+        # Callbacks from inline-mode messages or messages too old for Telegram to include have no "message"
+        message = callback.get("message")
+        if not message:
+            return
+        self._resolve((str(message["chat"]["id"]), message["message_id"]), callback.get("data"))
+
+
+_approval_services = {}
+_approval_services_lock = threading.Lock()
+
+
+def get_approval_service(bot_token: str, chat_id: str) -> ApprovalService:
+    """Returns the process-wide ApprovalService for a bot, created with `chat_id` as its default chat."""
+    with _approval_services_lock:
+        service = _approval_services.get(bot_token)
+        if service is None:
+            service = ApprovalService(bot_token, chat_id)
+            _approval_services[bot_token] = service
+        return service
+
+
+def request_telegram_approval(bot_token: str, chat_id: str, tweet_text: str) -> bool:
+    """
+    Sends a message to Telegram with approval buttons and waits for a response.
+    """
+    return request_telegram_choice(bot_token, chat_id, [tweet_text])[0] == APPROVED
+
+
+def request_telegram_choice(bot_token: str, chat_id: str, candidates: list, timeout: float = 300):
+    """
+    Sends one or more candidate tweets to Telegram in a single message with a
+    button per candidate and waits for one of them to be picked.
+
+    Args:
+        bot_token (str): Your Telegram bot token.
+        chat_id (str): The chat to send the candidates to.
+        candidates (list): Candidate tweet texts, best first.
+        timeout (float): Seconds to wait for a button press.
+
+    Returns:
+        tuple: (outcome, text). (APPROVED, the approved candidate) if one was
+               picked; otherwise (DENIED, None) if they were denied,
+               (TIMED_OUT, None) if nobody answered in time, or (FAILED, None)
+               if the message could not be sent.
+    """
+    with metrics.span("telegram_approval"):
+        future = get_approval_service(bot_token, chat_id).submit(candidates, timeout, chat_id)
+        try:
+            return future.result(timeout=timeout + APPROVAL_RESULT_MARGIN_SECONDS)
+        except FutureTimeoutError:
+            # The poll thread should have expired the request long ago
+            print("Telegram approval did not resolve in time. No action taken.")
+            return TIMED_OUT, None
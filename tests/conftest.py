@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_services import FakeAnthropicServer
+
+
+@pytest.fixture
+def fake_anthropic():
+    """Starts FakeAnthropicServer instances with the given options; stops them after the test."""
+    servers = []
+
+    def start(**options):
+        server = FakeAnthropicServer(**options).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def llm(tmp_path, monkeypatch):
+    """llm_caller with a fresh client, response cache and model health file under tmp_path."""
+    import llm_caller
+
+    monkeypatch.setattr(llm_caller, "RESPONSE_CACHE_FILE", str(tmp_path / "claude_cache.db"))
+    monkeypatch.setattr(llm_caller, "MODEL_HEALTH_FILE", str(tmp_path / "model_health.json"))
+    monkeypatch.setattr(llm_caller, "_clients", {})
+    monkeypatch.setattr(llm_caller, "_response_cache", None)
+    monkeypatch.setattr(llm_caller, "_model_router", None)
+    yield llm_caller
+    if llm_caller._response_cache is not None:
+        llm_caller._response_cache.close()
@@ -0,0 +1,38 @@
+import itertools
+
+import pytest
+
+from candidates import generate_candidates
+from similarity_index import SimilarityIndex
+
+WORDS = ["rust", "lifetimes", "borrow", "checker", "async", "tokio", "cargo", "traits", "macros", "unsafe",
+         "generics", "closures", "iterators", "ownership", "slices", "enums", "matching", "modules"]
+
+
+@pytest.fixture
+def server(fake_anthropic, monkeypatch):
+    counter = itertools.count()
+
+    def responder(prompt_text):
+        # Every answer shares no 3-shingle with any other
+        n = next(counter)
+        return " ".join(f"{WORDS[(n * 5 + i) % len(WORDS)]}{n}" for i in range(8))
+
+    server = fake_anthropic(responder=responder)
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", server.url)
+    return server
+
+
+def test_regenerated_drafts_are_not_served_from_the_cache(llm, server):
+    history = SimilarityIndex()
+    first = generate_candidates("Write a tweet", 2, api_key="test", similarity_index=history, max_regenerations=1)
+    history.add_many(first, ["posted"] * len(first))
+
+    # The cached first-round drafts repeat posted tweets, so they are requested again
+    second = generate_candidates("Write a tweet", 2, api_key="test", similarity_index=history, max_regenerations=1)
+    assert len(second) == 2 and not set(second) & set(first)
+    history.add_many(second, ["posted"] * len(second))
+
+    # ...and the regenerated ones were not cached, or this run would get the second run's repeats back
+    third = generate_candidates("Write a tweet", 2, api_key="test", similarity_index=history, max_regenerations=1)
+    assert len(third) == 2 and not set(third) & (set(first) | set(second))
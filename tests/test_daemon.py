@@ -0,0 +1,81 @@
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+from daemon import CronSchedule, Daemon, _file_lock
+
+
+def utc(*args) -> float:
+    return datetime(*args, tzinfo=timezone.utc).timestamp()
+
+
+@pytest.mark.parametrize("expression, minutes, hours, weekdays", [
+    ("0 9,15,21 * * *", {0}, {9, 15, 21}, set(range(7))),
+    ("*/15 9-17 * * 1-5", {0, 15, 30, 45}, set(range(9, 18)), {1, 2, 3, 4, 5}),
+    ("5-20/5 0 * * 0,7", {5, 10, 15, 20}, {0}, {0}),
+    ("30 22/1 * * *", {30}, {22, 23}, set(range(7))),
+])
+def test_cron_fields_are_parsed(expression, minutes, hours, weekdays):
+    schedule = CronSchedule(expression)
+    assert (schedule.minutes, schedule.hours, schedule.weekdays) == (minutes, hours, weekdays)
+
+
+@pytest.mark.parametrize("expression", ["0 9 * *", "60 * * * *", "* 24 * * *", "* * 0 * *", "*/0 * * * *",
+                                        "5-1 * * * *", "a * * * *"])
+def test_invalid_cron_expressions_are_rejected(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+@pytest.mark.parametrize("expression, after, expected", [
+    ("0 9,15,21 * * *", utc(2024, 1, 1, 10, 0), utc(2024, 1, 1, 15, 0)),
+    ("0 9,15,21 * * *", utc(2024, 1, 1, 15, 0), utc(2024, 1, 1, 21, 0)),  # strictly after
+    ("0 9,15,21 * * *", utc(2024, 1, 1, 14, 59, 30), utc(2024, 1, 1, 15, 0)),
+    ("30 2 * * *", utc(2024, 1, 1, 23, 0), utc(2024, 1, 2, 2, 30)),
+    ("0 0 1 1 *", utc(2024, 6, 1), utc(2025, 1, 1)),
+    ("0 8 * * 7", utc(2024, 9, 2), utc(2024, 9, 8, 8, 0)),  # 7 is Sunday
+    ("0 12 13 * 5", utc(2024, 9, 1), utc(2024, 9, 6, 12, 0)),  # either day field matches
+    ("0 12 13 * 5", utc(2024, 9, 12, 13, 0), utc(2024, 9, 13, 12, 0)),
+    ("0 0 29 2 *", utc(2024, 3, 1), utc(2028, 2, 29)),
+])
+def test_next_fire_time(expression, after, expected):
+    assert CronSchedule(expression).next_after(after) == expected
+
+
+def test_a_schedule_that_never_matches_raises():
+    with pytest.raises(ValueError):
+        CronSchedule("0 0 31 2 *").next_after(utc(2024, 1, 1))
+
+
+def test_cycle_is_skipped_while_another_process_holds_the_lock(tmp_path):
+    runs = []
+    lock_file = str(tmp_path / "bot.lock")
+    daemon = Daemon(lambda: runs.append(1), CronSchedule("* * * * *"), jitter_seconds=0, lock_file=lock_file)
+
+    # A second open file description is locked independently, like another process
+    with _file_lock(lock_file) as acquired:
+        assert acquired
+        assert daemon.run_cycle() is None
+    assert runs == []
+
+    cycle = daemon.run_cycle()
+    assert runs == [1] and cycle["error"] is None
+    assert daemon.status()["cycles"] == [cycle]
+
+
+def test_cycle_is_skipped_while_one_is_running_in_this_process(tmp_path):
+    started, release = threading.Event(), threading.Event()
+
+    def job():
+        started.set()
+        release.wait(5)
+
+    daemon = Daemon(job, CronSchedule("* * * * *"), jitter_seconds=0, lock_file=str(tmp_path / "bot.lock"))
+    thread = threading.Thread(target=daemon.run_cycle)
+    thread.start()
+    assert started.wait(5)
+    assert daemon.run_cycle("manual") is None
+    release.set()
+    thread.join()
+    assert len(daemon.cycles) == 1
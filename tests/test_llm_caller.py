@@ -0,0 +1,66 @@
+import pytest
+
+
+@pytest.fixture
+def server(fake_anthropic, monkeypatch):
+    server = fake_anthropic(batch_seconds=0.1)
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", server.url)
+    return server
+
+
+def test_get_claude_response_answers_repeats_from_the_cache(llm, server):
+    first = llm.get_claude_response("Write a tweet about lifetimes", api_key="test")
+    requests_after_first = server.request_count
+    second = llm.get_claude_response("Write a  tweet about\nlifetimes", api_key="test")
+
+    assert first.startswith("Fake tweet #1")
+    assert second == first
+    assert server.request_count == requests_after_first
+    stats = llm.cache_stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_get_claude_response_cache_variants_are_separate_entries(llm, server):
+    first = llm.get_claude_response("Same prompt", api_key="test", cache_variant="draft-0")
+    second = llm.get_claude_response("Same prompt", api_key="test", cache_variant="draft-1")
+
+    assert first != second
+    assert llm.cache_stats()["misses"] == 2
+
+
+def test_generate_batch_answers_every_prompt_and_caches_them(llm, server):
+    prompts = {("rust", i): f"Prompt number {i}" for i in range(3)}
+
+    results = llm.generate_batch(prompts, api_key="test", poll_seconds=0.02)
+    assert set(results) == set(prompts)
+    assert all(text.startswith("Fake tweet #") for text in results.values())
+    assert len(server.batches) == 1
+
+    # A second run is answered from the cache without submitting another batch
+    assert llm.generate_batch(prompts, api_key="test", poll_seconds=0.02) == results
+    assert len(server.batches) == 1
+    assert llm.cache_stats()["hits"] == 3
+
+
+def test_generate_batch_leaves_errored_requests_empty(llm, fake_anthropic, monkeypatch):
+    server = fake_anthropic(batch_seconds=0.1, batch_error_every=2)
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", server.url)
+    prompts = {i: f"Prompt number {i}" for i in range(4)}
+
+    results = llm.generate_batch(prompts, api_key="test", poll_seconds=0.02)
+
+    assert [bool(results[i]) for i in range(4)] == [True, False, True, False]
+    assert llm.get_response_cache().stats()["writes"] == 2
+
+
+def test_generate_batch_cancels_a_batch_that_runs_too_long(llm, fake_anthropic, monkeypatch):
+    server = fake_anthropic(batch_seconds=30)
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", server.url)
+    prompts = {i: f"Prompt number {i}" for i in range(2)}
+
+    results = llm.generate_batch(prompts, api_key="test", poll_seconds=0.02, timeout_seconds=0.2)
+
+    assert results == {0: "", 1: ""}
+    (batch,) = server.batches.values()
+    assert batch.get("canceled") is not None
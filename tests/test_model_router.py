@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+from model_router import NEXT_MODEL, STOP, ModelRouter
+
+TIERS = {"sonnet-new": 3, "sonnet-old": 3, "haiku": 1}
+
+
+@pytest.fixture
+def router(tmp_path):
+    return ModelRouter(list(TIERS), TIERS, filename=str(tmp_path / "model_health.json"), hedge_after_seconds=0.05)
+
+
+def test_candidates_prefer_the_highest_tier_over_a_faster_lower_one(router):
+    router.record_success("haiku", 0.1)
+    router.record_success("sonnet-new", 5.0)
+    router.record_success("sonnet-old", 2.0)
+
+    assert router.candidates(1) == ["sonnet-old", "sonnet-new", "haiku"]
+    assert router.candidates(3) == ["sonnet-old", "sonnet-new"]
+
+
+def test_run_falls_back_to_a_lower_tier_only_after_rate_limits(router):
+    calls = []
+
+    def call(model):
+        calls.append(model)
+        if model != "haiku":
+            raise RuntimeError("429 rate limited")
+        return "ok"
+
+    def on_error(model, error):
+        router.record_error(model, error, cooldown=60)
+        return NEXT_MODEL
+
+    assert router.run(call, on_error, min_tier=3, fallback_tier=1) == ("haiku", "ok")
+    assert calls == ["sonnet-new", "sonnet-old", "haiku"]
+
+    # Without a fallback tier the cooling-down top tier is retried instead
+    calls.clear()
+    with pytest.raises(RuntimeError):
+        router.run(call, on_error, min_tier=3)
+    assert "haiku" not in calls
+
+
+def test_run_never_hedges_into_a_fallback_tier(router):
+    router.record_error("sonnet-old", "overloaded", cooldown=60)
+    calls = []
+
+    def call(model):
+        calls.append(model)
+        time.sleep(0.3)
+        return model
+
+    assert router.run(call, lambda model, error: STOP, min_tier=3, fallback_tier=1) == ("sonnet-new", "sonnet-new")
+    assert calls == ["sonnet-new"]
@@ -0,0 +1,142 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+import requests
+import tweepy
+
+import outbox as outbox_module
+from outbox import FAILED, POSTED, POSTING, QUEUED, Outbox, PostingWorker
+from rate_control import RateController
+
+
+def http_error(error_class, status: int, body: dict, headers: dict = None):
+    """A tweepy HTTP error carrying a real requests.Response, like tweepy raises them."""
+    response = requests.Response()
+    response.status_code = status
+    response.reason = "Error"
+    response._content = json.dumps(body).encode()
+    response.headers.update(headers or {})
+    return error_class(response)
+
+
+class FakeClient:
+    """Stands in for tweepy.Client: create_tweet raises or answers from a list of outcomes."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.texts = []
+
+    def create_tweet(self, text):
+        self.texts.append(text)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return SimpleNamespace(data={"id": outcome})
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    with Outbox(str(tmp_path / "outbox.db")) as outbox:
+        yield outbox
+
+
+def make_worker(outbox, client):
+    """A PostingWorker without pacing that records its on_posted and on_failed calls."""
+    worker = PostingWorker(outbox, client, rate_controller=RateController("test", 0))
+    worker.posted, worker.failed = [], []
+    worker.on_posted = lambda text, tweet_id: worker.posted.append((text, tweet_id))
+    worker.on_failed = lambda text, error: worker.failed.append(text)
+    return worker
+
+
+def test_entries_left_posting_by_a_crash_are_requeued_on_open(tmp_path):
+    filename = str(tmp_path / "outbox.db")
+    crashed = Outbox(filename)
+    crashed.enqueue("hello", not_before=0)
+    assert crashed.claim_due()["text"] == "hello"
+    assert crashed.count(POSTING) == 1
+    crashed.close()
+
+    with Outbox(filename) as reopened:
+        assert (reopened.count(POSTING), reopened.count(QUEUED)) == (0, 1)
+        entry = reopened.claim_due()
+        assert entry["text"] == "hello" and entry["attempts"] == 1
+
+
+def test_rate_limit_reschedules_at_the_reset_header(outbox):
+    reset = int(time.time()) + 900
+    client = FakeClient(http_error(tweepy.errors.TooManyRequests, 429, {"title": "Too Many Requests"},
+                                   {"x-rate-limit-remaining": "0", "x-rate-limit-reset": str(reset)}))
+    worker = make_worker(outbox, client)
+    entry_id = outbox.enqueue("hello", not_before=0)
+
+    assert worker.post_one()
+    row = outbox.conn.execute("SELECT status, not_before FROM outbox WHERE id = ?", (entry_id,)).fetchone()
+    assert row["status"] == QUEUED
+    assert reset <= row["not_before"] <= reset + 1
+    # Every post waits for the window to reset, not just this one
+    assert worker.rate_controller.blocked_until >= reset
+    assert not worker.post_one()
+
+
+def test_server_errors_back_off_and_eventually_give_up(outbox, monkeypatch):
+    monkeypatch.setattr(outbox_module, "backoff_delay", lambda attempts, base, cap: min(cap, base * 2 ** (attempts - 1)))
+    failures = [http_error(tweepy.errors.TwitterServerError, 503, {"title": "Service Unavailable"})
+                for _ in range(outbox_module.MAX_ATTEMPTS)]
+    worker = make_worker(outbox, FakeClient(*failures))
+    entry_id = outbox.enqueue("hello", not_before=0)
+
+    delays = []
+    for attempt in range(1, outbox_module.MAX_ATTEMPTS):
+        before = time.time()
+        assert worker.post_one()
+        row = outbox.conn.execute("SELECT status, not_before, attempts FROM outbox WHERE id = ?", (entry_id,)).fetchone()
+        assert (row["status"], row["attempts"]) == (QUEUED, attempt)
+        delays.append(row["not_before"] - before)
+        outbox.conn.execute("UPDATE outbox SET not_before = 0 WHERE id = ?", (entry_id,))
+
+    expected = [min(outbox_module.RETRY_MAX_SECONDS, outbox_module.RETRY_BASE_SECONDS * 2 ** (n - 1))
+                for n in range(1, outbox_module.MAX_ATTEMPTS)]
+    assert delays == pytest.approx(expected, abs=1)
+
+    assert worker.post_one()
+    assert outbox.count(FAILED) == 1 and worker.failed == ["hello"]
+
+
+def test_duplicate_content_counts_as_posted(outbox):
+    duplicate = http_error(tweepy.errors.Forbidden, 403, {
+        "detail": "You are not allowed to create a Tweet with duplicate content.", "title": "Forbidden"})
+    worker = make_worker(outbox, FakeClient(duplicate))
+    outbox.enqueue("hello", not_before=0)
+
+    assert worker.post_one()
+    assert outbox.count(POSTED) == 1
+    assert worker.posted == [("hello", None)]
+
+
+def test_two_processes_never_claim_the_same_entry(tmp_path):
+    filename = str(tmp_path / "outbox.db")
+    with Outbox(filename) as outbox:
+        for i in range(50):
+            outbox.enqueue(f"tweet {i}", not_before=0)
+
+    # Two connections stand in for two processes sharing the file
+    outboxes = [Outbox(filename), Outbox(filename)]
+    claimed = []
+
+    def claim_all(outbox):
+        while (entry := outbox.claim_due()) is not None:
+            claimed.append(entry["id"])
+
+    threads = [threading.Thread(target=claim_all, args=(outbox,)) for outbox in outboxes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for outbox in outboxes:
+        outbox.close()
+
+    assert sorted(claimed) == list(range(1, 51))
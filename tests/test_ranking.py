@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from ranking import rank_tweets, top_k_indices, velocity
+
+
+def reference_top_k(scores, k, authors=None, max_per_author=None):
+    """Full stable sort, then a greedy pass enforcing the per-author cap."""
+    selected, per_author = [], {}
+    for index in np.argsort(-scores, kind="stable"):
+        if len(selected) == k:
+            break
+        if max_per_author:
+            author = authors[index]
+            if per_author.get(author, 0) >= max_per_author:
+                continue
+            per_author[author] = per_author.get(author, 0) + 1
+        selected.append(index)
+    return np.array(selected, dtype=np.intp)
+
+
+@pytest.mark.parametrize("n, k", [(1000, 10), (1000, 999), (50, 50), (50, 80), (10, 0)])
+def test_top_k_matches_a_full_sort(n, k):
+    scores = np.random.default_rng(n + k).random(n)
+    assert np.array_equal(top_k_indices(scores, k), reference_top_k(scores, k))
+
+
+def test_top_k_with_ties_returns_the_best_scores():
+    scores = np.random.default_rng(1).integers(0, 20, 500).astype(np.float64)
+    indices = top_k_indices(scores, 40)
+    assert len(set(indices.tolist())) == 40
+    assert np.array_equal(scores[indices], np.sort(scores)[::-1][:40])
+
+
+@pytest.mark.parametrize("max_per_author", [1, 2, 5])
+def test_max_per_author_is_enforced(max_per_author):
+    rng = np.random.default_rng(max_per_author)
+    scores = rng.random(2000)
+    # A few prolific authors hold most of the best tweets
+    authors = np.where(scores > 0.9, rng.integers(0, 3, 2000), rng.integers(3, 400, 2000))
+
+    indices = top_k_indices(scores, 50, authors, max_per_author)
+    assert np.bincount(authors[indices]).max() <= max_per_author
+    assert np.array_equal(indices, reference_top_k(scores, 50, authors, max_per_author))
+
+
+def test_max_per_author_returns_fewer_when_there_are_not_enough_authors():
+    scores = np.arange(10, dtype=np.float64)
+    authors = np.array([0, 1] * 5)
+    assert top_k_indices(scores, 5, authors, 2).tolist() == [9, 8, 7, 6]
+
+
+def test_rank_tweets_uses_the_named_scorer():
+    columns = {"like_count": np.array([10, 0, 3]), "retweet_count": np.array([0, 4, 0]),
+               "reply_count": np.array([0, 0, 2]), "author_code": np.array([0, 1, 2])}
+    indices, scores = rank_tweets(columns, k=2, scorer="weighted")
+    assert indices.tolist() == [0, 2] and scores.tolist() == [10.0, 9.0]
+    assert rank_tweets(columns, k=1, scorer="likes")[0].tolist() == [0]
+    with pytest.raises(ValueError):
+        rank_tweets(columns, scorer="nope")
+
+
+def test_velocity_ages_tweets_at_scrape_time():
+    now = 1_700_000_000.0
+    columns = {"like_count": np.array([100, 100]), "retweet_count": np.zeros(2), "reply_count": np.zeros(2),
+               "created_ts": np.array([now - 4 * 3600, now - 4 * 3600]),
+               "scraped_at": np.array([now - 2 * 3600, np.nan])}
+    scores = velocity(columns, now=now)
+    assert scores[0] == pytest.approx(100 / 4 ** 1.5)  # 2 hours old when its counts were seen
+    assert scores[1] == pytest.approx(100 / 6 ** 1.5)  # unknown scrape time: aged at `now`
@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+from rate_control import ADDITIVE_INCREASE, RateController, parse_rate_limit_headers
+
+NOW = 1_700_000_000.0
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({}, {}),
+    ({"Retry-After": "30"}, {"retry_at": NOW + 30}),
+    ({"Retry-After": "Tue, 14 Nov 2023 22:13:20 GMT"}, {"retry_at": NOW}),
+    ({"x-rate-limit-limit": "300", "x-rate-limit-remaining": "0", "x-rate-limit-reset": str(int(NOW) + 900)},
+     {"limit": 300, "remaining": 0, "reset_at": NOW + 900}),
+    ({"X-RateLimit-Limit": "60", "X-RateLimit-Remaining": "12", "X-RateLimit-Reset": "20"},
+     {"limit": 60, "remaining": 12, "reset_at": NOW + 20}),
+    ({"ratelimit-limit": "100", "ratelimit-remaining": "99", "ratelimit-reset": "1"},
+     {"limit": 100, "remaining": 99, "reset_at": NOW + 1}),
+    ({"anthropic-ratelimit-requests-limit": "50", "anthropic-ratelimit-requests-remaining": "49",
+      "anthropic-ratelimit-requests-reset": "2023-11-14T22:13:30Z", "retry-after": "10"},
+     {"limit": 50, "remaining": 49, "reset_at": NOW + 10, "retry_at": NOW + 10}),
+    ({"x-rate-limit-remaining": "many", "x-rate-limit-reset": "soon"}, {}),
+])
+def test_parse_rate_limit_headers(headers, expected):
+    assert parse_rate_limit_headers(headers, now=NOW) == expected
+
+
+def test_rate_halves_on_a_429_and_grows_after_successes():
+    controller = RateController("test", rate=2.0, max_rate=4.0, min_rate=0.5)
+
+    resume = controller.on_rate_limited({"retry-after": "5"})
+    assert controller.rate == 1.0
+    assert time.time() + 4 < resume <= time.time() + 5.5
+    assert controller.reserve() > 4
+
+    controller.on_rate_limited()
+    controller.on_rate_limited()
+    assert controller.rate == 0.5  # never below min_rate
+
+    for _ in range(10):
+        controller.on_success()
+    assert controller.rate == pytest.approx(0.5 + 10 * ADDITIVE_INCREASE)
+    assert controller.failures == 0
+
+    for _ in range(200):
+        controller.on_success()
+    assert controller.rate == 4.0  # never above max_rate
+
+
+def test_remaining_quota_caps_the_rate_until_the_reset():
+    controller = RateController("test", rate=10.0)
+    controller.on_success({"x-rate-limit-remaining": "10", "x-rate-limit-reset": str(time.time() + 100)})
+    assert controller._effective_rate() == pytest.approx(0.1, rel=0.05)
+
+    controller.on_success({"x-rate-limit-remaining": "0", "x-rate-limit-reset": str(time.time() + 100)})
+    assert controller.reserve() > 95
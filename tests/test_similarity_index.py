@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+from prompt_builder import jaccard, shingles
+from similarity_index import SimilarityIndex
+from tweet_store import TweetStore
+
+VOCABULARY = [f"word{i}" for i in range(5000)]
+
+
+def random_text(rng, length=20):
+    return " ".join(rng.choice(VOCABULARY) for _ in range(length))
+
+
+def reworded(rng, text):
+    """Swaps one word, which keeps the Jaccard similarity around 0.7."""
+    words = text.split()
+    words[rng.randrange(len(words))] = rng.choice(VOCABULARY)
+    return " ".join(words)
+
+
+def test_finds_every_near_duplicate_and_no_unrelated_text():
+    rng = random.Random(0)
+    history = [random_text(rng) for _ in range(500)]
+    index = SimilarityIndex()
+    index.add_many(history, ["posted"] * len(history))
+
+    for original in history[:50]:
+        draft = reworded(rng, original)
+        similarity, match, label = index.query(draft)
+        assert similarity == pytest.approx(jaccard(shingles(draft), shingles(original)))
+        assert similarity >= index.threshold and match == original and label == "posted"
+        assert index.is_duplicate(draft)
+
+    for _ in range(50):
+        assert not index.is_duplicate(random_text(rng))
+
+
+def test_threshold_is_inclusive():
+    original = "the borrow checker was right about my lifetimes all along today"
+    draft = "the borrow checker was right about my lifetimes all along yesterday, again"
+    similarity = jaccard(shingles(draft), shingles(original))
+
+    index = SimilarityIndex(threshold=similarity)
+    index.add(original)
+    assert index.is_duplicate(draft)
+    index.threshold = similarity + 0.01
+    assert not index.is_duplicate(draft)
+
+
+def test_ignores_case_urls_and_mentions():
+    index = SimilarityIndex()
+    index.add("Rust lifetimes finally make sense after reading the book twice", "denied")
+    assert index.query("@ferris rust LIFETIMES finally make sense after reading the book twice "
+                       "https://example.com")[2] == "denied"
+    assert not index.is_duplicate("Go channels finally make sense")
+
+
+def test_from_store_indexes_the_accounts_posted_and_denied_tweets(tmp_path):
+    store = TweetStore(str(tmp_path / "tweets.db"))
+    store.record_generated("posted by the default account about rust lifetimes", "posted")
+    store.record_generated("denied for the default account about async runtimes", "denied")
+    store.record_generated("posted by another account about startup fundraising", "posted", account="b")
+
+    index = SimilarityIndex.from_store(store)
+    store.close()
+    assert len(index) == 2
+    assert index.query("denied for the default account about async runtimes")[2] == "denied"
+    assert not index.is_duplicate("posted by another account about startup fundraising")
@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pytest
+
+from snapshot_archive import NUMERIC_COLUMNS, STRING_COLUMNS, SnapshotArchive
+from tweet_record import Tweet
+
+
+def make_tweets(first, count):
+    return [Tweet(tweet_id=str(i), tweet_url=f"https://x.com/u/status/{i}", community_id="1", username=f"user{i}",
+                  created_at="Tue Nov 14 22:13:20 +0000 2023", text=f"tweet number {i} ✓", like_count=i,
+                  retweet_count=2 * i, reply_count=1, view_count=100 * i)
+            for i in range(first, first + count)]
+
+
+def file_sizes(directory):
+    names = [f"{name}.bin" for name in NUMERIC_COLUMNS]
+    names += [f"{name}.{part}" for name in STRING_COLUMNS for part in ("bytes", "offsets")]
+    return {name: os.path.getsize(os.path.join(directory, name)) for name in names}
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path / "snapshots")
+
+
+def test_committed_runs_read_back(directory):
+    archive = SnapshotArchive(directory)
+    for first in (0, 10):
+        run = archive.open_run()
+        run.add(make_tweets(first, 4))
+        run.add(make_tweets(first + 4, 6))
+        run.commit()
+
+    reader = SnapshotArchive(directory)
+    assert len(reader) == 20
+    assert [run["rows"] for run in reader.runs()] == [10, 10]
+    assert reader.columns()["run"].tolist() == [0] * 10 + [1] * 10
+    assert reader.column("like_count").tolist() == list(range(20))
+    assert reader.strings("text", [0, 19]) == ["tweet number 0 ✓", "tweet number 19 ✓"]
+    tweet = reader.tweet(13)
+    assert (tweet.tweet_id, tweet.username, tweet.retweet_count) == ("13", "user13", 26)
+    assert reader.top_rows("view_count", 3).tolist() == [19, 18, 17]
+    assert reader.run_rows([1]).tolist() == list(range(10, 20))
+
+
+def test_uncommitted_tail_is_ignored_by_readers_and_truncated_by_the_next_writer(directory):
+    archive = SnapshotArchive(directory)
+    run = archive.open_run()
+    run.add(make_tweets(0, 5))
+    run.commit()
+    committed_sizes = file_sizes(directory)
+
+    # A run that crashed before commit() leaves rows in every column file
+    crashed = SnapshotArchive(directory).open_run()
+    crashed.add(make_tweets(100, 7))
+    assert all(size > committed_sizes[name] for name, size in file_sizes(directory).items())
+
+    reader = SnapshotArchive(directory)
+    assert len(reader) == 5
+    assert reader.column("like_count").tolist() == list(range(5))
+    assert reader.strings("tweet_id") == ["0", "1", "2", "3", "4"]
+
+    # The next writer cuts the tail off before appending
+    run = SnapshotArchive(directory).open_run()
+    assert file_sizes(directory) == committed_sizes
+    assert run.run == 1 and run.start == 5
+    run.add(make_tweets(5, 3))
+    run.commit()
+
+    reader = SnapshotArchive(directory)
+    assert len(reader) == 8
+    assert reader.column("like_count").tolist() == list(range(8))
+    assert reader.strings("text", [5, 7]) == ["tweet number 5 ✓", "tweet number 7 ✓"]
+
+
+def test_readers_see_new_runs_after_refresh(directory):
+    reader = SnapshotArchive(directory)
+    assert len(reader) == 0
+    run = SnapshotArchive(directory).open_run()
+    run.add(make_tweets(0, 2))
+    run.commit()
+
+    assert len(reader) == 0
+    reader.refresh()
+    assert len(reader) == 2
+    assert np.isnan(reader.column("created_ts")).sum() == 0
+
+
+def test_empty_run_is_not_recorded(directory):
+    archive = SnapshotArchive(directory)
+    archive.open_run().commit()
+    assert archive.runs() == [] and len(archive) == 0
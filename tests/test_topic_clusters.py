@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from ranking import top_k_indices
+from topic_clusters import cluster_texts, topic_priorities
+
+RUST = ["rust borrow checker lifetimes ownership", "the rust borrow checker rejects my lifetimes again",
+        "ownership and lifetimes in rust finally click", "fighting the borrow checker over lifetimes in rust"]
+STARTUPS = ["startup founders raise a seed round from investors", "investors passed on our startup seed round",
+            "seed round advice for first time startup founders", "startup investors want traction before a seed round"]
+
+
+def test_cluster_texts_separates_unrelated_topics():
+    labels = cluster_texts(RUST + STARTUPS, n_topics=2)
+    assert len(set(labels[:4])) == 1 and len(set(labels[4:])) == 1
+    assert labels[0] != labels[4]
+    assert np.array_equal(cluster_texts(RUST + STARTUPS, n_topics=2), labels)  # seeded, so repeatable
+
+
+def test_cluster_texts_handles_empty_and_tiny_inputs():
+    assert len(cluster_texts([], n_topics=3)) == 0
+    assert cluster_texts(["just one tweet"], n_topics=5).tolist() == [0]
+
+
+def test_topic_priorities_share_slots_by_dhondt():
+    # Topic 0 has three times the total score of topic 1
+    scores = np.array([5.0, 3.0, 1.0, 2.0, 1.0])
+    labels = np.array([0, 0, 0, 1, 1])
+
+    priorities = topic_priorities(scores, labels, weight_power=1.0)
+    assert priorities == pytest.approx([9.0, 4.5, 3.0, 3.0, 1.5])
+    # 9 / 3 and 3 / 1 tie; the better tweet goes first
+    assert top_k_indices(priorities, 4).tolist() == [0, 1, 3, 2]
+
+
+def test_topic_weight_power_dampens_a_dominant_topic():
+    scores = np.array([90.0, 80.0, 70.0, 60.0, 1.0])
+    labels = np.array([0, 0, 0, 0, 1])
+    assert 4 not in top_k_indices(topic_priorities(scores, labels, weight_power=1.0), 3)
+    assert 4 in top_k_indices(topic_priorities(scores, labels, weight_power=0.0), 3)
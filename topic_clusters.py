@@ -0,0 +1,187 @@
+import re
+import zlib
+from itertools import chain
+
+import numpy as np
+
+_URL_PATTERN = re.compile(r"https?://\S+")
+_MENTION_PATTERN = re.compile(r"[@#]\w+")
+_WORD_PATTERN = re.compile(r"[a-z0-9']{2,}")
+
+# Width of the hashed bag-of-words vectors. Collisions only blur topics slightly.
+N_FEATURES = 512
+# Rows turned into dense vectors at a time; bounds memory however large the corpus is.
+BATCH_SIZE = 2048
+# Passes of mini-batch k-means over the corpus.
+EPOCHS = 3
+# Topic weight = (total score of its tweets) ** TOPIC_WEIGHT_POWER. Below 1 a topic
+# with ten times the engagement gets about three times the prompt space, not ten.
+TOPIC_WEIGHT_POWER = 0.5
+
+
+class HashedTfidf:
+    """
+    Turns tweet texts into L2-normalised TF-IDF vectors of N_FEATURES
+    dimensions using the hashing trick, so no vocabulary has to be fitted or
+    stored. Words are hashed with CRC32, which (unlike hash()) is stable
+    across processes. The vectors are kept sparse (CSR-style arrays) and only
+    made dense one batch at a time.
+    """
+
+    def __init__(self, texts, n_features: int = N_FEATURES):
+        self.n_features = n_features
+        row_words = [_WORD_PATTERN.findall(_MENTION_PATTERN.sub(" ", _URL_PATTERN.sub(" ", str(text or "").lower())))
+                     for text in texts]
+        lengths = np.fromiter(map(len, row_words), dtype=np.intp, count=len(row_words))
+        words = list(chain.from_iterable(row_words))
+        # Every distinct word is hashed once; the rest is array arithmetic
+        vocabulary = {word: i for i, word in enumerate(dict.fromkeys(words))}
+        word_ids = np.fromiter(map(vocabulary.__getitem__, words), dtype=np.int64, count=len(words))
+        codes = np.fromiter((zlib.crc32(word.encode("utf-8")) for word in vocabulary), dtype=np.int64,
+                            count=len(vocabulary))
+
+        # Term counts per (row, word), sorted by row
+        rows = np.repeat(np.arange(len(row_words), dtype=np.int64), lengths)
+        pairs, counts = np.unique(rows * max(len(vocabulary), 1) + word_ids, return_counts=True)
+        pair_rows, pair_words = np.divmod(pairs, max(len(vocabulary), 1))
+        word_codes = codes[pair_words]
+        self.indices = (word_codes % n_features).astype(np.intp)
+        signs = np.where(word_codes & 0x80000000, 1.0, -1.0)  # Signed hashing: collisions tend to cancel out
+        self.data = (signs * (1.0 + np.log(counts))).astype(np.float32)  # Sublinear term frequency
+        self.indptr = np.searchsorted(pair_rows, np.arange(len(row_words) + 1))
+        # Smoothed inverse document frequency per feature
+        document_frequency = np.bincount(self.indices, minlength=n_features)
+        self.idf = (np.log((1 + len(row_words)) / (1 + document_frequency)) + 1).astype(np.float32)
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def dense(self, rows: np.ndarray) -> np.ndarray:
+        """Dense, normalised vectors for the given row numbers."""
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        offsets = np.cumsum(lengths) - lengths  # Where each row starts in the gathered arrays
+        positions = np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+        features = self.indices[positions]
+        matrix = np.zeros((len(rows), self.n_features), dtype=np.float32)
+        np.add.at(matrix, (np.repeat(np.arange(len(rows)), lengths), features),
+                  self.data[positions] * self.idf[features])
+        norms = np.sqrt(np.einsum("ij,ij->i", matrix, matrix))[:, None]
+        return matrix / np.maximum(norms, 1e-12)
+
+    def batches(self, order: np.ndarray = None, batch_size: int = BATCH_SIZE):
+        """Yields (row numbers, dense vectors) in batches."""
+        order = np.arange(len(self)) if order is None else order
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            yield rows, self.dense(rows)
+
+
+class TopicModel:
+    """
+    Mini-batch k-means (Sculley, 2010) with cosine similarity over hashed
+    TF-IDF vectors.
+
+    partial_fit() updates the centroids from one batch at a time with a
+    per-centroid learning rate of 1 / (vectors assigned so far), so the model
+    can be trained incrementally and never needs the whole corpus in memory.
+
+    Args:
+        n_topics (int): Number of clusters.
+        seed (int): Seed for the initial centroids.
+    """
+
+    def __init__(self, n_topics: int, seed: int = 0):
+        self.n_topics = n_topics
+        self.rng = np.random.default_rng(seed)
+        self.centroids = None
+        self.counts = np.zeros(n_topics, dtype=np.float64)
+
+    def _init_centroids(self, vectors: np.ndarray):
+        # Greedy k-means++ seeding on the first batch: each centroid is the best of
+        # a few D²-weighted samples, so two seeds rarely land in the same topic
+        nonzero = vectors[np.linalg.norm(vectors, axis=1) > 0]
+        if not len(nonzero):
+            nonzero = vectors
+        n_trials = 2 + int(np.log(self.n_topics))
+        chosen = [nonzero[self.rng.integers(len(nonzero))]]
+        distance = 1 - nonzero @ chosen[0]
+        for _ in range(1, self.n_topics):
+            weights = np.maximum(distance, 0) ** 2
+            total = weights.sum()
+            picks = self.rng.choice(len(nonzero), n_trials, p=weights / total) if total > 0 \
+                else self.rng.integers(len(nonzero), size=n_trials)
+            trial_distances = np.minimum(distance, 1 - nonzero[picks] @ nonzero.T)
+            best = np.argmin(np.square(np.maximum(trial_distances, 0)).sum(axis=1))
+            chosen.append(nonzero[picks[best]])
+            distance = trial_distances[best]
+        self.centroids = np.array(chosen, dtype=np.float32)
+
+    def partial_fit(self, vectors: np.ndarray) -> "TopicModel":
+        """Updates the centroids with one batch of normalised vectors."""
+        if not len(vectors):
+            return self
+        if self.centroids is None:
+            self._init_centroids(vectors)
+        labels = self.predict(vectors)
+        for topic in np.unique(labels):
+            members = vectors[labels == topic]
+            self.counts[topic] += len(members)
+            rate = len(members) / self.counts[topic]
+            centroid = (1 - rate) * self.centroids[topic] + rate * members.mean(axis=0)
+            self.centroids[topic] = centroid / max(np.linalg.norm(centroid), 1e-12)
+        return self
+
+    def predict(self, vectors: np.ndarray) -> np.ndarray:
+        """Index of the closest centroid for every vector."""
+        return np.argmax(vectors @ self.centroids.T, axis=1)
+
+
+def cluster_texts(texts, n_topics: int, epochs: int = EPOCHS, seed: int = 0) -> np.ndarray:
+    """
+    Groups texts by topic.
+
+    Returns:
+        np.ndarray: A topic number per text.
+    """
+    features = HashedTfidf(texts)
+    n = len(features)
+    if n == 0:
+        return np.empty(0, dtype=np.intp)
+    model = TopicModel(min(n_topics, n), seed)
+    for _ in range(epochs):
+        for _, vectors in features.batches(model.rng.permutation(n)):
+            model.partial_fit(vectors)
+    labels = np.empty(n, dtype=np.intp)
+    for rows, vectors in features.batches():
+        labels[rows] = model.predict(vectors)
+    return labels
+
+
+def topic_priorities(scores: np.ndarray, labels: np.ndarray, weight_power: float = TOPIC_WEIGHT_POWER) -> np.ndarray:
+    """
+    Turns per-tweet scores into selection priorities that spread the picks over topics.
+
+    Topics are weighted by the total score of their tweets (raised to
+    `weight_power`) and slots are shared out with the D'Hondt method: the
+    n-th best tweet of a topic gets priority topic_weight / n. Taking the
+    highest priorities therefore gives each topic a share of the prompt in
+    proportion to its weight, led by its most engaging tweets, instead of
+    five tweets from one viral thread.
+
+    Returns:
+        np.ndarray: One priority per tweet (higher is picked first).
+    """
+    if not len(scores):
+        return np.empty(0, dtype=np.float64)
+    positive = np.maximum(scores, 0)
+    weights = np.bincount(labels, weights=positive) ** weight_power
+    # Rank of each tweet within its topic (0 = best)
+    order = np.lexsort((-scores, labels))
+    sorted_labels = labels[order]
+    group_start = np.r_[0, np.flatnonzero(sorted_labels[1:] != sorted_labels[:-1]) + 1]
+    rank = np.arange(len(order)) - np.repeat(group_start, np.diff(np.r_[group_start, len(order)]))
+    rank_in_topic = np.empty(len(order), dtype=np.intp)
+    rank_in_topic[order] = rank
+    # The tweet's own score breaks ties between topics with equal weight
+    return weights[labels] / (rank_in_topic + 1) + positive * 1e-9
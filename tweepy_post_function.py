@@ -1,5 +1,58 @@
-import tweepy
 import os
+import threading
+from typing import TYPE_CHECKING
+
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+if TYPE_CHECKING:
+    import tweepy
+
+TWITTER_API_HOST = "https://api.twitter.com"
+# TWITTER_API_BASE_URL sends tweepy's requests to another host, e.g. the local fake in fake_services.py.
+TWITTER_API_BASE_URL = os.environ.get("TWITTER_API_BASE_URL", "")
+
+_clients = {}
+_lock = threading.Lock()
+
+
+class _BaseUrlAdapter(HTTPAdapter):
+    """Rewrites requests for TWITTER_API_HOST to another base URL (tweepy.Client has no base_url option)."""
+
+    def __init__(self, base_url: str):
+        super().__init__()
+        self.base_url = base_url.rstrip("/")
+
+    def send(self, request, **kwargs):
+        if request.url.startswith(TWITTER_API_HOST):
+            request.url = self.base_url + request.url[len(TWITTER_API_HOST):]
+        return super().send(request, **kwargs)
+
+
+def get_twitter_client(api_key: str, api_secret: str, access_token: str, access_token_secret: str) -> "tweepy.Client":
+    """
+    Returns a process-wide tweepy.Client for the given credentials, creating it
+    on first use so its HTTP session is reused across posts. tweepy itself is
+    only imported once a tweet is actually posted.
+    """
+    import tweepy
+
+    key = (api_key, api_secret, access_token, access_token_secret)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = tweepy.Client(
+                consumer_key=api_key,
+                consumer_secret=api_secret,
+                access_token=access_token,
+                access_token_secret=access_token_secret
+            )
+            if TWITTER_API_BASE_URL:
+                client.session.mount(TWITTER_API_HOST, _BaseUrlAdapter(TWITTER_API_BASE_URL))
+            _clients[key] = client
+        return client
+
 
 def post_tweet(tweet_text: str, api_key: str, api_secret: str, access_token: str, access_token_secret: str) -> bool:
     """
@@ -15,23 +68,22 @@ def post_tweet(tweet_text: str, api_key: str, api_secret: str, access_token: str
     Returns:
         True if the tweet was posted successfully, False otherwise.
     """
+    import tweepy
+
     try:
-        # --- Initialize the client using the provided API keys and tokens ---
-        client = tweepy.Client(
-            consumer_key=api_key,
-            consumer_secret=api_secret,
-            access_token=access_token,
-            access_token_secret=access_token_secret
-        )
+        # --- Reuse the client for the provided API keys and tokens ---
+        client = get_twitter_client(api_key, api_secret, access_token, access_token_secret)
 
         print("Posting tweet to Twitter...")
         
         # The create_tweet method belongs to the tweepy.Client object
-        response = client.create_tweet(text=tweet_text)
+        with metrics.span("tweet_post"):
+            response = client.create_tweet(text=tweet_text)
         
         # Check the response to confirm success
         if response.data and response.data['id']:
             print(f"Tweet posted successfully! Tweet ID: {response.data['id']}")
+            metrics.inc("tweets_posted_total")
             return True
         else:
             print("Failed to post tweet. Response did not contain expected data.")
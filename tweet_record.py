@@ -0,0 +1,57 @@
+class Tweet:
+    """
+    A compact record for one scraped tweet.
+
+    Uses __slots__ instead of a per-instance dict, so holding thousands of
+    tweets in the scrape pipeline costs a fraction of the memory of the
+    equivalent dicts.
+    """
+
+    FIELDS = ("tweet_id", "tweet_url", "community_id", "username", "created_at", "text",
+              "like_count", "retweet_count", "reply_count", "view_count")
+    __slots__ = FIELDS + ("score",)
+
+    def __init__(self, tweet_id=None, tweet_url=None, community_id=None, username=None, created_at=None,
+                 text=None, like_count=0, retweet_count=0, reply_count=0, view_count=0):
+        self.tweet_id = tweet_id
+        self.tweet_url = tweet_url
+        self.community_id = community_id
+        self.username = username
+        self.created_at = created_at
+        self.text = text
+        self.like_count = _to_int(like_count)
+        self.retweet_count = _to_int(retweet_count)
+        self.reply_count = _to_int(reply_count)
+        self.view_count = _to_int(view_count)
+        self.score = None  # Set by ranking.rank_stored_tweets()
+
+    @classmethod
+    def from_api(cls, tweet: dict, community_id: str = None) -> "Tweet":
+        """Builds a record from a raw twitterapi.io tweet object."""
+        return cls(
+            tweet_id=tweet.get("id"),
+            tweet_url=tweet.get("url"),
+            community_id=community_id,
+            username=tweet.get("author", {}).get("userName"),
+            created_at=tweet.get("createdAt"),
+            text=tweet.get("text"),
+            like_count=tweet.get("likeCount", 0),
+            retweet_count=tweet.get("retweetCount", 0),
+            reply_count=tweet.get("replyCount", 0),
+            view_count=tweet.get("viewCount", 0),
+        )
+
+    @classmethod
+    def from_row(cls, row) -> "Tweet":
+        """Builds a record from a TweetStore row."""
+        return cls(**{name: row[name] for name in cls.FIELDS})
+
+    def __repr__(self):
+        return f"Tweet(tweet_id={self.tweet_id!r}, username={self.username!r}, like_count={self.like_count})"
+
+
+def _to_int(value) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
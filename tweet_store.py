@@ -0,0 +1,255 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from tweet_record import Tweet
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tweets (
+    tweet_key     TEXT PRIMARY KEY,
+    tweet_id      TEXT,
+    tweet_url     TEXT,
+    community_id  TEXT,
+    username      TEXT,
+    created_at    TEXT,
+    created_ts    INTEGER,
+    text          TEXT,
+    like_count    INTEGER NOT NULL DEFAULT 0,
+    retweet_count INTEGER NOT NULL DEFAULT 0,
+    reply_count   INTEGER NOT NULL DEFAULT 0,
+    view_count    INTEGER NOT NULL DEFAULT 0,
+    scraped_at    INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tweets_community_time ON tweets (community_id, created_ts);
+CREATE INDEX IF NOT EXISTS idx_tweets_community_likes ON tweets (community_id, like_count);
+CREATE INDEX IF NOT EXISTS idx_tweets_likes ON tweets (like_count);
+
+CREATE TABLE IF NOT EXISTS generated_tweets (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    text        TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    created_at  INTEGER NOT NULL,
+    account     TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_generated_status_time ON generated_tweets (status, created_at);
+"""
+
+COLUMNS = ["tweet_id", "tweet_url", "community_id", "username", "created_at", "created_ts", "text",
+           "like_count", "retweet_count", "reply_count", "view_count", "scraped_at"]
+
+# Twitter's own timestamp format, e.g. "Tue Dec 10 07:00:30 +0000 2024"
+TWITTER_TIME_FORMAT = "%a %b %d %H:%M:%S %z %Y"
+
+
+def parse_created_at(value):
+    """
+    Converts a `createdAt` value from twitterapi.io into a Unix timestamp.
+
+    Returns:
+        int: Seconds since the epoch, or None if the value can't be parsed.
+    """
+    if not value:
+        return None
+    for parse in (lambda v: datetime.strptime(v, TWITTER_TIME_FORMAT),
+                  lambda v: datetime.fromisoformat(v.replace("Z", "+00:00"))):
+        try:
+            return int(parse(str(value)).timestamp())
+        except ValueError:
+            continue
+    return None
+
+
+class TweetStore:
+    """
+    A local SQLite corpus of every scraped tweet, kept across runs.
+
+    Tweets are deduplicated by tweet id (or URL when the id is missing);
+    scraping the same tweet again only refreshes its engagement counts and
+    scraped_at, the time those counts were observed.
+    Queries are indexed by community, creation time and like count.
+    One connection is shared by every thread (the account threads and the
+    posting workers' callbacks), so each statement runs under a lock.
+    """
+
+    def __init__(self, filename: str = "tweets.db"):
+        self.filename = filename
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        generated_columns = [row["name"] for row in self.conn.execute("PRAGMA table_info(generated_tweets)")]
+        if "account" not in generated_columns:
+            # Databases from before multi-account support
+            with self.conn:
+                self.conn.execute("ALTER TABLE generated_tweets ADD COLUMN account TEXT NOT NULL DEFAULT ''")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_generated_account_time ON generated_tweets (account, created_at)")
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def add_tweets(self, tweets) -> int:
+        """
+        Inserts or refreshes scraped tweets.
+
+        Args:
+            tweets: An iterable of Tweet records tagged with their community_id.
+
+        Returns:
+            int: Number of tweets written.
+        """
+        now = int(time.time())
+        rows = []
+        for tweet in tweets:
+            key = tweet.tweet_id or tweet.tweet_url
+            if not key:
+                continue
+            rows.append((
+                str(key), tweet.tweet_id, tweet.tweet_url, tweet.community_id,
+                tweet.username, tweet.created_at, parse_created_at(tweet.created_at),
+                tweet.text, tweet.like_count, tweet.retweet_count,
+                tweet.reply_count, tweet.view_count, now
+            ))
+
+        with self._lock, self.conn:
+            self.conn.executemany("""
+                INSERT INTO tweets (tweet_key, tweet_id, tweet_url, community_id, username, created_at, created_ts,
+                                    text, like_count, retweet_count, reply_count, view_count, scraped_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(tweet_key) DO UPDATE SET
+                    like_count = excluded.like_count,
+                    retweet_count = excluded.retweet_count,
+                    reply_count = excluded.reply_count,
+                    view_count = excluded.view_count,
+                    scraped_at = excluded.scraped_at
+            """, rows)
+        return len(rows)
+
+    def _where(self, community_ids=None, since=None):
+        clauses, params = [], []
+        if community_ids:
+            community_ids = list(community_ids)
+            clauses.append(f"community_id IN ({', '.join('?' * len(community_ids))})")
+            params.extend(community_ids)
+        if since is not None:
+            clauses.append("created_ts >= ?")
+            params.append(int(since))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def iter_tweets(self, community_ids=None, since=None, batch_size: int = 500):
+        """
+        Streams stored tweets as Tweet records without loading them all at once.
+
+        Args:
+            community_ids (list, optional): Only include these communities.
+            since (int, optional): Only include tweets created at or after this Unix timestamp.
+            batch_size (int): Number of rows fetched from SQLite at a time.
+
+        Yields:
+            Tweet: One record per stored tweet.
+        """
+        where, params = self._where(community_ids, since)
+        with self._lock:
+            cursor = self.conn.execute(f"SELECT {', '.join(COLUMNS)} FROM tweets{where}", params)
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield Tweet.from_row(row)
+
+    def load_columns(self, community_ids=None, since=None, with_text: bool = False) -> dict:
+        """
+        Loads the columns needed for ranking as NumPy arrays, leaving the
+        tweet text in the database unless `with_text` is set.
+
+        Returns:
+            dict: "tweet_key" and "username" (object arrays), "author_code"
+                  (one integer per distinct username), "like_count",
+                  "retweet_count", "reply_count", "view_count" (float64),
+                  "created_ts" (float64, NaN when unknown), "scraped_at"
+                  (float64, when the counts were last refreshed) and, with
+                  `with_text`, "text" (object array).
+        """
+        where, params = self._where(community_ids, since)
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.row_factory = None  # Plain tuples; sqlite3.Row roughly doubles the fetch time
+            rows = cursor.execute(f"""
+                SELECT tweet_key, COALESCE(username, ''), like_count, retweet_count, reply_count, view_count, created_ts,
+                       scraped_at{", COALESCE(text, '')" if with_text else ""}
+                FROM tweets{where}
+            """, params).fetchall()
+
+        numeric = ["like_count", "retweet_count", "reply_count", "view_count", "created_ts", "scraped_at"]
+        if not rows:
+            columns = {name: np.empty(0, dtype=np.float64) for name in numeric}
+            columns.update(tweet_key=np.empty(0, dtype=object), username=np.empty(0, dtype=object),
+                           author_code=np.empty(0, dtype=np.intp))
+            if with_text:
+                columns["text"] = np.empty(0, dtype=object)
+            return columns
+
+        values = list(zip(*rows))
+        author_codes = {}
+        columns = {
+            "tweet_key": np.array(values[0], dtype=object),
+            "username": np.array(values[1], dtype=object),
+            "author_code": np.fromiter((author_codes.setdefault(name, len(author_codes)) for name in values[1]),
+                                       dtype=np.intp, count=len(rows)),
+        }
+        for name, column in zip(numeric, values[2:8]):
+            columns[name] = np.array(column, dtype=np.float64)  # None becomes NaN
+        if with_text:
+            columns["text"] = np.array(values[8], dtype=object)
+        return columns
+
+    def get_tweets(self, tweet_keys) -> list:
+        """Fetches full Tweet records by key, in the order of `tweet_keys`."""
+        tweet_keys = list(tweet_keys)
+        if not tweet_keys:
+            return []
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT tweet_key, {', '.join(COLUMNS)} FROM tweets WHERE tweet_key IN ({', '.join('?' * len(tweet_keys))})",
+                tweet_keys
+            ).fetchall()
+        by_key = {row["tweet_key"]: Tweet.from_row(row) for row in rows}
+        return [by_key[key] for key in tweet_keys if key in by_key]
+
+    def record_generated(self, text: str, status: str, account: str = ""):
+        """Remembers a tweet the bot generated for `account`, with its fate ("posted" or "denied")."""
+        with self._lock, self.conn:
+            self.conn.execute("INSERT INTO generated_tweets (text, status, created_at, account) VALUES (?, ?, ?, ?)",
+                              (text, status, int(time.time()), account))
+
+    def recent_generated(self, statuses=("posted",), limit: int = 50, account: str = "") -> list:
+        """Returns the texts of the most recent generated tweets of `account` with the given statuses."""
+        return [text for text, _ in self.generated_history(statuses, limit, account)]
+
+    def generated_history(self, statuses=("posted", "denied"), limit: int = 5000, account: str = "") -> list:
+        """Returns (text, status) of the most recent generated tweets of `account` with the given statuses, newest first."""
+        statuses = list(statuses)
+        with self._lock:
+            return [tuple(row) for row in self.conn.execute(
+                f"SELECT text, status FROM generated_tweets WHERE account = ? AND status IN ({', '.join('?' * len(statuses))}) "
+                "ORDER BY created_at DESC, id DESC LIMIT ?",
+                [account] + statuses + [int(limit)]
+            )]
+
+    def count(self, community_ids=None, since=None) -> int:
+        """Returns the number of stored tweets matching the filters."""
+        where, params = self._where(community_ids, since)
+        with self._lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM tweets{where}", params).fetchone()[0]